@@ -0,0 +1,80 @@
+"""Frame decoding throughput of WebSocketFeedListener.
+
+Decodes every W line of a trade log recorded with trade_log_file_path, or a
+synthetic full channel capture when no path is given, with the standard
+library json, ujson (if installed), and with the OrderBook pre-filter that
+skips received/heartbeat/market done frames.
+
+Usage: python benchmarks/feed_decoding.py [trades.txt]
+
+"""
+
+import json
+import random
+import sys
+import time
+import uuid
+
+import gdax.orderbook
+
+PRODUCT_ID = 'BTC-USD'
+MESSAGES = 100000
+
+
+def _synthetic_capture():
+    """A message mix roughly like the full channel's."""
+    rng = random.Random(0)
+    frames = []
+    for sequence in range(MESSAGES):
+        message = {
+            'type': rng.choices(
+                ['received', 'open', 'done', 'match', 'change',
+                 'heartbeat'],
+                [45, 20, 30, 3, 1, 1])[0],
+            'order_id': str(uuid.uuid4()),
+            'side': rng.choice(['buy', 'sell']),
+            'product_id': PRODUCT_ID,
+            'sequence': sequence,
+            'time': '2017-06-25T11:23:14.792000Z',
+        }
+        if message['type'] != 'done' or rng.random() < 0.7:
+            message['price'] = f'{rng.uniform(2500, 2700):.8f}'
+        message['size'] = f'{rng.uniform(0.01, 10):.8f}'
+        frames.append(json.dumps(message, separators=(',', ':')))
+    return frames
+
+
+def _capture(path):
+    with open(path) as trade_file:
+        return [line[2:].rstrip('\n') for line in trade_file
+                if line.startswith('W ')]
+
+
+def run(orderbook, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        orderbook._decode(frame)
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main():
+    frames = (_capture(sys.argv[1]) if len(sys.argv) > 1
+              else _synthetic_capture())
+    decoders = [('json', json.loads)]
+    try:
+        import ujson
+        decoders.append(('ujson', ujson.loads))
+    except ImportError:
+        print('ujson is not installed')
+
+    print(f'{"decoder":>10} {"pre-filter":>10} {"messages/s":>12}')
+    for name, json_loads in decoders:
+        for skip_ignored in [False, True]:
+            orderbook = gdax.orderbook.OrderBook(
+                PRODUCT_ID, json_loads=json_loads, skip_ignored=skip_ignored)
+            best = max(run(orderbook, frames) for _ in range(5))
+            print(f'{name:>10} {str(skip_ignored):>10} {best:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
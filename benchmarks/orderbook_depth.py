@@ -0,0 +1,55 @@
+"""Per-message cost of order book updates as the touch level gets deeper.
+
+Fills a single price level with DEPTH resting orders, then times a stream of
+open/done/change/match messages that hit orders in the middle of that level.
+
+Usage: python benchmarks/orderbook_depth.py
+
+"""
+
+import time
+import uuid
+
+import gdax.orderbook
+
+PRODUCT_ID = 'BTC-USD'
+PRICE = '2596.74'
+MESSAGES = 20000
+
+
+def _open(order_id):
+    return {'order_id': order_id, 'side': 'sell', 'price': PRICE,
+            'remaining_size': '1.0'}
+
+
+def run(depth):
+    orderbook = gdax.orderbook.OrderBook(PRODUCT_ID)
+    ids = [str(uuid.uuid4()) for _ in range(depth)]
+    for order_id in ids:
+        orderbook.add(PRODUCT_ID, _open(order_id))
+
+    middle = ids[depth // 2]
+    start = time.perf_counter()
+    for _ in range(MESSAGES // 4):
+        orderbook.change(PRODUCT_ID, {'order_id': middle, 'side': 'sell',
+                                      'price': PRICE, 'new_size': '0.5'})
+        orderbook.remove(PRODUCT_ID, {'order_id': middle, 'side': 'sell',
+                                      'price': PRICE})
+        orderbook.add(PRODUCT_ID, _open(middle))
+        head = orderbook.get_asks(PRODUCT_ID,
+                                  orderbook.get_ask(PRODUCT_ID)).first()
+        orderbook.match(PRODUCT_ID, {'maker_order_id': head.id,
+                                     'side': 'sell', 'price': PRICE,
+                                     'size': '0.1'})
+    elapsed = time.perf_counter() - start
+    return elapsed / MESSAGES
+
+
+def main():
+    print(f'{"depth":>8} {"us/message":>12}')
+    for depth in [10, 100, 1000, 10000]:
+        print(f'{depth:>8} {run(depth) * 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Message throughput and memory of the Decimal and fixed-point order books.
+
+Replays a synthetic stream of open/match/change/done messages spread over
+LEVELS price levels through OrderBook.add/match/change/remove in both modes.
+
+Usage: python benchmarks/orderbook_fixed_point.py
+
+"""
+
+import gc
+import random
+import time
+import tracemalloc
+import uuid
+
+import gdax.orderbook
+import gdax.utils
+
+PRODUCT_ID = 'BTC-USD'
+ORDERS = 50000
+LEVELS = 2000
+
+
+def _messages():
+    rng = random.Random(0)
+    opens = []
+    for i in range(ORDERS):
+        side = 'buy' if i % 2 else 'sell'
+        offset = rng.randrange(LEVELS)
+        if side == 'buy':
+            price = 2500 - offset / 100
+        else:
+            price = 2500.01 + offset / 100
+        opens.append({'order_id': str(uuid.uuid4()), 'side': side,
+                      'price': f'{price:.8f}',
+                      'remaining_size': f'{rng.uniform(0.01, 10):.8f}'})
+    updates = []
+    for order in opens:
+        updates.append(('change', {'order_id': order['order_id'],
+                                   'side': order['side'],
+                                   'price': order['price'],
+                                   'new_size': '0.50000000'}))
+    for order in opens:
+        updates.append(('remove', {'order_id': order['order_id'],
+                                   'side': order['side'],
+                                   'price': order['price']}))
+    return opens, updates
+
+
+def _orderbook(fixed_point):
+    orderbook = gdax.orderbook.OrderBook(PRODUCT_ID)
+    if fixed_point:
+        orderbook._price_units[PRODUCT_ID] = gdax.utils.FixedPoint('0.01')
+        orderbook._size_units[PRODUCT_ID] = gdax.utils.FixedPoint(
+            gdax.orderbook.SIZE_INCREMENT)
+    return orderbook
+
+
+def run(fixed_point, opens, updates):
+    orderbook = _orderbook(fixed_point)
+    gc.collect()
+    start = time.perf_counter()
+    for order in opens:
+        orderbook.add(PRODUCT_ID, order)
+    for handler, message in updates:
+        getattr(orderbook, handler)(PRODUCT_ID, message)
+    elapsed = time.perf_counter() - start
+    return elapsed / (len(opens) + len(updates))
+
+
+def memory(fixed_point, opens):
+    orderbook = _orderbook(fixed_point)
+    gc.collect()
+    tracemalloc.start()
+    for order in opens:
+        orderbook.add(PRODUCT_ID, order)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(opens)
+
+
+def main():
+    opens, updates = _messages()
+    print(f'{"mode":>12} {"us/message":>12} {"bytes/order":>12}')
+    for name, fixed_point in [('Decimal', False), ('fixed-point', True)]:
+        best = min(run(fixed_point, opens, updates) for _ in range(3))
+        print(f'{name:>12} {best * 1e6:>12.2f} '
+              f'{memory(fixed_point, opens):>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Memory held per resting order in the level-3 order book.
+
+Loads a synthetic book of ORDERS orders spread over LEVELS price levels per
+side and reports the bytes allocated per order, for the former
+representation (a dict per order holding its own Decimal price, in a list per
+level) and for the current OrderBook.
+
+Usage: python benchmarks/orderbook_memory.py
+
+"""
+
+from decimal import Decimal
+import gc
+import tracemalloc
+import uuid
+
+from sortedcontainers import SortedDict
+
+import gdax.orderbook
+
+PRODUCT_ID = 'BTC-USD'
+ORDERS = 50000
+LEVELS = 2000
+
+
+def _orders():
+    # ids and wire strings are alive for the whole run, so they are
+    # excluded from the measurements
+    return [{
+        'order_id': str(uuid.uuid4()),
+        'side': 'buy' if i % 2 else 'sell',
+        'price': '{:.2f}'.format(2500 + (i % LEVELS) / 100),
+        'remaining_size': '{:.8f}'.format(1 + i / ORDERS),
+    } for i in range(ORDERS)]
+
+
+def dict_book(orders):
+    trees = {'buy': SortedDict(), 'sell': SortedDict()}
+    for order in orders:
+        record = {
+            'id': order['order_id'],
+            'side': order['side'],
+            'price': Decimal(order['price']),
+            'size': Decimal(order['remaining_size']),
+        }
+        trees[order['side']].setdefault(record['price'], []).append(record)
+    return trees
+
+
+def slotted_book(orders):
+    orderbook = gdax.orderbook.OrderBook(PRODUCT_ID)
+    for order in orders:
+        orderbook.add(PRODUCT_ID, order)
+    return orderbook
+
+
+def measure(build, orders):
+    gc.collect()
+    tracemalloc.start()
+    book = build(orders)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del book
+    return size / len(orders)
+
+
+def main():
+    orders = _orders()
+    print(f'{"representation":>16} {"bytes/order":>12}')
+    for name, build in [('dict per order', dict_book),
+                        ('slotted', slotted_book)]:
+        print(f'{name:>16} {measure(build, orders):>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
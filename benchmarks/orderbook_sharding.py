@@ -0,0 +1,118 @@
+"""Aggregate throughput of ShardedOrderBook with the number of processes.
+
+Each of PRODUCTS synthetic products replays MESSAGES full channel frames
+(decoded with OrderBook._decode and applied with OrderBook._handle) instead
+of connecting to the feed. The products are spread over 1, 2, 4, ... worker
+processes, up to the number of CPUs, and the aggregate messages/s is the
+total number of messages over the time all workers took to apply them.
+
+The frames are generated once and inherited by the workers, so this relies
+on the fork start method (the default on Linux).
+
+Usage: python benchmarks/orderbook_sharding.py [max_processes]
+
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+
+import gdax.orderbook
+import gdax.sharding
+
+PRODUCTS = 8
+MESSAGES = 50000
+
+FRAMES = {}
+
+
+def _frames(product_id):
+    rng = random.Random(product_id)
+    frames = []
+    resting = []
+    for sequence in range(2, MESSAGES + 2):
+        if resting and rng.random() < 0.5:
+            order_id, side, price = resting.pop(rng.randrange(len(resting)))
+            message = {'type': 'done', 'order_id': order_id, 'side': side,
+                       'price': price, 'reason': 'canceled',
+                       'remaining_size': '1.00000000'}
+        else:
+            side = rng.choice(['buy', 'sell'])
+            price = (f'{rng.randint(9000, 9999) / 100:.2f}' if side == 'buy'
+                     else f'{rng.randint(10000, 11000) / 100:.2f}')
+            order_id = str(uuid.uuid4())
+            resting.append((order_id, side, price))
+            message = {'type': 'open', 'order_id': order_id, 'side': side,
+                       'price': price, 'remaining_size': '1.00000000'}
+        message.update(product_id=product_id, sequence=sequence)
+        frames.append(json.dumps(message, separators=(',', ':')))
+    return frames
+
+
+class ReplayOrderBook(gdax.orderbook.OrderBook):
+    def __init__(self, product_ids, start=None, **kwargs):
+        super().__init__(product_ids, **kwargs)
+        self._start = start
+        self._frames = [frame for product_id in self.product_ids
+                        for frame in FRAMES[product_id]]
+        # interleave the products, as on the feed, last frame first
+        self._frames.sort(key=lambda frame: json.loads(frame)['sequence'],
+                          reverse=True)
+
+    async def __aenter__(self):
+        for product_id in self.product_ids:
+            self._load_snapshot(product_id,
+                                {'sequence': 1, 'bids': [], 'asks': []})
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        pass
+
+    async def handle_message(self):
+        if self._start is not None:
+            await asyncio.get_event_loop().run_in_executor(
+                None, self._start.wait)
+            self._start = None
+        if not self._frames:
+            await asyncio.sleep(3600)
+        return self._handle(self._decode(self._frames.pop()))
+
+
+async def run(processes):
+    start = multiprocessing.Event()
+    async with gdax.sharding.ShardedOrderBook(
+            list(FRAMES), processes=processes,
+            orderbook_class=ReplayOrderBook, start=start) as orderbook:
+        total = PRODUCTS * MESSAGES
+        began = time.perf_counter()
+        start.set()
+        while sum(orderbook.message_counts) < total:
+            await asyncio.sleep(0.001)
+        return total / (time.perf_counter() - began)
+
+
+def main():
+    for i in range(PRODUCTS):
+        product_id = f'P{i}-USD'
+        FRAMES[product_id] = _frames(product_id)
+
+    cpus = os.cpu_count() or 1
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else cpus
+    counts = [1]
+    while counts[-1] * 2 <= min(limit, PRODUCTS):
+        counts.append(counts[-1] * 2)
+    print(f'{cpus} CPUs')
+    print(f'{"processes":>10} {"messages/s":>12}')
+    loop = asyncio.get_event_loop()
+    for processes in counts:
+        rate = loop.run_until_complete(run(processes))
+        print(f'{processes:>10} {rate:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
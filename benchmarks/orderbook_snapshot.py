@@ -0,0 +1,64 @@
+"""Time to load a level 3 snapshot into the order book.
+
+Compares inserting the snapshot one order at a time through OrderBook.add,
+as __aenter__ used to, with the bulk loader. The snapshot has ORDERS orders
+over LEVELS price levels per side, in the format returned by
+Trader.get_product_order_book(level=3).
+
+Usage: python benchmarks/orderbook_snapshot.py
+
+"""
+
+from decimal import Decimal
+import random
+import time
+import uuid
+
+import gdax.orderbook
+
+PRODUCT_ID = 'BTC-USD'
+ORDERS = 50000
+LEVELS = 5000
+
+
+def _snapshot():
+    rng = random.Random(0)
+    bids = sorted(
+        ([Decimal(2500) - Decimal(rng.randrange(LEVELS)) / 100,
+          Decimal(rng.randrange(1, 10 ** 9)) / 10 ** 8, str(uuid.uuid4())]
+         for _ in range(ORDERS // 2)),
+        key=lambda row: row[0], reverse=True)
+    asks = sorted(
+        ([Decimal('2500.01') + Decimal(rng.randrange(LEVELS)) / 100,
+          Decimal(rng.randrange(1, 10 ** 9)) / 10 ** 8, str(uuid.uuid4())]
+         for _ in range(ORDERS // 2)),
+        key=lambda row: row[0])
+    return {'sequence': 1, 'bids': bids, 'asks': asks}
+
+
+def add_orders(orderbook, book):
+    for side, rows in [('buy', book['bids']), ('sell', book['asks'])]:
+        for price, size, order_id in rows:
+            orderbook.add(PRODUCT_ID, {'id': order_id, 'side': side,
+                                       'price': price, 'size': size})
+
+
+def load_snapshot(orderbook, book):
+    orderbook._load_snapshot(PRODUCT_ID, book)
+
+
+def main():
+    book = _snapshot()
+    print(f'{"loader":>12} {"ms":>8}')
+    for name, load in [('add', add_orders), ('bulk', load_snapshot)]:
+        timings = []
+        for _ in range(5):
+            orderbook = gdax.orderbook.OrderBook(PRODUCT_ID)
+            start = time.perf_counter()
+            load(orderbook, book)
+            timings.append(time.perf_counter() - start)
+        print(f'{name:>12} {min(timings) * 1e3:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Replay speed of ReplayOrderBook on a synthetic trade log.
+
+Writes a snapshot and MESSAGES open and done frames of one product as a text
+and as a binary log, then replays each as fast as possible. Then compares
+finding the frame with the last sequence by scanning the log and through
+its index.
+
+Usage: python benchmarks/replay.py
+
+"""
+
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+
+import gdax.replay
+import gdax.trade_log
+
+PRODUCT_ID = 'BTC-USD'
+MESSAGES = 200000
+
+
+def _frames():
+    rng = random.Random(0)
+    resting = []
+    for sequence in range(2, MESSAGES + 2):
+        if resting and rng.random() < 0.5:
+            order_id, side, price = resting.pop(rng.randrange(len(resting)))
+            message = {'type': 'done', 'order_id': order_id, 'side': side,
+                       'price': price, 'reason': 'canceled',
+                       'remaining_size': '1.00000000'}
+        else:
+            side = rng.choice(['buy', 'sell'])
+            price = (f'{rng.randint(9000, 9999) / 100:.2f}' if side == 'buy'
+                     else f'{rng.randint(10000, 11000) / 100:.2f}')
+            order_id = str(uuid.uuid4())
+            resting.append((order_id, side, price))
+            message = {'type': 'open', 'order_id': order_id, 'side': side,
+                       'price': price, 'remaining_size': '1.00000000'}
+        message.update(product_id=PRODUCT_ID, sequence=sequence)
+        yield json.dumps(message, separators=(',', ':'))
+
+
+def _find(path, sequence, offset=0):
+    for _, _, data in gdax.trade_log.read_trade_log(path, offset):
+        if f'"sequence":{sequence}' in data:
+            return data
+
+
+def _find_indexed(path, sequence):
+    index = gdax.trade_log.TradeLogIndex(path)
+    return _find(path, sequence, index.frame(PRODUCT_ID, sequence)[2])
+
+
+def _time(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+async def replay(path):
+    async with gdax.replay.ReplayOrderBook(path) as orderbook:
+        start = time.perf_counter()
+        count = await orderbook.replay()
+        return count / (time.perf_counter() - start)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    frames = list(_frames())
+    loop = asyncio.get_event_loop()
+    for format, writer in sorted(gdax.trade_log.TRADE_LOG_FORMATS.items()):
+        path = os.path.join(directory, f'trades.{format}')
+        with writer(path) as log:
+            log.log_snapshot(PRODUCT_ID,
+                             '{"sequence":1,"bids":[],"asks":[]}')
+            for frame in frames:
+                log.log_frame(frame)
+        rate = loop.run_until_complete(replay(path))
+        print(f'{format:>6}: {rate:.0f} messages/s, '
+              f'{os.path.getsize(path) / MESSAGES:.0f} bytes/message')
+
+        gdax.trade_log.build_trade_log_index(path)
+        print(f'        last frame found in '
+              f'{_time(_find, path, MESSAGES + 1) * 1000:.1f} ms by '
+              f'scanning, '
+              f'{_time(_find_indexed, path, MESSAGES + 1) * 1000:.1f} ms '
+              f'with the index')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Cost of publishing and reading the shared-memory top of book.
+
+Times TopOfBookPublisher.publish and TopOfBookReader.read in this process,
+then measures how long a top of book change takes to be seen by a reader
+spinning in another process, from the timestamp written with it.
+
+Usage: python benchmarks/shared_book.py
+
+"""
+
+from decimal import Decimal
+import multiprocessing
+import os
+import tempfile
+import time
+
+import gdax.orderbook
+import gdax.shared_book
+
+PRODUCT_ID = 'BTC-USD'
+ITERATIONS = 100000
+CHANGES = 1000
+
+
+def _top(i):
+    return (Decimal('2595.52') + i % 100, Decimal('1.5'),
+            Decimal('2596.74') + i % 100, Decimal('0.2'))
+
+
+def _follow(path, delays):
+    reader = gdax.shared_book.TopOfBookReader(path)
+    last = None
+    seen = []
+    while len(seen) < CHANGES:
+        top = reader.read(PRODUCT_ID)
+        if top[4] != last:
+            seen.append(time.time() - top[5])
+            last = top[4]
+    delays.put(seen[1:])
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'book')
+    orderbook = gdax.orderbook.OrderBook(PRODUCT_ID)
+    orderbook._sequences[PRODUCT_ID] = 0
+    publisher = gdax.shared_book.TopOfBookPublisher(orderbook, path)
+    reader = gdax.shared_book.TopOfBookReader(path)
+
+    tops = [_top(i) for i in range(100)]
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        publisher.publish(PRODUCT_ID, tops[i % 100])
+    publish = (time.perf_counter() - start) / ITERATIONS
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        reader.read(PRODUCT_ID)
+    read = (time.perf_counter() - start) / ITERATIONS
+    print(f'publish {publish * 1e6:.2f} us, read {read * 1e6:.2f} us')
+
+    delays = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_follow, args=(path, delays))
+    process.start()
+    time.sleep(0.5)
+    for i in range(CHANGES + 10):
+        orderbook._sequences[PRODUCT_ID] = i + 1
+        publisher.publish(PRODUCT_ID, tops[i % 100])
+        time.sleep(0.001)
+    seen = sorted(delays.get())
+    process.join()
+    print(f'seen by another process after {seen[len(seen) // 2] * 1e6:.1f} '
+          f'us (median), {seen[int(len(seen) * 0.99)] * 1e6:.1f} us (p99)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,11 @@
+import gdax.broadcaster
+import gdax.level2_orderbook
+import gdax.messages
 import gdax.orderbook
+import gdax.replay
+import gdax.shared_book
+import gdax.sharding
+import gdax.trade_log
 import gdax.trader
 import gdax.utils
 import gdax.websocket_feed_listener
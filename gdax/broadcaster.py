@@ -0,0 +1,170 @@
+"""Fans the updates of an OrderBook out to several consumers.
+
+Each subscriber has its own queue, so a slow consumer only falls behind on
+its own updates and never holds up the feed or the other consumers.
+
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+import time
+
+
+class Subscriber(object):
+    """The updates of a single consumer.
+
+    Updates are (product_id, value) pairs, where value is the top of book
+    (bid, bid_size, ask, ask_size) if depth is None, and the get_depth()
+    snapshot of depth levels otherwise.
+
+    With conflate=True, only the latest update of each product is kept until
+    it is read; the update it replaces counts as dropped. Otherwise up to
+    maxsize updates are queued and the oldest is dropped when the queue is
+    full. The lag of an update is the time from its publication until it was
+    read, in seconds; a conflated update keeps the publication time of the
+    first update it replaced.
+
+    """
+
+    def __init__(self, product_ids=None, depth=None, conflate=True,
+                 maxsize=1000):
+        self.product_ids = (None if product_ids is None
+                            else frozenset(product_ids))
+        self.depth = depth
+        self.conflate = conflate
+        # product_id -> (published, value) or (product_id, published, value)
+        self._updates = OrderedDict() if conflate else deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+
+        self.delivered = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def pending(self):
+        return len(self._updates)
+
+    def _put(self, product_id, value, published):
+        updates = self._updates
+        if self.conflate:
+            if product_id in updates:
+                self.dropped += 1
+                published = updates[product_id][0]
+            updates[product_id] = (published, value)
+        else:
+            if len(updates) == updates.maxlen:
+                self.dropped += 1
+            updates.append((product_id, published, value))
+        self._ready.set()
+
+    def get_nowait(self):
+        """Returns the oldest update, or raises asyncio.QueueEmpty."""
+        if not self._updates:
+            raise asyncio.QueueEmpty
+        if self.conflate:
+            product_id, (published, value) = self._updates.popitem(last=False)
+        else:
+            product_id, published, value = self._updates.popleft()
+        if not self._updates:
+            self._ready.clear()
+        lag = time.perf_counter() - published
+        self.delivered += 1
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        return product_id, value
+
+    async def get(self):
+        """Waits for and returns the oldest update."""
+        while not self._updates:
+            await self._ready.wait()
+        return self.get_nowait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def __repr__(self):
+        return (f'Subscriber(depth={self.depth!r}, '
+                f'conflate={self.conflate!r}, pending={self.pending}, '
+                f'delivered={self.delivered}, dropped={self.dropped}, '
+                f'max_lag={self.max_lag:.6f})')
+
+
+class Broadcaster(object):
+    """Publishes the changes of an OrderBook to its subscribers.
+
+    run() applies the book's messages with handle_batch and, after each
+    batch, publishes the top of book and depth snapshots of the products
+    that changed, once per distinct value. Publishing never waits for the
+    subscribers.
+
+    """
+
+    def __init__(self, orderbook):
+        self.orderbook = orderbook
+        self.subscribers = []
+        self._changed = set()
+        # (product_id, depth) -> last published value
+        self._published = {}
+        self._watch_levels = False
+        orderbook.on_top_of_book(self._on_change)
+
+    def subscribe(self, product_ids=None, depth=None, conflate=True,
+                  maxsize=1000):
+        if product_ids is not None and not isinstance(product_ids, list):
+            product_ids = [product_ids]
+        subscriber = Subscriber(product_ids, depth, conflate, maxsize)
+        self.subscribers.append(subscriber)
+        if depth is not None and not self._watch_levels:
+            # changes below the top of book only matter for depth snapshots
+            self._watch_levels = True
+            self.orderbook.on_level_change(self._on_change)
+        # start from the current state of the book
+        published = time.perf_counter()
+        for product_id in product_ids or self.orderbook.product_ids:
+            value = self._value(product_id, depth)
+            self._published.setdefault((product_id, depth), value)
+            subscriber._put(product_id, value, published)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+
+    def _on_change(self, product_id, *args):
+        self._changed.add(product_id)
+
+    def _value(self, product_id, depth):
+        if depth is None:
+            return self.orderbook.get_top_of_book(product_id)
+        return self.orderbook.get_depth(product_id, depth)
+
+    def publish(self):
+        """Publishes the products changed since the last call."""
+        changed, self._changed = self._changed, set()
+        published = time.perf_counter()
+        for product_id in changed:
+            values = {}
+            for subscriber in self.subscribers:
+                if (subscriber.product_ids is not None and
+                        product_id not in subscriber.product_ids):
+                    continue
+                key = (product_id, subscriber.depth)
+                if key not in values:
+                    value = self._value(product_id, subscriber.depth)
+                    values[key] = (value if value != self._published.get(key)
+                                   else None)
+                if values[key] is not None:
+                    subscriber._put(product_id, values[key], published)
+            for key, value in values.items():
+                if value is not None:
+                    self._published[key] = value
+
+    async def run(self, max_messages=1000):
+        """Applies messages and publishes the changes until cancelled."""
+        while True:
+            await self.orderbook.handle_batch(max_messages)
+            self.publish()
@@ -0,0 +1,145 @@
+"""Implements an aggregated order book based on GDAX's level2 channel.
+
+Only the total size at each price level is kept, not individual orders.
+
+See: https://docs.gdax.com/#websocket-feed.
+
+"""
+
+import asyncio
+from decimal import Decimal
+import logging
+
+from sortedcontainers import SortedDict
+import aiohttp
+
+from gdax.orderbook import OrderBookError
+from gdax.websocket_feed_listener import WebSocketFeedListener
+
+
+class Level2OrderBook(WebSocketFeedListener):
+    def __init__(self, product_ids='ETH-USD', api_key=None, api_secret=None,
+                 passphrase=None, use_heartbeat=False,
+                 trade_log_file_path=None, json_loads=None,
+                 stall_timeout=None, backoff_base=0.5, backoff_cap=30.0,
+                 trade_log_format='text', trade_log_options=None):
+
+        super().__init__(product_ids=product_ids,
+                         channels=['level2'],
+                         api_key=api_key,
+                         api_secret=api_secret,
+                         passphrase=passphrase,
+                         use_heartbeat=use_heartbeat,
+                         trade_log_file_path=trade_log_file_path,
+                         json_loads=json_loads,
+                         stall_timeout=stall_timeout,
+                         backoff_base=backoff_base,
+                         backoff_cap=backoff_cap,
+                         trade_log_format=trade_log_format,
+                         trade_log_options=trade_log_options)
+
+        self._asks = {product_id: SortedDict()
+                      for product_id in self.product_ids}
+        self._bids = {product_id: SortedDict()
+                      for product_id in self.product_ids}
+
+        for msg_type, handler in [('error', self._on_error),
+                                  ('subscriptions', self._ignore),
+                                  ('heartbeat', self._ignore),
+                                  ('snapshot', self._on_snapshot),
+                                  ('l2update', self._on_l2update)]:
+            self.register_handler(msg_type, handler)
+
+    async def handle_message(self):
+        try:
+            message = await self._recv()
+        except aiohttp.ServerDisconnectedError as exc:
+            await self._reconnect(exc)
+            return
+
+        return self._handle(message)
+
+    def _handle(self, message):
+        self._dispatch(message)
+        if message['type'] == 'subscriptions':
+            return
+        return message
+
+    def _unhandled(self, message):
+        raise OrderBookError(f'unknown message type {message["type"]}')
+
+    def _on_error(self, message):
+        raise OrderBookError(f'Error: {message["message"]}')
+
+    def _ignore(self, message):
+        pass
+
+    def _on_snapshot(self, message):
+        self.load_snapshot(message['product_id'], message)
+
+    def _on_l2update(self, message):
+        product_id = message['product_id']
+        for side, price, size in message['changes']:
+            self.update(product_id, side, price, size)
+
+    def load_snapshot(self, product_id, snapshot):
+        self._bids[product_id] = SortedDict(
+            (Decimal(price), Decimal(size))
+            for price, size in snapshot['bids'])
+        self._asks[product_id] = SortedDict(
+            (Decimal(price), Decimal(size))
+            for price, size in snapshot['asks'])
+
+    def update(self, product_id, side, price, size):
+        tree = (self._bids[product_id] if side == 'buy'
+                else self._asks[product_id])
+        price = Decimal(price)
+        size = Decimal(size)
+        if size:
+            tree[price] = size
+        else:
+            tree.pop(price, None)
+
+    def get_current_book(self, product_id):
+        return {
+            'asks': [[price, size]
+                     for price, size in self._asks[product_id].items()],
+            'bids': [[price, size]
+                     for price, size in self._bids[product_id].items()],
+        }
+
+    def get_ask(self, product_id):
+        return self._asks[product_id].peekitem(0)[0]
+
+    def get_asks(self, product_id, price):
+        return self._asks[product_id].get(price)
+
+    def get_bid(self, product_id):
+        return self._bids[product_id].peekitem(-1)[0]
+
+    def get_bids(self, product_id, price):
+        return self._bids[product_id].get(price)
+
+    def get_min_ask_depth(self, product_id):
+        return self._asks[product_id].peekitem(0)[1]
+
+    def get_max_bid_depth(self, product_id):
+        return self._bids[product_id].peekitem(-1)[1]
+
+
+async def run_level2_orderbook():  # pragma: no cover
+    async with Level2OrderBook(['ETH-USD', 'BTC-USD']) as orderbook:
+        async for message in orderbook:
+            if message['type'] != 'l2update':
+                continue
+            product_id = message['product_id']
+            logging.info('%s %10s %10s %10s %10s', product_id,
+                         orderbook.get_bid(product_id),
+                         orderbook.get_max_bid_depth(product_id),
+                         orderbook.get_ask(product_id),
+                         orderbook.get_min_ask_depth(product_id))
+
+if __name__ == "__main__":  # pragma: no cover
+    logging.getLogger().setLevel(logging.INFO)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(run_level2_orderbook())
@@ -0,0 +1,145 @@
+"""Typed messages of GDAX's Websocket full channel.
+
+The messages which can change a level 3 order book are parsed once into
+slotted objects, with their prices and sizes converted by parse_price and
+parse_size (Decimal by default). They can still be read like the dicts they
+are parsed from, e.g. message['type'] or 'price' in message.
+
+See: https://docs.gdax.com/#the-code-classprettyprintfullcode-channel.
+
+"""
+
+from decimal import Decimal
+
+
+def _optional(data, key, parse):
+    value = data.get(key)
+    return None if value is None else parse(value)
+
+
+class Message(object):
+    __slots__ = ('product_id', 'sequence', 'time')
+    type = None
+
+    @classmethod
+    def from_dict(cls, data, parse_price=Decimal, parse_size=Decimal):
+        message = cls.__new__(cls)
+        message.product_id = data.get('product_id')
+        message.sequence = data.get('sequence')
+        message.time = data.get('time')
+        message._parse(data, parse_price, parse_size)
+        return message
+
+    def _parse(self, data, parse_price, parse_size):
+        raise NotImplementedError
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __contains__(self, key):
+        return getattr(self, key, None) is not None
+
+    def _fields(self):
+        for cls in reversed(type(self).__mro__[:-1]):
+            yield from cls.__slots__
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field)
+                   for field in self._fields())
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f'{field}={getattr(self, field)!r}'
+                           for field in self._fields())
+        return f'{type(self).__name__}({fields})'
+
+
+class Received(Message):
+    __slots__ = ('order_id', 'side', 'order_type', 'price', 'size', 'funds')
+    type = 'received'
+
+    def _parse(self, data, parse_price, parse_size):
+        self.order_id = data['order_id']
+        self.side = data['side']
+        self.order_type = data.get('order_type')
+        self.price = _optional(data, 'price', parse_price)
+        self.size = _optional(data, 'size', parse_size)
+        self.funds = _optional(data, 'funds', Decimal)
+
+
+class Open(Message):
+    __slots__ = ('order_id', 'side', 'price', 'remaining_size')
+    type = 'open'
+
+    def _parse(self, data, parse_price, parse_size):
+        # snapshot rows are passed as {'id', 'side', 'price', 'size'}
+        self.order_id = data.get('order_id') or data['id']
+        self.side = data['side']
+        self.price = parse_price(data['price'])
+        self.remaining_size = parse_size(data.get('size') or
+                                         data['remaining_size'])
+
+
+class Done(Message):
+    __slots__ = ('order_id', 'side', 'reason', 'price', 'remaining_size')
+    type = 'done'
+
+    def _parse(self, data, parse_price, parse_size):
+        self.order_id = data['order_id']
+        self.side = data['side']
+        self.reason = data.get('reason')
+        # market orders have no price
+        self.price = _optional(data, 'price', parse_price)
+        self.remaining_size = _optional(data, 'remaining_size', parse_size)
+
+
+class Match(Message):
+    __slots__ = ('trade_id', 'maker_order_id', 'taker_order_id', 'side',
+                 'price', 'size')
+    type = 'match'
+
+    def _parse(self, data, parse_price, parse_size):
+        self.trade_id = data.get('trade_id')
+        self.maker_order_id = data['maker_order_id']
+        self.taker_order_id = data.get('taker_order_id')
+        self.side = data['side']
+        self.price = parse_price(data['price'])
+        self.size = parse_size(data['size'])
+
+
+class Change(Message):
+    __slots__ = ('order_id', 'side', 'price', 'new_size', 'old_size',
+                 'new_funds', 'old_funds')
+    type = 'change'
+
+    def _parse(self, data, parse_price, parse_size):
+        self.order_id = data['order_id']
+        self.side = data['side']
+        # missing price means market order
+        self.price = _optional(data, 'price', parse_price)
+        self.new_size = _optional(data, 'new_size', parse_size)
+        self.old_size = _optional(data, 'old_size', parse_size)
+        self.new_funds = _optional(data, 'new_funds', Decimal)
+        self.old_funds = _optional(data, 'old_funds', Decimal)
+
+
+MESSAGE_TYPES = {cls.type: cls for cls in [Received, Open, Done, Match,
+                                           Change]}
+
+
+def parse_message(data, parse_price=Decimal, parse_size=Decimal):
+    """Returns the typed message for a decoded frame, or the frame itself if
+    its type has no message class."""
+    cls = MESSAGE_TYPES.get(data.get('type'))
+    if cls is None:
+        return data
+    return cls.from_dict(data, parse_price, parse_size)
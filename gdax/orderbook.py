@@ -5,96 +5,536 @@ See: https://docs.gdax.com/#websocket-feed.
 """
 
 import asyncio
+from collections import OrderedDict
 from decimal import Decimal
+from functools import partial
+import gc
 import json
 import logging
-from operator import itemgetter
+import time
 
 from sortedcontainers import SortedDict
 import aiohttp
 
 import gdax.trader
 import gdax.utils
-from gdax.websocket_feed_listener import WebSocketFeedListener
+from gdax.messages import Change, Match, Open, parse_message
+from gdax.websocket_feed_listener import (WebSocketFeedListener,
+                                          sniff_type, summarize)
+
+
+# sizes on the feed have 8 decimals regardless of the product
+SIZE_INCREMENT = Decimal('0.00000001')
+
+
+# message types which do not change the book, except for done messages
+# with a price
+IGNORED_TYPES = frozenset(['received', 'heartbeat', 'done'])
+
+# message types which are applied in sequence order
+SEQUENCED_TYPES = IGNORED_TYPES | {'open', 'match', 'change'}
 
 
 class OrderBookError(Exception):
     pass
 
 
+class Order(object):
+    """A resting order.
+
+    The price and side are not stored per order, they are those of the
+    PriceLevel the order rests at.
+
+    """
+    __slots__ = ('id', 'size', 'level')
+
+    def __init__(self, order_id, size):
+        self.id = order_id
+        self.size = size
+        self.level = None
+
+    @property
+    def price(self):
+        return self.level.price
+
+    @property
+    def side(self):
+        return self.level.side
+
+    def __repr__(self):
+        return f'Order({self.id!r}, {self.size!r})'
+
+
+class PriceLevel(object):
+    """Orders resting at a single price, in time priority (FIFO) order.
+
+    Orders are keyed by their id, so appending, removing an arbitrary order
+    and peeking at the head of the queue are all O(1). The total size resting
+    at the level is maintained incrementally; order sizes must be updated
+    through resize() to keep it correct.
+
+    """
+    __slots__ = ('price', 'side', '_orders', 'size')
+
+    def __init__(self, price, side, orders=()):
+        self.price = price
+        self.side = side
+        self._orders = OrderedDict()
+        self.size = 0
+        for order in orders:
+            self.append(order)
+
+    @property
+    def count(self):
+        return len(self._orders)
+
+    def append(self, order):
+        order.level = self
+        self._orders[order.id] = order
+        self.size += order.size
+
+    def remove(self, order_id):
+        order = self._orders.pop(order_id, None)
+        if order is not None:
+            self.size -= order.size
+        return order
+
+    def resize(self, order, size):
+        self.size += size - order.size
+        order.size = size
+
+    def first(self):
+        return next(iter(self._orders.values()))
+
+    def __contains__(self, order_id):
+        return order_id in self._orders
+
+    def __iter__(self):
+        return iter(self._orders.values())
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __eq__(self, other):
+        if isinstance(other, (PriceLevel, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'PriceLevel({self.price!r}, {self.side!r}, {list(self)!r})'
+
+
+def _copy_orders(tree):
+    return [(price, order.size, order.id)
+            for price, level in tree.items() for order in level]
+
+
+def _book_json(sequence, asks, bids, to_price, to_size):
+    return json.dumps({
+        'sequence': sequence,
+        'asks': [[to_price(price), to_size(size), order_id]
+                 for price, size, order_id in asks],
+        'bids': [[to_price(price), to_size(size), order_id]
+                 for price, size, order_id in bids],
+    }, default=str, separators=(',', ':'))
+
+
 class OrderBook(WebSocketFeedListener):
+    """Level 3 order book for one or more products.
+
+    With fixed_point=True, prices are kept as integer multiples of each
+    product's quote_increment and sizes as multiples of SIZE_INCREMENT.
+    The getters still take and return Decimals, but the PriceLevel and Order
+    records hold the raw integers.
+
+    With buffered_start=True, entering the context only subscribes to the
+    feed. The snapshots are fetched in the background while handle_message
+    buffers each product's messages, which are replayed on top of the
+    snapshot once it arrives. wait_for_sync() waits for every book to become
+    consistent and sync_durations records how long that took per product.
+    Network errors while fetching a snapshot are retried; any other error
+    is raised by the next handle_message or wait_for_sync, and again until
+    the context is re-entered.
+
+    With skip_ignored=True, received, heartbeat and market order done
+    frames, which do not change the book, are not decoded: handle_message
+    returns only their type, product_id and sequence.
+
+    With typed_messages=True, handle_message returns open, done, match,
+    change and received messages as gdax.messages objects, whose prices and
+    sizes are parsed once into the book's representation of the product.
+    add, match and change accept these objects as well as dicts.
+
+    Messages of SEQUENCED_TYPES go through the sequence checks before being
+    dispatched to their handler. Other registered types, e.g. of an extra
+    channel, are dispatched as they arrive; unregistered types raise
+    OrderBookError.
+
+    Callbacks registered with on_top_of_book, on_trade and on_level_change
+    are called when a message changes the best bid or ask (or their sizes),
+    for each match, and when the total size at a price changes,
+    respectively.
+
+    With a trade log, checkpoint_messages and checkpoint_interval write a
+    checkpoint of a product's book to the log every checkpoint_messages
+    messages or checkpoint_interval seconds of that product, so that
+    replays (see gdax.replay) can start close to any point of the log.
+    Writing a checkpoint copies the orders of the book on the event loop,
+    about 0.5 microseconds per order, and leaves their serialization to the
+    writer thread of the trade log.
+
+    Snapshots are decoded in snapshot_executor, the event loop's default
+    thread pool if None. Pass a concurrent.futures.ProcessPoolExecutor to
+    keep the decoding from competing with the event loop for the GIL.
+
+    """
+
     def __init__(self, product_ids='ETH-USD', api_key=None, api_secret=None,
                  passphrase=None, use_heartbeat=False,
-                 trade_log_file_path=None):
+                 trade_log_file_path=None, fixed_point=False,
+                 buffered_start=False, snapshot_executor=None,
+                 json_loads=None, skip_ignored=False, typed_messages=False,
+                 connections=1, gap_timeout=1.0, stall_timeout=None,
+                 backoff_base=0.5, backoff_cap=30.0, trade_log_format='text',
+                 trade_log_options=None, checkpoint_messages=None,
+                 checkpoint_interval=None):
 
         super().__init__(product_ids=product_ids,
                          api_key=api_key,
                          api_secret=api_secret,
                          passphrase=passphrase,
                          use_heartbeat=use_heartbeat,
-                         trade_log_file_path=trade_log_file_path)
+                         trade_log_file_path=trade_log_file_path,
+                         json_loads=json_loads,
+                         skip_types=IGNORED_TYPES if skip_ignored else None,
+                         typed_messages=typed_messages,
+                         connections=connections,
+                         gap_timeout=gap_timeout,
+                         stall_timeout=stall_timeout,
+                         backoff_base=backoff_base,
+                         backoff_cap=backoff_cap,
+                         trade_log_format=trade_log_format,
+                         trade_log_options=trade_log_options)
 
         if not isinstance(product_ids, list):
             product_ids = [product_ids]
 
-        self.traders = {product_id: gdax.trader.Trader(product_id=product_id)
-                        for product_id in product_ids}
+        self.traders = {
+            product_id: gdax.trader.Trader(product_id=product_id,
+                                           executor=snapshot_executor)
+            for product_id in product_ids}
         self._asks = {product_id: SortedDict() for product_id in product_ids}
         self._bids = {product_id: SortedDict() for product_id in product_ids}
+        # order id -> order, for every order resting in the book
+        self._orders = {product_id: {} for product_id in product_ids}
+        # cached touch prices, None when they need to be looked up again
+        self._best_ask = {product_id: None for product_id in product_ids}
+        self._best_bid = {product_id: None for product_id in product_ids}
         self._sequences = {product_id: None for product_id in product_ids}
 
+        self.fixed_point = fixed_point
+        self._price_units = {product_id: gdax.utils.DecimalUnits()
+                             for product_id in product_ids}
+        self._size_units = dict(self._price_units)
+
+        # products waiting for a new snapshot, on startup or after a
+        # sequence gap
+        self.buffered_start = buffered_start
+        self._resync_buffers = {}
+        self._resync_tasks = {}
+        self._resync_started = {}
+        # raised by _handle once a resync failed
+        self._resync_error = None
+        # seconds from requesting a snapshot until the book was consistent
+        self.sync_durations = {product_id: None for product_id in product_ids}
+
+        self._top_of_book_callbacks = []
+        self._trade_callbacks = []
+        self._level_callbacks = []
+
+        self.checkpoint_messages = checkpoint_messages
+        self.checkpoint_interval = checkpoint_interval
+        # messages applied and time since each product's last checkpoint,
+        # None without checkpoints
+        self._checkpoint_counts = None
+        if checkpoint_messages is not None or checkpoint_interval is not None:
+            self._checkpoint_counts = {product_id: 0
+                                       for product_id in product_ids}
+            self._checkpoint_times = {product_id: time.time()
+                                      for product_id in product_ids}
+
+        for msg_type, handler in [('error', self._on_error),
+                                  ('subscriptions', self._ignore),
+                                  ('heartbeat', self._ignore),
+                                  ('received', self._ignore),
+                                  ('open', self._on_open),
+                                  ('done', self._on_done),
+                                  ('match', self._on_match),
+                                  ('change', self._on_change)]:
+            self.register_handler(msg_type, handler)
+
+    async def _init_fixed_point(self):
+        products = await next(iter(self.traders.values())).get_products()
+        increments = {product['id']: product['quote_increment']
+                      for product in products}
+        size_units = gdax.utils.FixedPoint(SIZE_INCREMENT)
+        for product_id in self.product_ids:
+            self._price_units[product_id] = gdax.utils.FixedPoint(
+                increments[product_id])
+            self._size_units[product_id] = size_units
+
     async def __aenter__(self):
         await super().__aenter__()
 
+        if self.fixed_point:
+            await self._init_fixed_point()
+
+        if self.buffered_start:
+            for product_id in self.product_ids:
+                self._start_resync(product_id)
+            return self
+
         # get order book snapshot
         books = await asyncio.gather(
             *[trader.get_product_order_book(level=3)
               for trader in self.traders.values()]
         )
-        if self._trade_file:
-            await asyncio.gather(
-                *[self._trade_file.write(
-                    f'B {product_id} '
-                    f'{json.dumps(book, cls=gdax.utils.DecimalEncoder)}\n')
-                  for product_id, book in zip(self.product_ids, books)])
+        await asyncio.gather(
+            *[self._log_snapshot(product_id, book)
+              for product_id, book in zip(self.product_ids, books)])
 
         for product_id, book in zip(self.product_ids, books):
-            for bid in book['bids']:
-                self.add(product_id, {
-                    'id': bid[2],
-                    'side': 'buy',
-                    'price': Decimal(bid[0]),
-                    'size': Decimal(bid[1])
-                })
-            for ask in book['asks']:
-                self.add(product_id, {
-                    'id': ask[2],
-                    'side': 'sell',
-                    'price': Decimal(ask[0]),
-                    'size': Decimal(ask[1])
-                })
-            self._sequences[product_id] = book['sequence']
+            self._load_snapshot(product_id, book)
         return self
 
+    async def __aexit__(self, exc_type, exc, traceback):
+        for task in self._resync_tasks.values():
+            task.cancel()
+        self._resync_tasks.clear()
+        self._resync_buffers.clear()
+        self._resync_started.clear()
+        self._resync_error = None
+        return await super().__aexit__(exc_type, exc, traceback)
+
+    async def _log_snapshot(self, product_id, book):
+        if self.trade_log is not None:
+            self.trade_log.log_snapshot(
+                product_id, json.dumps(book, cls=gdax.utils.DecimalEncoder))
+
+    def _load_snapshot(self, product_id, book):
+        """Replaces the book of a product with a level 3 snapshot.
+
+        The snapshot is sorted by price, so orders are grouped into levels by
+        comparing each price with the previous one. Each price is parsed once
+        and each side's SortedDict is built in a single pass. The cyclic
+        garbage collector is paused meanwhile, as the many new records would
+        otherwise trigger repeated collections.
+
+        """
+        top = self._top_of_book(product_id)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._load_levels(product_id, book)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._sequences[product_id] = book['sequence']
+        self._check_top_of_book(product_id, top)
+
+    def _load_levels(self, product_id, book):
+        self._best_ask[product_id] = self._best_bid[product_id] = None
+        index = self._orders[product_id] = {}
+        for side, trees, rows in [('buy', self._bids, book['bids']),
+                                  ('sell', self._asks, book['asks'])]:
+            levels = self._group_levels(product_id, side, rows, index)
+            tree = SortedDict((level.price, level) for level in levels)
+            if len(tree) != len(levels):
+                # unsorted snapshot, some prices spanned several groups
+                for level in levels:
+                    for order in level:
+                        del index[order.id]
+                tree = trees[product_id] = SortedDict()
+                for price, size, order_id in rows:
+                    self._add(product_id, {'id': order_id, 'side': side,
+                                           'price': price, 'size': size})
+            trees[product_id] = tree
+
+    def _group_levels(self, product_id, side, rows, index):
+        parse_price = self._price_units[product_id].parse
+        parse_size = self._size_units[product_id].parse
+        levels = []
+        last_price = level = None
+        for price, size, order_id in rows:
+            if price != last_price:
+                last_price = price
+                level = PriceLevel(parse_price(price), side)
+                levels.append(level)
+            order = index[order_id] = Order(order_id, parse_size(size))
+            level.append(order)
+        return levels
+
+    def _start_resync(self, product_id, message=None):
+        """Re-fetches the snapshot of a single product in the background.
+
+        Until it arrives, the product's messages are buffered (starting with
+        the message that revealed the gap, if any) and the other products
+        keep streaming.
+
+        """
+        self._resync_buffers[product_id] = [] if message is None else [message]
+        # kept across repeated gaps until the book is consistent again
+        self._resync_started.setdefault(product_id, time.time())
+        self._resync_tasks[product_id] = asyncio.ensure_future(
+            self._resync(product_id))
+
+    async def wait_for_sync(self, timeout=None):
+        """Waits until the book of every product is consistent.
+
+        Raises asyncio.TimeoutError if that takes more than timeout seconds.
+        Messages received in the meantime stay in the websocket until
+        handle_message is called again.
+
+        """
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        # applying a snapshot can reveal another gap and start a new task
+        while self._resync_tasks or self._resync_error is not None:
+            if self._resync_error is not None:
+                raise self._resync_error
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is None or remaining > 0:
+                _, pending = await asyncio.wait(
+                    list(self._resync_tasks.values()), timeout=remaining)
+            if remaining is not None and (remaining <= 0 or pending):
+                raise asyncio.TimeoutError(
+                    'Order books not synchronized in {} seconds: {}'.format(
+                        timeout, sorted(self._resync_tasks)))
+
+    async def _resync(self, product_id):
+        try:
+            while True:
+                try:
+                    book = await self.traders[
+                        product_id].get_product_order_book(level=3)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                    logging.error(f'Error: snapshot of {product_id} failed: '
+                                  f'{exc!r}. Retrying.')
+                    await asyncio.sleep(1)
+            await self._log_snapshot(product_id, book)
+            del self._resync_tasks[product_id]
+            self._apply_snapshot(product_id, book)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logging.error(f'Error: re-synchronizing {product_id} failed: '
+                          f'{exc!r}.')
+            if self._resync_tasks.get(product_id) is \
+                    asyncio.Task.current_task():
+                del self._resync_tasks[product_id]
+            self._resync_error = exc
+
+    def _apply_snapshot(self, product_id, book):
+        """Loads a snapshot, then the messages buffered while waiting for
+        it."""
+        self._load_snapshot(product_id, book)
+        buffered = self._resync_buffers.pop(product_id, [])
+        for i, message in enumerate(buffered):
+            if product_id in self._resync_buffers:
+                # another gap, the rest waits for the next snapshot
+                self._resync_buffers[product_id] += buffered[i:]
+                break
+            self._process(product_id, message)
+        if product_id in self._resync_buffers:
+            # the last message may have revealed a gap as well
+            return
+        started = self._resync_started.pop(product_id, None)
+        if started is not None:
+            self.sync_durations[product_id] = time.time() - started
+        logging.info(f'{product_id} synchronized at sequence '
+                     f'{self._sequences[product_id]}.')
+
     async def handle_message(self):
         try:
             message = await self._recv()
         except aiohttp.ServerDisconnectedError as exc:
-            logging.error(
-                f'Error: Exception: f{exc}. Re-initializing websocket.')
-            await self.__aexit__(None, None, None)
-            await self.__aenter__()
+            await self._reconnect(exc)
             return
 
-        msg_type = message['type']
+        return self._handle(message)
 
-        if msg_type == 'error':
-            raise OrderBookError(f'Error: {message["message"]}')
+    async def handle_batch(self, max_messages=1000):
+        """Applies every message that is already available.
 
-        if msg_type == 'subscriptions':
-            return  # must filter out here because the subscriptions message does not have a product_id key
+        Waits for the first message, then keeps applying messages for as long
+        as the websocket has frames buffered, up to max_messages. Returns the
+        set of product ids whose top of book (best bid and ask, with their
+        sizes) changed during the batch.
+
+        """
+        tops = {}
+        for _ in range(max_messages):
+            try:
+                message = await self._recv()
+            except aiohttp.ServerDisconnectedError as exc:
+                await self._reconnect(exc)
+                break
+            product_id = message.get('product_id')
+            if product_id in self._sequences and product_id not in tops:
+                tops[product_id] = self._top_of_book(product_id)
+            self._handle(message)
+            if not self._pending_frames():
+                break
+        return {product_id for product_id, top in tops.items()
+                if self._top_of_book(product_id) != top}
+
+    def _handle(self, message):
+        if self._resync_error is not None:
+            raise self._resync_error
+        msg_type = message['type']
+        if msg_type not in SEQUENCED_TYPES:
+            self._dispatch(message)
+            if msg_type == 'subscriptions':
+                return
+            return message
 
         product_id = message['product_id']
+        if product_id in self._resync_buffers:
+            self._resync_buffers[product_id].append(message)
+            return
+
+        return self._process(product_id, message)
+
+    def _parse_message(self, message):
+        product_id = message.get('product_id')
+        if product_id not in self._price_units:
+            return message
+        return parse_message(message, self._price_units[product_id].parse,
+                             self._size_units[product_id].parse)
+
+    def _to_message(self, cls, product_id, message):
+        if isinstance(message, cls):
+            return message
+        return cls.from_dict(message, self._price_units[product_id].parse,
+                             self._size_units[product_id].parse)
+
+    def _on_drop(self, json_data):
+        product_id = summarize(sniff_type(json_data), json_data).get(
+            'product_id')
+        if product_id in self._sequences and \
+                product_id not in self._resync_buffers:
+            logging.error(f'Error: receive queue full. Re-synchronizing '
+                          f'{product_id}.')
+            self._start_resync(product_id)
+
+    def _skip(self, msg_type, json_data):
+        # done messages of resting orders have a price and change the book
+        return msg_type != 'done' or '"price"' not in json_data
+
+    def _process(self, product_id, message):
         assert self._sequences[product_id] is not None
         sequence = message['sequence']
 
@@ -104,97 +544,191 @@ class OrderBook(WebSocketFeedListener):
             return message
         elif sequence > self._sequences[product_id] + 1:
             logging.error(
-                'Error: messages missing ({} - {}). Re-initializing websocket.'
-                .format(sequence, self._sequences[product_id]))
-            await self.__aexit__(None, None, None)
-            await self.__aenter__()
+                'Error: messages missing ({} - {}). Re-synchronizing {}.'
+                .format(sequence, self._sequences[product_id], product_id))
+            self._start_resync(product_id, message)
             return
 
-        if msg_type == 'open':
-            self.add(product_id, message)
-        elif msg_type == 'done' and 'price' in message:
-            self.remove(product_id, message)
-        elif msg_type == 'match':
-            self.match(product_id, message)
-        elif msg_type == 'change':
-            self.change(product_id, message)
-        elif msg_type == 'heartbeat':
-            pass
-        elif msg_type == 'received':
-            pass
-        elif msg_type == 'done':
-            pass
+        if self._top_of_book_callbacks:
+            top = self._top_of_book(product_id)
+            self._dispatch(message)
+            self._sequences[product_id] = sequence
+            self._check_top_of_book(product_id, top)
         else:
-            raise OrderBookError(f'unknown message type {msg_type}')
-
-        self._sequences[product_id] = sequence
+            self._dispatch(message)
+            self._sequences[product_id] = sequence
+        if self._checkpoint_counts is not None:
+            self._count_checkpoint(product_id)
         return message
 
+    def _count_checkpoint(self, product_id):
+        self._checkpoint_counts[product_id] += 1
+        if (self.checkpoint_messages is not None and
+                self._checkpoint_counts[product_id] >=
+                self.checkpoint_messages or
+                self.checkpoint_interval is not None and
+                time.time() - self._checkpoint_times[product_id] >=
+                self.checkpoint_interval):
+            self.write_checkpoint(product_id)
+
+    def write_checkpoint(self, product_id):
+        """Logs the whole book of a product to the trade log, as a 'C'
+        entry which replays can start from.
+
+        Only the orders are copied here, the writer thread of the trade log
+        serializes them.
+
+        """
+        if self.trade_log is None:
+            return
+        self.trade_log.log_checkpoint(product_id, partial(
+            _book_json, self._sequences[product_id],
+            _copy_orders(self._asks[product_id]),
+            _copy_orders(self._bids[product_id]),
+            self._price_units[product_id].to_decimal,
+            self._size_units[product_id].to_decimal))
+        if self._checkpoint_counts is not None:
+            self._checkpoint_counts[product_id] = 0
+            self._checkpoint_times[product_id] = time.time()
+
+    def on_top_of_book(self, callback):
+        """Calls callback(product_id, (bid, bid_size, ask, ask_size)) when
+        the top of book of a product changes."""
+        self._top_of_book_callbacks.append(callback)
+        return callback
+
+    def on_trade(self, callback):
+        """Calls callback(product_id, message) for each match message."""
+        self._trade_callbacks.append(callback)
+        return callback
+
+    def on_level_change(self, callback):
+        """Calls callback(product_id, side, price, size) when the total size
+        resting at a price changes, with size 0 for a removed level.
+
+        Snapshots do not trigger it.
+
+        """
+        self._level_callbacks.append(callback)
+        return callback
+
+    def remove_callback(self, callback):
+        for callbacks in [self._top_of_book_callbacks, self._trade_callbacks,
+                          self._level_callbacks]:
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def _check_top_of_book(self, product_id, top):
+        if (self._top_of_book_callbacks and
+                self._top_of_book(product_id) != top):
+            top = self.get_top_of_book(product_id)
+            for callback in self._top_of_book_callbacks:
+                callback(product_id, top)
+
+    def _level_changed(self, product_id, level):
+        price = self._price_units[product_id].to_decimal(level.price)
+        size = self._size_units[product_id].to_decimal(level.size)
+        for callback in self._level_callbacks:
+            callback(product_id, level.side, price, size)
+
+    def _unhandled(self, message):
+        raise OrderBookError(f'unknown message type {message["type"]}')
+
+    def _on_error(self, message):
+        raise OrderBookError(f'Error: {message["message"]}')
+
+    def _ignore(self, message):
+        pass
+
+    def _on_open(self, message):
+        self.add(message['product_id'], message)
+
+    def _on_done(self, message):
+        # market orders never rested in the book
+        if 'price' in message:
+            self.remove(message['product_id'], message)
+
+    def _on_match(self, message):
+        product_id = message['product_id']
+        self.match(product_id, message)
+        for callback in self._trade_callbacks:
+            callback(product_id, message)
+
+    def _on_change(self, message):
+        self.change(message['product_id'], message)
+
+    def _tree(self, product_id, side):
+        return (self._bids[product_id] if side == 'buy'
+                else self._asks[product_id])
+
     def add(self, product_id, order):
-        order = {
-            'id': order.get('order_id') or order['id'],
-            'side': order['side'],
-            'price': Decimal(order['price']),
-            'size': Decimal(order.get('size') or order['remaining_size'])
-        }
-        if order['side'] == 'buy':
-            bids = self.get_bids(product_id, order['price'])
-            if bids is None:
-                bids = [order]
-            else:
-                bids.append(order)
-            self.set_bids(product_id, order['price'], bids)
+        level = self._add(product_id, order)
+        if self._level_callbacks:
+            self._level_changed(product_id, level)
+
+    def _add(self, product_id, order):
+        order = self._to_message(Open, product_id, order)
+        side = order.side
+        price = order.price
+        tree = self._tree(product_id, side)
+        level = tree.get(price)
+        if level is None:
+            level = tree[price] = PriceLevel(price, side)
+            self._improve_touch(product_id, side, price)
+        resting = Order(order.order_id, order.remaining_size)
+        level.append(resting)
+        self._orders[product_id][resting.id] = resting
+        return level
+
+    def _discard(self, product_id, order):
+        del self._orders[product_id][order.id]
+        level = order.level
+        level.remove(order.id)
+        if not level:
+            del self._tree(product_id, level.side)[level.price]
+            self._invalidate_touch(product_id, level.side, level.price)
+        if self._level_callbacks:
+            self._level_changed(product_id, level)
+
+    def _improve_touch(self, product_id, side, price):
+        if side == 'buy':
+            best = self._best_bid[product_id]
+            if best is not None and price > best:
+                self._best_bid[product_id] = price
         else:
-            asks = self.get_asks(product_id, order['price'])
-            if asks is None:
-                asks = [order]
-            else:
-                asks.append(order)
-            self.set_asks(product_id, order['price'], asks)
+            best = self._best_ask[product_id]
+            if best is not None and price < best:
+                self._best_ask[product_id] = price
+
+    def _invalidate_touch(self, product_id, side, price):
+        if side == 'buy':
+            if price == self._best_bid[product_id]:
+                self._best_bid[product_id] = None
+        elif price == self._best_ask[product_id]:
+            self._best_ask[product_id] = None
 
     def remove(self, product_id, order):
-        price = Decimal(order['price'])
-        if order['side'] == 'buy':
-            bids = self.get_bids(product_id, price)
-            if bids is not None:
-                bids = [o for o in bids if o['id'] != order['order_id']]
-                if bids:
-                    self.set_bids(product_id, price, bids)
-                else:
-                    self.remove_bids(product_id, price)
-        else:
-            asks = self.get_asks(product_id, price)
-            if asks is not None:
-                asks = [o for o in asks if o['id'] != order['order_id']]
-                if asks:
-                    self.set_asks(product_id, price, asks)
-                else:
-                    self.remove_asks(product_id, price)
+        order = self._orders[product_id].get(order['order_id'])
+        if order is not None:
+            self._discard(product_id, order)
 
     def match(self, product_id, order):
-        size = Decimal(order['size'])
-        price = Decimal(order['price'])
+        maker = self._orders[product_id].get(order['maker_order_id'])
+        if maker is None:
+            return
+        assert maker.level.first() is maker
 
-        if order['side'] == 'buy':
-            bids = self.get_bids(product_id, price)
-            if not bids:
-                return
-            assert bids[0]['id'] == order['maker_order_id']
-            if bids[0]['size'] == size:
-                self.set_bids(product_id, price, bids[1:])
-            else:
-                bids[0]['size'] -= size
-                self.set_bids(product_id, price, bids)
+        size = self._to_message(Match, product_id, order).size
+        if maker.size == size:
+            self._discard(product_id, maker)
         else:
-            asks = self.get_asks(product_id, price)
-            if not asks:
-                return
-            assert asks[0]['id'] == order['maker_order_id']
-            if asks[0]['size'] == size:
-                self.set_asks(product_id, price, asks[1:])
-            else:
-                asks[0]['size'] -= size
-                self.set_asks(product_id, price, asks)
+            self._resize(product_id, maker, maker.size - size)
+
+    def _resize(self, product_id, order, size):
+        if size != order.size:
+            order.level.resize(order, size)
+            if self._level_callbacks:
+                self._level_changed(product_id, order.level)
 
     def change(self, product_id, order):
         if 'new_size' not in order:
@@ -202,32 +736,20 @@ class OrderBook(WebSocketFeedListener):
             # TODO
             raise NotImplementedError(
                 'change operation not implemented with missing new_size')
-        else:
-            new_size = Decimal(order['new_size'])
-
-        tree = (self._asks[product_id] if order['side'] == 'sell'
-                else self._bids[product_id])
-
-        if 'price' in order:
-            price = Decimal(order['price'])
-        else:
-            # missing price means market price
-            price = (tree.min_key() if order['side'] == 'sell'
-                     else tree.max_key())
-
-        node = tree.get(price)
 
         # TODO: check old_size
-        if node is None or not any(o['id'] == order['order_id'] for o in node):
+        resting = self._orders[product_id].get(order['order_id'])
+        if resting is None:
             return
 
-        index = list(map(itemgetter('id'), node)).index(order['order_id'])
-        if 'new_size' in order:
-            node[index]['size'] = new_size
+        order = self._to_message(Change, product_id, order)
+        self._resize(product_id, resting, order.new_size)
         if 'new_funds' in order:  # pragma: no cover
             assert False, 'This should not happen.'
 
     def get_current_book(self, product_id):
+        prices = self._price_units[product_id]
+        sizes = self._size_units[product_id]
         result = {
             'sequence': self._sequences[product_id],
             'asks': [],
@@ -240,9 +762,10 @@ class OrderBook(WebSocketFeedListener):
                 this_ask = self._asks[product_id][ask]
             except KeyError:
                 continue
+            price = prices.to_decimal(ask)
             for order in this_ask:
                 result['asks'].append(
-                    [order['price'], order['size'], order['id']])
+                    [price, sizes.to_decimal(order.size), order.id])
         for bid in self._bids[product_id]:
             try:
                 # There can be a race condition here, where a price point is
@@ -250,42 +773,113 @@ class OrderBook(WebSocketFeedListener):
                 this_bid = self._bids[product_id][bid]
             except KeyError:
                 continue
+            price = prices.to_decimal(bid)
             for order in this_bid:
                 result['bids'].append(
-                    [order['price'], order['size'], order['id']])
+                    [price, sizes.to_decimal(order.size), order.id])
         return result
 
+    def _get_ask(self, product_id):
+        ask = self._best_ask[product_id]
+        if ask is None:
+            ask = self._asks[product_id].peekitem(0)[0]
+            self._best_ask[product_id] = ask
+        return ask
+
     def get_ask(self, product_id):
-        return self._asks[product_id].iloc[0]
+        return self._price_units[product_id].to_decimal(
+            self._get_ask(product_id))
 
     def get_asks(self, product_id, price):
-        return self._asks[product_id].get(price)
+        return self._asks[product_id].get(
+            self._price_units[product_id].parse(price))
 
     def remove_asks(self, product_id, price):
-        del self._asks[product_id][price]
+        self._set_level(product_id, 'sell', price, ())
 
     def set_asks(self, product_id, price, asks):
-        self._asks[product_id].update({price: asks})
+        self._set_level(product_id, 'sell', price, asks)
+
+    def _get_bid(self, product_id):
+        bid = self._best_bid[product_id]
+        if bid is None:
+            bid = self._bids[product_id].peekitem(-1)[0]
+            self._best_bid[product_id] = bid
+        return bid
 
     def get_bid(self, product_id):
-        return self._bids[product_id].iloc[-1]
+        return self._price_units[product_id].to_decimal(
+            self._get_bid(product_id))
 
     def get_bids(self, product_id, price):
-        return self._bids[product_id].get(price)
+        return self._bids[product_id].get(
+            self._price_units[product_id].parse(price))
 
     def remove_bids(self, product_id, price):
-        del self._bids[product_id][price]
+        self._set_level(product_id, 'buy', price, ())
 
     def set_bids(self, product_id, price, bids):
-        self._bids[product_id].update({price: bids})
+        self._set_level(product_id, 'buy', price, bids)
+
+    def _set_level(self, product_id, side, price, orders):
+        self._best_ask[product_id] = self._best_bid[product_id] = None
+        price = self._price_units[product_id].parse(price)
+        tree = self._tree(product_id, side)
+        index = self._orders[product_id]
+        for order in tree.pop(price, ()):
+            del index[order.id]
+        level = PriceLevel(price, side, orders)
+        if level:
+            tree[price] = level
+            index.update((order.id, order) for order in level)
+
+    def _top_of_book(self, product_id):
+        bids = self._bids[product_id]
+        asks = self._asks[product_id]
+        bid = self._get_bid(product_id) if bids else None
+        ask = self._get_ask(product_id) if asks else None
+        return (bid, bids[bid].size if bids else None,
+                ask, asks[ask].size if asks else None)
+
+    def get_top_of_book(self, product_id):
+        """Returns the best bid, its size, the best ask and its size.
+
+        Values of an empty side are None.
+
+        """
+        bid, bid_size, ask, ask_size = self._top_of_book(product_id)
+        prices = self._price_units[product_id]
+        sizes = self._size_units[product_id]
+        if bid is not None:
+            bid, bid_size = prices.to_decimal(bid), sizes.to_decimal(bid_size)
+        if ask is not None:
+            ask, ask_size = prices.to_decimal(ask), sizes.to_decimal(ask_size)
+        return bid, bid_size, ask, ask_size
+
+    def get_depth(self, product_id, levels):
+        """Returns the total size of the best levels bids and asks, as
+        [price, size] pairs from the best price outwards."""
+        prices = self._price_units[product_id]
+        sizes = self._size_units[product_id]
+        bids = self._bids[product_id]
+        asks = self._asks[product_id]
+        return {
+            'bids': [[prices.to_decimal(price),
+                      sizes.to_decimal(bids[price].size)]
+                     for price in bids.islice(max(len(bids) - levels, 0),
+                                              reverse=True)],
+            'asks': [[prices.to_decimal(price),
+                      sizes.to_decimal(asks[price].size)]
+                     for price in asks.islice(stop=levels)],
+        }
 
     def get_min_ask_depth(self, product_id):
-        orders = self._asks[product_id].get(self._asks[product_id].iloc[0])
-        return sum([order['size'] for order in orders])
+        return self._size_units[product_id].to_decimal(
+            self._asks[product_id][self._get_ask(product_id)].size)
 
     def get_max_bid_depth(self, product_id):
-        orders = self._bids[product_id].get(self._bids[product_id].iloc[-1])
-        return sum([order['size'] for order in orders])
+        return self._size_units[product_id].to_decimal(
+            self._bids[product_id][self._get_bid(product_id)].size)
 
 
 async def run_orderbook():  # pragma: no cover
@@ -296,10 +890,7 @@ async def run_orderbook():  # pragma: no cover
         passphrase=None,
         # trade_log_file_path='trades.txt',
     ) as orderbook:
-        while True:
-            message = await orderbook.handle_message()
-            if message is None:
-                continue
+        async for message in orderbook:
             product_id = message['product_id']
             logging.info('%20s %10s %10s %10s %10s',
                          orderbook._sequences[product_id],
@@ -0,0 +1,247 @@
+"""Rebuilds order books from trade logs, without a network connection.
+
+ReplayOrderBook is an OrderBook whose frames come from the files written
+with trade_log_file_path instead of the websocket feed. Snapshot entries are
+loaded and frames are applied by the same code as on the live feed, so the
+book, the handlers and the callbacks go through the same states as they did
+when the log was recorded.
+
+With the indexes of the logs (see gdax.trade_log), seek starts the replay
+from the snapshot or checkpoint of a product closest to a sequence or time,
+and replay_to then brings the book to that sequence. book_as_of does both.
+
+"""
+
+import asyncio
+from decimal import Decimal
+from itertools import chain
+import json
+import os
+import time
+
+import gdax.orderbook
+from gdax.orderbook import OrderBookError
+from gdax.trade_log import (INDEX_SUFFIX, TradeLogIndex,
+                             build_trade_log_index, read_trade_log)
+from gdax.utils import parse_time
+from gdax.websocket_feed_listener import sniff_type, summarize
+
+
+def _logged_products(paths):
+    # snapshots may follow frames, e.g. with buffered_start or after a
+    # resync, so the whole log is scanned unless it is indexed
+    path = paths[0]
+    if os.path.exists(path + INDEX_SUFFIX):
+        product_ids = list(TradeLogIndex(path).snapshots)
+    else:
+        product_ids = []
+        for kind, _, data in read_trade_log(path):
+            if kind != 'B':
+                continue
+            product_id = data.split(' ', 1)[0]
+            if product_id not in product_ids:
+                product_ids.append(product_id)
+    if not product_ids:
+        raise OrderBookError(f'No snapshot in {path}')
+    return product_ids
+
+
+class ReplayOrderBook(gdax.orderbook.OrderBook):
+    """An OrderBook fed from the trade logs at paths, in order.
+
+    product_ids defaults to the products with a snapshot in the first log.
+    Frames of each product are buffered until its first snapshot, and
+    a sequence gap waits for the next snapshot of the product in the log,
+    as a live book waits for the snapshot it requests. Checkpoints are only
+    loaded by books waiting for a snapshot, since the others are already in
+    the same state.
+
+    With speed=None the log is replayed as fast as possible. Otherwise
+    frames are applied at speed times the rate at which they were received,
+    as recorded by binary logs, or as given by the time of each message for
+    text logs. The other keyword arguments are passed to OrderBook, except
+    for fixed_point, which needs the REST API.
+
+    Iterating with async for stops at the end of the log.
+    messages and snapshots count the frames applied and the snapshots
+    loaded.
+
+    """
+
+    def __init__(self, paths, product_ids=None, speed=None, **kwargs):
+        if kwargs.get('fixed_point'):
+            raise ValueError('fixed_point is not supported when replaying')
+        if not isinstance(paths, list):
+            paths = [paths]
+        self.paths = paths
+        if product_ids is None:
+            product_ids = _logged_products(paths)
+        super().__init__(product_ids, **kwargs)
+        self.speed = speed
+        self.finished = False
+        self.messages = 0
+        self.snapshots = 0
+
+        self._entries = None
+        self._first_timestamp = None
+        self._started = None
+
+    def _start(self, paths, offset=0):
+        self._entries = chain(
+            read_trade_log(paths[0], offset),
+            chain.from_iterable(read_trade_log(path) for path in paths[1:]))
+        for product_id in self.product_ids:
+            self._resync_buffers[product_id] = []
+        self.finished = False
+        self._first_timestamp = None
+
+    async def __aenter__(self):
+        self._start(self.paths)
+        return self
+
+    def seek(self, product_id, sequence=None, timestamp=None):
+        """Restarts the replay at the last snapshot or checkpoint of
+        product_id at or before sequence and timestamp, as found by the
+        indexes of the logs.
+
+        The books of the other products wait for their next snapshot.
+        Returns the sequence of the snapshot.
+
+        """
+        for i in reversed(range(len(self.paths))):
+            index = TradeLogIndex(self.paths[i])
+            found = index.snapshot(product_id, sequence, timestamp)
+            if found is not None:
+                frames = self._newer_frames(index, product_id, *found)
+                self._start(self.paths[i:], found[2])
+                # the snapshot, then the frames logged before it
+                self._entries = chain(
+                    [next(self._entries)], frames, self._entries)
+                return found[0]
+        raise OrderBookError(f'No snapshot of {product_id} before '
+                             f'sequence {sequence}, time {timestamp}')
+
+    @staticmethod
+    def _newer_frames(index, product_id, sequence, timestamp, offset):
+        # frames newer than a snapshot can be logged before it: those
+        # received while it was requested, or still queued by run() when a
+        # checkpoint was written. They follow the last indexed frame at or
+        # before its sequence.
+        frame = index.frame(product_id, sequence)
+        start = frame[2] if frame is not None and frame[2] < offset else 0
+        frames = []
+        for entry in read_trade_log(index.path, start, offset):
+            if entry[0] != 'W':
+                continue
+            summary = summarize(sniff_type(entry[2]), entry[2])
+            if summary.get('product_id') == product_id and \
+                    summary.get('sequence', sequence) > sequence:
+                frames.append(entry)
+        return frames
+
+    async def replay_to(self, product_id, sequence):
+        """Applies the log until the book of product_id is at sequence.
+
+        Returns the sequence reached, which is past sequence if the log
+        misses it. Raises OrderBookError if the log ends before it or if the
+        book is already past it; seek first to go back.
+
+        """
+        if product_id not in self._resync_buffers and \
+                self._sequences[product_id] > sequence:
+            raise OrderBookError(f'{product_id} is already at sequence '
+                                 f'{self._sequences[product_id]}')
+        while (product_id in self._resync_buffers or
+               self._sequences[product_id] < sequence):
+            if self.finished:
+                raise OrderBookError(f'The log ends before sequence '
+                                     f'{sequence} of {product_id}')
+            await self.handle_message()
+        return self._sequences[product_id]
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self._entries = None
+        self._resync_buffers.clear()
+        self._resync_started.clear()
+
+    def _start_resync(self, product_id, message=None):
+        self._resync_buffers[product_id] = [] if message is None else [message]
+
+    async def _pace(self, timestamp):
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamp
+            self._started = time.time()
+            return
+        delay = ((timestamp - self._first_timestamp) / self.speed -
+                 (time.time() - self._started))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def handle_message(self):
+        """Applies the next frame of the log and returns its message.
+
+        Returns None after loading a snapshot instead, and sets finished at
+        the end of the log.
+
+        """
+        for kind, timestamp, data in self._entries:
+            if kind in ('B', 'C'):
+                product_id, _, book = data.partition(' ')
+                if kind == 'C' and product_id not in self._resync_buffers:
+                    continue
+                if product_id in self._sequences:
+                    self.snapshots += 1
+                    self._apply_snapshot(
+                        product_id, json.loads(book, parse_float=Decimal))
+                return
+
+            message = self._decode(data)
+            product_id = message.get('product_id')
+            if product_id is not None and product_id not in self._sequences:
+                continue
+            if self.speed is not None:
+                if timestamp is None:
+                    timestamp = message.get('time')
+                    timestamp = timestamp and parse_time(timestamp)
+                if timestamp is not None:
+                    await self._pace(timestamp)
+            self.messages += 1
+            return self._handle(message)
+        self.finished = True
+
+    async def __anext__(self):
+        while not self.finished:
+            message = await self.handle_message()
+            if message is not None:
+                return message
+        raise StopAsyncIteration
+
+    async def replay(self):
+        """Applies the rest of the log and returns the number of frames
+        applied."""
+        while not self.finished:
+            await self.handle_message()
+        return self.messages
+
+
+async def book_as_of(paths, product_id, sequence):
+    """Returns the book of product_id at sequence, as returned by
+    OrderBook.get_current_book, replayed from the closest snapshot or
+    checkpoint in the trade logs at paths.
+
+    Logs without an index are indexed first. Raises OrderBookError if the
+    logs miss sequence.
+
+    """
+    if not isinstance(paths, list):
+        paths = [paths]
+    for path in paths:
+        if not os.path.exists(path + INDEX_SUFFIX):
+            build_trade_log_index(path)
+    async with ReplayOrderBook(paths, [product_id]) as orderbook:
+        orderbook.seek(product_id, sequence)
+        reached = await orderbook.replay_to(product_id, sequence)
+        if reached != sequence:
+            raise OrderBookError(f'The log misses sequence {sequence} of '
+                                 f'{product_id}, the book is at {reached}')
+        return orderbook.get_current_book(product_id)
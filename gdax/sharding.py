@@ -0,0 +1,163 @@
+"""Spreads the order books of several products over worker processes.
+
+A single OrderBook applies the messages of all of its products on one core,
+so a burst on one product delays the others. ShardedOrderBook starts a
+worker process per shard of products instead, each with its own websocket
+subscription and OrderBook, and answers top of book queries for all of
+them by reading the shared memory the workers publish to (see
+gdax.shared_book).
+
+"""
+
+import asyncio
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import gdax.orderbook
+from gdax.orderbook import OrderBookError
+from gdax.shared_book import TopOfBookPublisher, TopOfBookReader
+
+
+def _shard(product_ids, processes):
+    shards = [product_ids[i::processes] for i in range(processes)]
+    return [shard for shard in shards if shard]
+
+
+def _wait_ready(ready, process, timeout):
+    deadline = time.time() + timeout
+    while not ready.wait(0.05):
+        if not process.is_alive() or time.time() > deadline:
+            return False
+    return True
+
+
+async def _run_shard(orderbook_class, product_ids, path, kwargs, ready,
+                     messages):
+    async with orderbook_class(product_ids, **kwargs) as orderbook:
+        with TopOfBookPublisher(orderbook, path):
+            ready.set()
+            async for _ in orderbook:
+                messages.value += 1
+
+
+def _run_worker(orderbook_class, product_ids, path, kwargs, ready,
+                messages):  # pragma: no cover
+    # runs in the worker process, whose event loop must not be the parent's
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(_run_shard(orderbook_class, product_ids, path,
+                                       kwargs, ready, messages))
+
+
+class ShardedOrderBook(object):
+    """Top of book of many products, kept up to date by worker processes.
+
+    The products are dealt round-robin over processes workers (one per CPU
+    by default), or grouped as given by shards, a list of product id lists.
+    The other keyword arguments are passed to each worker's
+    orderbook_class. message_counts is the number of messages each worker
+    has handled.
+
+    """
+
+    def __init__(self, product_ids='ETH-USD', processes=None, shards=None,
+                 orderbook_class=gdax.orderbook.OrderBook, ready_timeout=60,
+                 **kwargs):
+        if not isinstance(product_ids, list):
+            product_ids = [product_ids]
+        if shards is None:
+            processes = processes or os.cpu_count() or 1
+            shards = _shard(product_ids, min(processes, len(product_ids)))
+        self.shards = shards
+        self.product_ids = [product_id for shard in shards
+                            for product_id in shard]
+        self.orderbook_class = orderbook_class
+        self.ready_timeout = ready_timeout
+        self.kwargs = kwargs
+
+        self._directory = None
+        self._processes = []
+        self._messages = []
+        self._readers = {}
+
+    async def __aenter__(self):
+        self._directory = tempfile.mkdtemp(prefix='gdax-')
+        events = []
+        for i, shard in enumerate(self.shards):
+            path = os.path.join(self._directory, f'shard{i}')
+            ready = multiprocessing.Event()
+            messages = multiprocessing.Value('L', 0, lock=False)
+            process = multiprocessing.Process(
+                target=_run_worker, daemon=True,
+                args=(self.orderbook_class, shard, path, self.kwargs, ready,
+                      messages))
+            process.start()
+            self._processes.append(process)
+            self._messages.append(messages)
+            events.append((path, shard, ready, process))
+
+        loop = asyncio.get_event_loop()
+        try:
+            for path, shard, ready, process in events:
+                if not await loop.run_in_executor(
+                        None, _wait_ready, ready, process, self.ready_timeout):
+                    raise OrderBookError(
+                        f'Worker of {shard} not ready: exit code '
+                        f'{process.exitcode}')
+                reader = TopOfBookReader(path)
+                for product_id in shard:
+                    self._readers[product_id] = reader
+        except BaseException:
+            self._stop()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self._stop()
+
+    def _stop(self):
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+        for reader in set(self._readers.values()):
+            reader.close()
+        self._processes = []
+        self._messages = []
+        self._readers = {}
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    @property
+    def message_counts(self):
+        return [messages.value for messages in self._messages]
+
+    def check_workers(self):
+        """Raises OrderBookError if a worker process has exited."""
+        for shard, process in zip(self.shards, self._processes):
+            if not process.is_alive():
+                raise OrderBookError(f'Worker of {shard} exited with '
+                                     f'{process.exitcode}')
+
+    def get_top_of_book(self, product_id):
+        """Returns the best bid, its size, the best ask and its size."""
+        return self._readers[product_id].read(product_id)[:4]
+
+    def get_sequence(self, product_id):
+        """Returns the sequence and the time of the last top of book
+        change."""
+        return self._readers[product_id].read(product_id)[4:]
+
+    def get_bid(self, product_id):
+        return self.get_top_of_book(product_id)[0]
+
+    def get_ask(self, product_id):
+        return self.get_top_of_book(product_id)[2]
+
+    def get_max_bid_depth(self, product_id):
+        return self.get_top_of_book(product_id)[1]
+
+    def get_min_ask_depth(self, product_id):
+        return self.get_top_of_book(product_id)[3]
@@ -0,0 +1,166 @@
+"""Publishes the top of an OrderBook to other local processes.
+
+TopOfBookPublisher writes the best bid and ask of each product, with their
+sizes, the sequence number and the time of the change, into a memory-mapped
+file; TopOfBookReader reads them from any number of processes without a
+websocket connection of their own.
+
+Each product has a fixed 64 byte slot, guarded by a seqlock: the writer
+makes the slot's version odd before and even after updating it, and readers
+retry until they read the same even version before and after the values.
+Prices and sizes are stored as integer multiples of 1e-8, the precision of
+the feed, so they are read back as the exact Decimals.
+
+"""
+
+from decimal import Decimal
+import mmap
+import os
+import struct
+import time
+
+from gdax.orderbook import OrderBookError
+
+MAGIC = b'GDTB'
+LAYOUT_VERSION = 1
+PLACES = 8
+
+# magic, layout version, number of products
+_HEADER = struct.Struct('<4sII')
+_PRODUCT_ID = struct.Struct('<16s')
+# version, sequence, timestamp, bid, bid size, ask, ask size
+_SLOT = struct.Struct('<Qqdqqqq8x')
+_VERSION = struct.Struct('<Q')
+# an empty side
+_NONE = -1
+
+
+def _slots_offset(count):
+    return _HEADER.size + count * _PRODUCT_ID.size
+
+
+def _to_int(value):
+    return _NONE if value is None else int(value.scaleb(PLACES))
+
+
+def _to_decimal(value):
+    return None if value == _NONE else Decimal(value).scaleb(-PLACES)
+
+
+class TopOfBookPublisher(object):
+    """Keeps the top of book of orderbook's products in the file at path.
+
+    The file is created, or overwritten, with a slot for each product. Slots
+    are updated by the orderbook's on_top_of_book callback, so the sequence
+    is that of the last message which changed the top of book.
+
+    """
+
+    def __init__(self, orderbook, path):
+        self.orderbook = orderbook
+        self.path = path
+        self.product_ids = list(orderbook.product_ids)
+        self._slots = {}
+
+        size = (_slots_offset(len(self.product_ids)) +
+                len(self.product_ids) * _SLOT.size)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * size)
+        with open(path, 'r+b') as f:
+            self._mmap = mmap.mmap(f.fileno(), size)
+
+        _HEADER.pack_into(self._mmap, 0, MAGIC, LAYOUT_VERSION,
+                          len(self.product_ids))
+        offset = _slots_offset(len(self.product_ids))
+        for i, product_id in enumerate(self.product_ids):
+            _PRODUCT_ID.pack_into(self._mmap,
+                                  _HEADER.size + i * _PRODUCT_ID.size,
+                                  product_id.encode())
+            self._slots[product_id] = offset + i * _SLOT.size
+
+        for product_id in self.product_ids:
+            if orderbook._sequences[product_id] is not None:
+                self.publish(product_id,
+                             orderbook.get_top_of_book(product_id))
+        orderbook.on_top_of_book(self.publish)
+
+    def publish(self, product_id, top):
+        offset = self._slots[product_id]
+        version = _VERSION.unpack_from(self._mmap, offset)[0]
+        _VERSION.pack_into(self._mmap, offset, version + 1)
+        bid, bid_size, ask, ask_size = top
+        _SLOT.pack_into(self._mmap, offset, version + 1,
+                        self.orderbook._sequences[product_id], time.time(),
+                        _to_int(bid), _to_int(bid_size),
+                        _to_int(ask), _to_int(ask_size))
+        _VERSION.pack_into(self._mmap, offset, version + 2)
+
+    def close(self):
+        self.orderbook.remove_callback(self.publish)
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class TopOfBookReader(object):
+    """Reads the top of book written by a TopOfBookPublisher to path."""
+
+    def __init__(self, path, retries=10000):
+        self.retries = retries
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), os.fstat(f.fileno()).st_size,
+                                   access=mmap.ACCESS_READ)
+        magic, layout_version, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or layout_version != LAYOUT_VERSION:
+            self._mmap.close()
+            raise OrderBookError(f'{path} is not a top of book file')
+
+        offset = _slots_offset(count)
+        self._slots = {}
+        for i in range(count):
+            product_id = _PRODUCT_ID.unpack_from(
+                self._mmap, _HEADER.size + i * _PRODUCT_ID.size)[0]
+            self._slots[product_id.rstrip(b'\0').decode()] = (
+                offset + i * _SLOT.size)
+
+    @property
+    def product_ids(self):
+        return list(self._slots)
+
+    def read(self, product_id):
+        """Returns the best bid, its size, the best ask, its size, the
+        sequence and the time of the last change.
+
+        Values of an empty side are None, and all values are None before the
+        product's first snapshot.
+
+        """
+        offset = self._slots[product_id]
+        for _ in range(self.retries):
+            values = _SLOT.unpack_from(self._mmap, offset)
+            if values[0] & 1:
+                continue
+            if _VERSION.unpack_from(self._mmap, offset)[0] == values[0]:
+                break
+        else:
+            raise OrderBookError(
+                f'{product_id} was being written during {self.retries} '
+                f'reads')
+        version, sequence, timestamp, bid, bid_size, ask, ask_size = values
+        if not version:
+            return (None,) * 6
+        return (_to_decimal(bid), _to_decimal(bid_size), _to_decimal(ask),
+                _to_decimal(ask_size), sequence, timestamp)
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
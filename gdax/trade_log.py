@@ -0,0 +1,577 @@
+"""Writes and reads the trade log of a listener.
+
+Log entries are appended to an in-memory buffer, which a writer thread
+flushes to the file once it holds flush_size bytes, and at least every
+flush_interval seconds, so the receive path never waits for the disk.
+
+There are two formats. The text format has a line per entry: 'W ' and the
+frame received, or 'B ' or 'C ', the product id and the JSON of its snapshot
+or of a checkpoint of its book. The binary format starts with MAGIC and
+LAYOUT_VERSION, followed by a record per entry: the kind (b'W', b'B' or
+b'C'), the local time the entry was logged, the length of its data and the
+same data as in the text format, UTF-8 encoded.
+
+Either format can be compressed with gzip or lzma, and split into several
+files by size or by time. read_trade_log reads both formats, compressed or
+not, and convert_trade_log rewrites a log in another format.
+
+An index next to a log, at its path with '.idx' appended, records the
+offset of each snapshot and checkpoint, and the sequence, timestamp and
+offset of every interval-th frame, so that reading can start close to any
+point of the log. It is written along with the log with index_interval, or
+afterwards by build_trade_log_index, and read by TradeLogIndex. Offsets are
+positions in the uncompressed log: seeking into a compressed log
+decompresses everything before the offset, so big logs should be rotated or
+not compressed.
+
+"""
+
+import argparse
+from bisect import bisect_right
+import gzip
+import json
+import lzma
+import math
+import os
+import re
+import struct
+import threading
+import time
+
+from gdax.utils import parse_time
+
+MAGIC = b'GDTL'
+LAYOUT_VERSION = 1
+
+# magic, layout version
+_FILE_HEADER = struct.Struct('<4sI')
+# kind, timestamp, length of the data
+_RECORD = struct.Struct('<cdI')
+
+INDEX_MAGIC = b'GDTI'
+INDEX_SUFFIX = '.idx'
+# kind, product id, sequence, timestamp (NaN if unknown), offset
+_INDEX_ENTRY = struct.Struct('<c16sqdQ')
+
+_SEQUENCE_RE = re.compile(r'"sequence":\s*(\d+)')
+
+_OPENERS = {
+    None: open,
+    'gzip': gzip.open,
+    'lzma': lzma.open,
+}
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_XZ_MAGIC = b'\xfd7zXZ\x00'
+
+
+def _open_compressed(path):
+    with open(path, 'rb') as f:
+        magic = f.read(len(_XZ_MAGIC))
+    if magic.startswith(_GZIP_MAGIC):
+        return gzip.open(path, 'rb')
+    if magic == _XZ_MAGIC:
+        return lzma.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _stream_size(path):
+    size = 0
+    with _open_compressed(path) as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            size += len(chunk)
+    return size
+
+
+class _IndexWriter(object):
+    def __init__(self, path, interval, mode='ab'):
+        self.interval = interval
+        self._file = open(path + INDEX_SUFFIX, mode)
+        if not self._file.tell():
+            self._file.write(_FILE_HEADER.pack(INDEX_MAGIC, LAYOUT_VERSION))
+        # frames to skip before the next one is indexed
+        self.due = 0
+        self._last_time = math.nan
+
+    def add(self, offset, kind, timestamp, data):
+        if kind in ('B', 'C'):
+            product_id, _, book = data.partition(' ')
+            sequence = int(_SEQUENCE_RE.search(book).group(1))
+        else:
+            message = json.loads(data)
+            product_id = message.get('product_id')
+            sequence = message.get('sequence')
+            if product_id is None or sequence is None:
+                return
+            if timestamp is None and 'time' in message:
+                timestamp = parse_time(message['time'])
+            self.due = self.interval - 1
+        if timestamp is None:
+            timestamp = self._last_time
+        self._last_time = timestamp
+        self._file.write(_INDEX_ENTRY.pack(
+            kind.encode(), product_id.encode(), sequence, timestamp, offset))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _BufferedLogWriter(object):
+    def __init__(self, path, flush_size=1 << 16, flush_interval=1.0,
+                 compression=None, rotate_size=None, rotate_interval=None,
+                 index_interval=None, max_buffer_size=1 << 26,
+                 overflow='block'):
+        if compression not in _OPENERS:
+            raise ValueError(f'unknown compression {compression!r}')
+        if overflow not in ('block', 'raise'):
+            raise ValueError(f'unknown overflow policy {overflow!r}')
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+        self.index_interval = index_interval
+        self.max_buffer_size = max_buffer_size
+        self.overflow = overflow
+        self.paths = []
+        self.flushes = 0
+        self.lines_written = 0
+        self.max_depth = 0
+        self.dropped = 0
+
+        self._file = None
+        self._index = None
+        self._open()
+        self._buffer = []
+        self._size = 0
+        self._closed = False
+        # raised by the writer thread, re-raised to the caller
+        self._error = None
+        # writes waiting for room in the buffer
+        self._blocked = 0
+        self._condition = threading.Condition()
+        # serializes the writes of the thread and of flush()
+        self._file_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f'TradeLogWriter({path})')
+        self._thread.start()
+
+    def _next_path(self):
+        if self.rotate_size is None and self.rotate_interval is None:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        index = 0
+        while True:
+            path = f'{root}.{index:04d}{ext}'
+            if not os.path.exists(path):
+                return path
+            index += 1
+
+    def _open(self):
+        path = self._next_path()
+        new = not os.path.exists(path) or not os.path.getsize(path)
+        if new:
+            self._file_size = 0
+        elif self.compression is None:
+            self._file_size = os.path.getsize(path)
+        else:
+            # offsets are in the uncompressed stream, which is only worth
+            # measuring for the index
+            self._file_size = (_stream_size(path) if self.index_interval
+                               else 0)
+        self._file = _OPENERS[self.compression](path, 'ab')
+        self._opened = time.time()
+        self.paths.append(path)
+        if new:
+            self._file.write(self._header)
+            self._file_size = len(self._header)
+        if self.index_interval is not None:
+            self._index = _IndexWriter(path, self.index_interval)
+
+    def _close(self):
+        self._file.close()
+        if self._index is not None:
+            self._index.close()
+
+    def _rotate_due(self):
+        return (
+            self.rotate_size is not None and
+            self._file_size >= self.rotate_size or
+            self.rotate_interval is not None and
+            time.time() - self._opened >= self.rotate_interval)
+
+    @property
+    def depth(self):
+        return len(self._buffer)
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _append(self, data, size=None):
+        if size is None:
+            size = len(data)
+        if self._closed:
+            raise ValueError(f'{self.path} is closed')
+        self._check()
+        with self._condition:
+            if self._size + size > self.max_buffer_size and \
+                    self._buffer:
+                if self.overflow == 'raise':
+                    self.dropped += 1
+                    raise BufferError(f'{self.path} buffer is full')
+                self._blocked += 1
+                self._condition.notify_all()
+                self._condition.wait_for(
+                    lambda: self._size + size <= self.max_buffer_size or
+                    not self._buffer or self._error is not None)
+                self._blocked -= 1
+                self._check()
+            self._buffer.append(data)
+            self._size += size
+            if len(self._buffer) > self.max_depth:
+                self.max_depth = len(self._buffer)
+            if self._size >= self.flush_size:
+                self._condition.notify_all()
+
+    def log_frame(self, json_data, timestamp=None):
+        self.log('W', json_data, timestamp)
+
+    def log_snapshot(self, product_id, json_data, timestamp=None):
+        self.log('B', f'{product_id} {json_data}', timestamp)
+
+    def log_checkpoint(self, product_id, json_data, timestamp=None):
+        """Logs a checkpoint of a book. json_data can also be a function
+        returning the JSON, which the thread then calls, so that the caller
+        does not wait for a big book to be serialized."""
+        if not callable(json_data):
+            self.log('C', f'{product_id} {json_data}', timestamp)
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        # the size of the entry is unknown until it is serialized
+        self._append(lambda: self._encode(
+            'C', f'{product_id} {json_data()}', timestamp), 0)
+
+    def log(self, kind, data, timestamp=None):
+        self._append(self._encode(kind, data, timestamp))
+
+    def _swap(self):
+        with self._condition:
+            entries = self._buffer
+            self._buffer = []
+            self._size = 0
+            # wakes up writers blocked by a full buffer
+            self._condition.notify_all()
+        return entries
+
+    def flush(self):
+        with self._file_lock:
+            entries = [entry() if callable(entry) else entry
+                       for entry in self._swap()]
+            if not entries:
+                return
+            if self._rotate_due():
+                self._close()
+                self._open()
+            if self._index is not None:
+                self._add_to_index(entries)
+            data = b''.join(entries)
+            self._file.write(data)
+            self._file.flush()
+            self._file_size += len(data)
+            self.flushes += 1
+            self.lines_written += len(entries)
+
+    def _add_to_index(self, entries):
+        index = self._index
+        offset = self._file_size
+        for entry in entries:
+            if index.due and entry[:1] == b'W':
+                index.due -= 1
+            else:
+                index.add(offset, *self._split(entry))
+            offset += len(entry)
+        index.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or self._blocked or
+                    self._size >= self.flush_size,
+                    self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as exc:
+                with self._condition:
+                    self._error = exc
+                    self._condition.notify_all()
+                return
+
+    def close(self):
+        """Flushes the buffered entries, stops the thread and closes the
+        file."""
+        if self._closed:
+            return
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        try:
+            self._check()
+            self.flush()
+        finally:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+class TradeLogWriter(_BufferedLogWriter):
+    """Appends text log lines to the file at path from a dedicated thread.
+
+    depth is the number of lines waiting in the buffer. flush() writes them
+    out immediately, and close() writes them out and closes the file, so every
+    line written before close() reaches the file. If the thread fails to
+    write, its exception is raised by the following writes and by close().
+
+    The buffer holds up to max_buffer_size bytes. Once full, writes wait for
+    the thread to write it out if overflow is 'block', and raise BufferError
+    if it is 'raise', counting the entry in dropped.
+
+    With compression ('gzip' or 'lzma') the file is compressed as it is
+    written. With rotate_size (bytes before compression) or rotate_interval
+    (seconds), the log is split into files named like path with a four digit
+    index before the extension, starting after the files already there;
+    paths lists the files written to. With index_interval, an index of the
+    snapshots and of every index_interval-th frame is written along with each
+    file.
+
+    """
+    _header = b''
+
+    @staticmethod
+    def _split(entry):
+        line = entry.decode()
+        return line[0], None, line[2:-1]
+
+    def write(self, line):
+        self._append(line.encode())
+
+    @staticmethod
+    def _encode(kind, data, timestamp):
+        return f'{kind} {data}\n'.encode()
+
+
+class BinaryTradeLogWriter(_BufferedLogWriter):
+    """Appends length-prefixed binary records to the file at path.
+
+    Each record has the time it was logged, or timestamp if given. Otherwise
+    works like TradeLogWriter.
+
+    """
+    _header = _FILE_HEADER.pack(MAGIC, LAYOUT_VERSION)
+
+    @staticmethod
+    def _split(entry):
+        kind, timestamp, _ = _RECORD.unpack_from(entry)
+        return kind.decode(), timestamp, entry[_RECORD.size:].decode()
+
+    @staticmethod
+    def _encode(kind, data, timestamp):
+        data = data.encode()
+        return _RECORD.pack(
+            kind.encode(), time.time() if timestamp is None else timestamp,
+            len(data)) + data
+
+
+TRADE_LOG_FORMATS = {
+    'text': TradeLogWriter,
+    'binary': BinaryTradeLogWriter,
+}
+
+
+def _read_binary(f, path, offset):
+    while True:
+        header = f.read(_RECORD.size)
+        if not header:
+            return
+        if len(header) < _RECORD.size:
+            raise ValueError(f'{path} ends with a truncated record')
+        kind, timestamp, length = _RECORD.unpack(header)
+        data = f.read(length)
+        if len(data) < length:
+            raise ValueError(f'{path} ends with a truncated record')
+        yield offset, kind.decode(), timestamp, data.decode()
+        offset += _RECORD.size + length
+
+
+def _read_entries(path, offset=0):
+    with _open_compressed(path) as f:
+        if f.peek(len(MAGIC))[:len(MAGIC)] == MAGIC:
+            magic, layout_version = _FILE_HEADER.unpack(
+                f.read(_FILE_HEADER.size))
+            if layout_version != LAYOUT_VERSION:
+                raise ValueError(f'{path} has unknown layout version '
+                                 f'{layout_version}')
+            if offset:
+                f.seek(offset)
+            yield from _read_binary(f, path, offset or _FILE_HEADER.size)
+            return
+
+        f.seek(offset)
+        for line in f:
+            yield offset, line[:1].decode(), None, line[2:-1].decode()
+            offset += len(line)
+
+
+def read_trade_log(path, offset=0, end=None):
+    """Yields the kind ('W', 'B' or 'C'), the timestamp and the data of each
+    entry of a trade log in either format, compressed or not.
+
+    Reading starts at offset, which must be the offset of an entry, e.g. from
+    a TradeLogIndex, and stops before the entry at end if given. The
+    timestamp of text log entries is None.
+
+    """
+    for entry_offset, kind, timestamp, data in _read_entries(path, offset):
+        if end is not None and entry_offset >= end:
+            return
+        yield kind, timestamp, data
+
+
+def build_trade_log_index(path, interval=1000):
+    """Writes the index of the trade log at path, replacing any previous
+    one, with every interval-th frame. Returns the number of entries
+    indexed."""
+    count = 0
+    index = _IndexWriter(path, interval, 'wb')
+    try:
+        for offset, kind, timestamp, data in _read_entries(path):
+            if index.due and kind == 'W':
+                index.due -= 1
+            else:
+                index.add(offset, kind, timestamp, data)
+                count += 1
+    finally:
+        index.close()
+    return count
+
+
+class TradeLogIndex(object):
+    """The index of the trade log at path.
+
+    Each lookup returns the sequence, the timestamp and the offset of an
+    entry, or None if there is none before the given point.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path + INDEX_SUFFIX, 'rb') as f:
+            magic, layout_version = _FILE_HEADER.unpack(
+                f.read(_FILE_HEADER.size))
+            if magic != INDEX_MAGIC or layout_version != LAYOUT_VERSION:
+                raise ValueError(f'{path}{INDEX_SUFFIX} is not a trade log '
+                                 f'index')
+            data = f.read()
+        # product id -> [(sequence, timestamp, offset)] for snapshots and
+        # checkpoints, and for frames, in the order of the log
+        self.snapshots = {}
+        self.frames = {}
+        self._times = []
+        self._offsets = []
+        for kind, product_id, sequence, timestamp, offset in \
+                _INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) %
+                                              _INDEX_ENTRY.size]):
+            entries = self.snapshots if kind != b'W' else self.frames
+            entry = (sequence, timestamp, offset)
+            entries.setdefault(
+                product_id.rstrip(b'\0').decode(), []).append(entry)
+            if kind == b'W' and not math.isnan(timestamp):
+                self._times.append(timestamp)
+                self._offsets.append(offset)
+
+    @staticmethod
+    def _before(entries, sequence, timestamp):
+        found = None
+        for entry in entries:
+            if sequence is not None and entry[0] > sequence or \
+                    timestamp is not None and entry[1] > timestamp:
+                break
+            found = entry
+        return found
+
+    def snapshot(self, product_id, sequence=None, timestamp=None):
+        """Returns the last snapshot or checkpoint of product_id at or before
+        sequence and timestamp."""
+        return self._before(self.snapshots.get(product_id, []), sequence,
+                            timestamp)
+
+    def frame(self, product_id, sequence=None, timestamp=None):
+        """Returns the last indexed frame of product_id at or before sequence
+        and timestamp."""
+        return self._before(self.frames.get(product_id, []), sequence,
+                            timestamp)
+
+    def offset(self, timestamp):
+        """Returns the offset of the last indexed frame received at or before
+        timestamp, or 0."""
+        i = bisect_right(self._times, timestamp)
+        return self._offsets[i - 1] if i else 0
+
+
+def _message_time(json_data):
+    # the text format has no receive time, so the feed's is used instead
+    value = json.loads(json_data).get('time')
+    return None if value is None else parse_time(value)
+
+
+def convert_trade_log(source, destination, format='binary', **kwargs):
+    """Rewrites the trade log at source in format at destination.
+
+    The other keyword arguments are passed to the writer. Converting a text
+    log to the binary format uses the time of each message as its timestamp,
+    and the time of the previous message for snapshots and messages without
+    one. Returns the number of entries converted.
+
+    """
+    count = 0
+    last_time = 0.0
+    with TRADE_LOG_FORMATS[format](destination, **kwargs) as writer:
+        for kind, timestamp, data in read_trade_log(source):
+            if timestamp is None and kind == 'W':
+                timestamp = _message_time(data)
+            if timestamp is None:
+                timestamp = last_time
+            last_time = timestamp
+            writer.log(kind, data, timestamp)
+            count += 1
+    return count
+
+
+def main():  # pragma: no cover
+    parser = argparse.ArgumentParser(description='Converts a trade log.')
+    parser.add_argument('source')
+    parser.add_argument('destination')
+    parser.add_argument('--format', choices=sorted(TRADE_LOG_FORMATS),
+                        default='binary')
+    parser.add_argument('--compression', choices=['gzip', 'lzma'])
+    args = parser.parse_args()
+    count = convert_trade_log(args.source, args.destination, args.format,
+                              compression=args.compression)
+    print(f'{count} entries converted')
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -17,11 +17,25 @@ import async_timeout
 import gdax.utils
 
 
+def decode_order_book(data):
+    """Decode a level 3 order book response.
+
+    Only prices and sizes are converted to Decimal, the order ids are kept as
+    they are. Module level so that it can run in a process pool.
+
+    """
+    book = json.loads(data)
+    for side in ('bids', 'asks'):
+        book[side] = [[Decimal(price), Decimal(size), order_id]
+                      for price, size, order_id in book[side]]
+    return book
+
+
 class Trader(object):
     API_URL = "https://api.gdax.com"
 
     def __init__(self, product_id='ETH-USD', api_key=None, api_secret=None,
-                 passphrase=None, timeout_sec=10):
+                 passphrase=None, timeout_sec=10, executor=None):
         self.product_id = product_id
         if api_key is not None:
             self.authenticated = True
@@ -33,6 +47,9 @@ class Trader(object):
         self._clientsession = aiohttp.ClientSession()
         self.session = self._clientsession.__enter__()
         self.timeout_sec = timeout_sec
+        # runs CPU heavy response decoding off the event loop, None for the
+        # loop's default thread pool
+        self.executor = executor
 
     def __del__(self):
         self.session = self._clientsession.__exit__(None, None, None)
@@ -82,7 +99,7 @@ class Trader(object):
                 return fields
 
     async def _get(self, path, params=None, decimal_return_fields=None,
-                   convert_all=False, pagination=False):
+                   convert_all=False, pagination=False, decoder=None):
         if params is None:
             params_copy = {}
         else:
@@ -106,6 +123,9 @@ class Trader(object):
                                             headers=headers,
                                             encoding='ascii') as response:
                     response.raise_for_status()
+                    if decoder is not None:
+                        data = await response.read()
+                        break
                     res = await response.json()
                     if pagination:
                         results += res
@@ -118,6 +138,9 @@ class Trader(object):
                     else:
                         return self._convert_return_fields(
                             res, decimal_return_fields, convert_all)
+        # decoded outside of the timeout, once the connection is released
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, decoder, data)
 
     async def _post(self, path, data=None, decimal_return_fields=None,
                     convert_all=False):
@@ -163,6 +186,12 @@ class Trader(object):
 
     async def get_product_order_book(self, product_id=None, level=1):
         params = {'level': level}
+        if level == 3:
+            # multi-megabyte response, decoded with its known schema in
+            # self.executor so the event loop stays responsive
+            return await self._get(
+                '/products/{}/book'.format(product_id or self.product_id),
+                params=params, decoder=decode_order_book)
         return await self._get(
             '/products/{}/book'.format(product_id or self.product_id),
             params=params, decimal_return_fields={'bids', 'asks'},
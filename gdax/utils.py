@@ -1,10 +1,12 @@
 """Utils for message signing, etc."""
 
 import base64
+import calendar
 import decimal
 import hashlib
 import hmac
 import json
+import time
 
 
 def get_signature(path, method, body, timestamp, api_secret):
@@ -23,8 +25,52 @@ def get_signature(path, method, body, timestamp, api_secret):
     return signature_b64.decode('ascii')
 
 
+def parse_time(value):
+    """Converts a time of the feed, e.g. '2017-06-25T11:23:14.775000Z', to a
+    Unix timestamp."""
+    seconds, _, fraction = value.rstrip('Z').partition('.')
+    timestamp = calendar.timegm(time.strptime(seconds, '%Y-%m-%dT%H:%M:%S'))
+    return timestamp + float(f'0.{fraction or 0}')
+
+
 class DecimalEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, decimal.Decimal):
             return float(o)
 
+
+class DecimalUnits(object):
+    """Keeps prices and sizes as Decimals."""
+
+    def parse(self, value):
+        return decimal.Decimal(value)
+
+    def to_decimal(self, value):
+        return value
+
+
+class FixedPoint(object):
+    """Converts prices and sizes to integer multiples of an increment.
+
+    The increment must be a power of ten, e.g. a product's quote_increment.
+    Strings and Decimals are converted exactly through Decimal, and values
+    which are not a multiple of the increment raise ValueError.
+
+    """
+
+    def __init__(self, increment):
+        self.increment = decimal.Decimal(increment)
+        sign, digits, exponent = self.increment.normalize().as_tuple()
+        if digits != (1,):
+            raise ValueError(f'{increment} is not a power of ten')
+        self.places = -exponent
+
+    def parse(self, value):
+        scaled = decimal.Decimal(value).scaleb(self.places)
+        result = int(scaled)
+        if result != scaled:
+            raise ValueError(f'{value} is not a multiple of {self.increment}')
+        return result
+
+    def to_decimal(self, value):
+        return value * self.increment
@@ -6,22 +6,372 @@ See: https://docs.gdax.com/#websocket-feed.
 """
 
 import asyncio
+from collections import OrderedDict
+from functools import partial
 import json
-
+import logging
+import random
+import re
 import time
 
-import aiofiles
 import aiohttp
+import async_timeout
 
+import gdax.messages
+from gdax.trade_log import TRADE_LOG_FORMATS
 import gdax.utils
 
 from abc import ABC, abstractmethod
 
+try:
+    import ujson
+    default_json_loads = ujson.loads
+except ImportError:  # pragma: no cover
+    default_json_loads = json.loads
+
+_TYPE_RE = re.compile(r'"type"\s*:\s*"([^"]*)"')
+_PRODUCT_ID_RE = re.compile(r'"product_id"\s*:\s*"([^"]*)"')
+_SEQUENCE_RE = re.compile(r'"sequence"\s*:\s*(\d+)')
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def sniff_type(json_data):
+    """Returns the message type of a raw frame without decoding it."""
+    # the feed sends compact JSON with the type first
+    if json_data.startswith('{"type":"'):
+        return json_data[9:json_data.find('"', 9)]
+    match = _TYPE_RE.search(json_data)
+    return match.group(1) if match else None
+
+
+def summarize(msg_type, json_data):
+    """Returns the type, product_id and sequence of a raw frame, the fields
+    needed to keep track of sequence numbers, without decoding the rest."""
+    message = {'type': msg_type}
+    start = json_data.find('"product_id":"')
+    if start >= 0:
+        start += 14
+        message['product_id'] = json_data[start:json_data.find('"', start)]
+    else:
+        match = _PRODUCT_ID_RE.search(json_data)
+        if match:
+            message['product_id'] = match.group(1)
+    start = json_data.find('"sequence":')
+    match = _DIGITS_RE.match(json_data, start + 11) if start >= 0 else None
+    if match:
+        message['sequence'] = int(match.group())
+    else:
+        match = _SEQUENCE_RE.search(json_data)
+        if match:
+            message['sequence'] = int(match.group(1))
+    return message
+
+
+class FeedStalledError(aiohttp.ServerDisconnectedError):
+    """No frame was received for stall_timeout seconds."""
+
+
+class ReconnectStats(object):
+    """Reconnections of a listener.
+
+    stalls counts the disconnections detected by the stall watchdog and
+    failed_attempts the reconnection attempts which failed. downtime is the
+    total time spent reconnecting, in seconds.
+
+    """
+    __slots__ = ('reconnects', 'stalls', 'failed_attempts', 'downtime',
+                 'last_error', 'last_reconnect')
+
+    def __init__(self):
+        self.reconnects = 0
+        self.stalls = 0
+        self.failed_attempts = 0
+        self.downtime = 0.0
+        self.last_error = None
+        self.last_reconnect = None
+
+    def __repr__(self):
+        return (f'ReconnectStats(reconnects={self.reconnects}, '
+                f'stalls={self.stalls}, '
+                f'failed_attempts={self.failed_attempts}, '
+                f'downtime={self.downtime:.3f}, '
+                f'last_error={self.last_error!r})')
+
+
+class HandlerStats(object):
+    """Number of messages of one type handled and the time spent on them."""
+    __slots__ = ('count', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total_time += duration
+        if duration > self.max_time:
+            self.max_time = duration
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return (f'HandlerStats(count={self.count}, '
+                f'total_time={self.total_time:.6f}, '
+                f'max_time={self.max_time:.6f})')
+
+
+class QueueStats(object):
+    """Backpressure of the receive queue used by WebSocketFeedListener.run.
+
+    depth is the number of frames waiting to be applied and high_water its
+    maximum so far. dropped counts the frames dropped on overflow. The delays
+    are measured from receiving a frame until it was applied, in seconds.
+
+    """
+    __slots__ = ('_queue', 'high_water', 'dropped', 'applied', 'total_delay',
+                 'max_delay', 'last_delay')
+
+    def __init__(self, queue=None):
+        self._queue = queue
+        self.high_water = 0
+        self.dropped = 0
+        self.applied = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.last_delay = 0.0
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def mean_delay(self):
+        return self.total_delay / self.applied if self.applied else 0.0
+
+    def add_delay(self, delay):
+        self.applied += 1
+        self.total_delay += delay
+        self.last_delay = delay
+        if delay > self.max_delay:
+            self.max_delay = delay
+
+    def __repr__(self):
+        return (f'QueueStats(depth={self.depth}, '
+                f'high_water={self.high_water}, dropped={self.dropped}, '
+                f'mean_delay={self.mean_delay:.6f}, '
+                f'max_delay={self.max_delay:.6f})')
+
+
+class ConnectionStats(object):
+    """How often a redundant connection delivered a message first, how far
+    behind the first copy its duplicates arrived, in seconds, and how often
+    it failed and was reconnected."""
+    __slots__ = ('wins', 'duplicates', 'total_delay', 'max_delay',
+                 'failures', 'reconnects')
+
+    def __init__(self):
+        self.wins = 0
+        self.duplicates = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.failures = 0
+        self.reconnects = 0
+
+    def add_duplicate(self, delay):
+        self.duplicates += 1
+        self.total_delay += delay
+        if delay > self.max_delay:
+            self.max_delay = delay
+
+    @property
+    def mean_delay(self):
+        return self.total_delay / self.duplicates if self.duplicates else 0.0
+
+    def __repr__(self):
+        return (f'ConnectionStats(wins={self.wins}, '
+                f'duplicates={self.duplicates}, '
+                f'mean_delay={self.mean_delay:.6f}, '
+                f'max_delay={self.max_delay:.6f}, '
+                f'failures={self.failures}, '
+                f'reconnects={self.reconnects})')
+
+
+class FeedMerger(object):
+    """Merges the frames of redundant connections to the same feed.
+
+    Frames of book_types are identified by their (product_id, sequence) and
+    the first copy wins. A frame which skips sequence numbers is held back
+    for up to gap_timeout seconds while the other connections may deliver
+    the missing ones; after that the held frames are released in order and
+    the gap is left to the consumer. Other frames, e.g. subscriptions, and
+    heartbeats which repeat the sequence of the last message of their
+    product, are only taken from the first connection which has not failed.
+
+    """
+    # message types which take a sequence number of their product
+    book_types = frozenset(['received', 'open', 'done', 'match', 'change'])
+    # (product_id, sequence) pairs remembered for duplicate detection
+    window = 100000
+
+    def __init__(self, connections, gap_timeout=1.0):
+        self.gap_timeout = gap_timeout
+        self.stats = [ConnectionStats() for _ in range(connections)]
+        self.gap_fills = 0
+        self.gap_timeouts = 0
+        self._queue = asyncio.Queue()
+        self._failed = set()
+        # the connection whose other frames are taken
+        self._primary = 0
+        # product_id -> last sequence released
+        self._last = {}
+        # product_id -> {sequence: frame} held back by a gap
+        self._held = {}
+        self._timers = {}
+        # (product_id, sequence) -> first arrival
+        self._arrivals = OrderedDict()
+
+    def put(self, connection, json_data):
+        summary = summarize(sniff_type(json_data), json_data)
+        sequence = summary.get('sequence')
+        product_id = summary.get('product_id')
+        if summary['type'] not in self.book_types or sequence is None:
+            if connection != self._primary:
+                return
+            last = self._last.get(product_id)
+            # a heartbeat ahead of the frames released would look like a gap
+            if sequence is None or last is None or sequence <= last:
+                self._queue.put_nowait(json_data)
+            return
+
+        now = time.perf_counter()
+        key = (product_id, sequence)
+        first = self._arrivals.get(key)
+        if first is not None:
+            self.stats[connection].add_duplicate(now - first)
+            return
+        last = self._last.get(product_id)
+        if last is not None and sequence <= last:
+            return  # older than the duplicate detection window
+        self._arrivals[key] = now
+        if len(self._arrivals) > self.window:
+            self._arrivals.popitem(last=False)
+        self.stats[connection].wins += 1
+
+        if last is None or sequence == last + 1:
+            self._queue.put_nowait(json_data)
+            self._last[product_id] = sequence
+            self._release(product_id)
+        else:
+            self._held.setdefault(product_id, {})[sequence] = json_data
+            if product_id not in self._timers:
+                self._timers[product_id] = (
+                    asyncio.get_event_loop().call_later(
+                        self.gap_timeout, self._expire, product_id))
+
+    def _release(self, product_id):
+        held = self._held.get(product_id)
+        if not held:
+            return
+        last = self._last[product_id]
+        while last + 1 in held:
+            last += 1
+            self._queue.put_nowait(held.pop(last))
+        self._last[product_id] = last
+        if not held:
+            del self._held[product_id]
+            self._timers.pop(product_id).cancel()
+            self.gap_fills += 1
+
+    def _expire(self, product_id):
+        del self._timers[product_id]
+        self.gap_timeouts += 1
+        held = self._held.pop(product_id)
+        for sequence in sorted(held):
+            self._queue.put_nowait(held[sequence])
+        self._last[product_id] = max(held)
+
+    def fail(self, connection, exc):
+        """Records a failed connection; once all of them failed, get()
+        raises exc."""
+        self._failed.add(connection)
+        self.stats[connection].failures += 1
+        if len(self._failed) == len(self.stats):
+            self._queue.put_nowait(exc)
+        elif connection == self._primary:
+            self._primary = min(set(range(len(self.stats))) - self._failed)
+
+    def restore(self, connection):
+        """Records that a failed connection is up again."""
+        self._failed.discard(connection)
+        self.stats[connection].reconnects += 1
+        self._primary = min(set(range(len(self.stats))) - self._failed)
+
+    async def get(self):
+        item = await self._queue.get()
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def close(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
 
 class WebSocketFeedListener(ABC):
-    def __init__(self, product_ids='ETH-USD', channels=None, api_key=None, api_secret=None,
-                 passphrase=None, use_heartbeat=False,
-                 trade_log_file_path=None):
+    """Base class of the websocket feed consumers.
+
+    Frames are decoded with json_loads, which defaults to ujson when it is
+    installed and to the standard library otherwise. Frames whose type is in
+    skip_types are not decoded at all: _recv returns only their type,
+    product_id and sequence. With typed_messages=True, _recv returns the
+    messages of the full channel as gdax.messages objects rather than dicts.
+
+    Messages are dispatched by type to the handlers added with
+    register_handler. handler_stats maps each type to the HandlerStats of
+    its handler.
+
+    With connections > 1, the same subscription is made over several
+    websocket connections whose frames are merged by a FeedMerger;
+    connection_stats then records which connection won each message. A
+    connection which fails is reconnected in the background, with the
+    backoff described below, while the others keep the feed going; the
+    whole feed only reconnects once all of them failed.
+
+    If no frame arrives for stall_timeout seconds (by default 5 with
+    use_heartbeat, which makes the feed send a heartbeat every second, and
+    unlimited otherwise), the feed is considered stalled and FeedStalledError
+    is raised like a disconnection. The first reconnection is immediate; the
+    following ones wait for a random delay of up to
+    backoff_base * 2 ** (attempts - 1) seconds, capped at backoff_cap, where
+    attempts counts the reconnections since the feed was last up for
+    backoff_cap seconds. reconnect_stats records them.
+
+    With trade_log_file_path, every frame received is logged to that file by
+    a writer thread, trade_log, in trade_log_format ('text' or 'binary', see
+    gdax.trade_log), with trade_log_options passed to the writer; the frames
+    logged are all in the file once __aexit__ returns. The writer stays open
+    across reconnections.
+
+    Messages are either pulled with handle_message or async for, or pushed
+    by run(), which receives frames into a bounded queue in one task and
+    applies them in another, so that slow consumers are visible in
+    queue_stats instead of leaving frames unread in the socket.
+
+    """
+
+    def __init__(self, product_ids='ETH-USD', channels=None, api_key=None,
+                 api_secret=None, passphrase=None, use_heartbeat=False,
+                 trade_log_file_path=None, json_loads=None, skip_types=None,
+                 typed_messages=False, connections=1, gap_timeout=1.0,
+                 stall_timeout=None, backoff_base=0.5, backoff_cap=30.0,
+                 trade_log_format='text', trade_log_options=None):
         if api_key is not None:
             self._authenticated = True
             self.api_key = api_key
@@ -42,17 +392,48 @@ class WebSocketFeedListener(ABC):
 
         self.use_heartbeat = use_heartbeat
         self.trade_log_file_path = trade_log_file_path
-        self._trade_file = None
+        if trade_log_format not in TRADE_LOG_FORMATS:
+            raise ValueError(f'unknown trade log format {trade_log_format!r}')
+        self.trade_log_format = trade_log_format
+        self.trade_log_options = trade_log_options or {}
+        self.trade_log = None
+        # keeps the trade log open while _reconnect re-enters the context
+        self._reconnecting = False
 
         self._ws_session = None
         self._ws_connect = None
         self._ws = None
 
+        self.connections = connections
+        self.gap_timeout = gap_timeout
+        self._wss = []
+        self._merger = None
+        self._readers = []
+
+        self._json_loads = json_loads or default_json_loads
+        self.skip_types = frozenset(skip_types or ())
+        self.typed_messages = typed_messages
+
+        self._handlers = {}
+        self.handler_stats = {}
+        self.queue_stats = QueueStats()
+
+        if stall_timeout is None and use_heartbeat:
+            stall_timeout = 5.0
+        self.stall_timeout = stall_timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._attempts = 0
+        self.reconnect_stats = ReconnectStats()
+
     async def _init(self):
         self._ws_session = aiohttp.ClientSession()
-        self._ws_connect = self._ws_session.ws_connect(
-            'wss://ws-feed.gdax.com')
-        self._ws = await self._ws_connect.__aenter__()
+        connects = [self._ws_session.ws_connect('wss://ws-feed.gdax.com')
+                    for _ in range(self.connections)]
+        self._wss = await asyncio.gather(
+            *[connect.__aenter__() for connect in connects])
+        self._ws_connect = connects[0]
+        self._ws = self._wss[0]
 
         # subscribe
         await self._subscribe()
@@ -60,12 +441,89 @@ class WebSocketFeedListener(ABC):
         if self.use_heartbeat:
             await self._send(type="heartbeat", on=True)
 
+        if self.connections > 1:
+            self._merger = FeedMerger(self.connections, self.gap_timeout)
+            self._readers = [
+                asyncio.ensure_future(self._read_connection(i, ws))
+                for i, ws in enumerate(self._wss)]
+
+    async def _read_connection(self, connection, ws):
+        # a failed connection is reconnected with the same backoff as the
+        # feed, while the others keep it going
+        attempts = 0
+        connected = time.time()
+        while True:
+            try:
+                if ws is None:
+                    await asyncio.sleep(self._backoff(attempts))
+                    attempts += 1
+                    ws = await self._open_connection(connection)
+                    connected = time.time()
+                    self._merger.restore(connection)
+                    logging.info(f'Connection {connection} re-established.')
+                while True:
+                    json_data = await self._receive(ws.receive_str())
+                    self._merger.put(connection, json_data)
+            except asyncio.CancelledError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError,
+                    OSError) as exc:
+                if ws is None:
+                    logging.error(f'Error: reconnecting connection '
+                                  f'{connection} failed: {exc!r}.')
+                    continue
+                logging.error(f'Error: connection {connection} failed: '
+                              f'{exc!r}. Reconnecting.')
+                self._merger.fail(connection, exc)
+                if time.time() - connected > self.backoff_cap:
+                    attempts = 0
+                await self._close_connection(ws)
+                ws = None
+            except Exception as exc:
+                logging.error(f'Error: connection {connection} failed: '
+                              f'{exc!r}.')
+                if ws is not None:
+                    self._merger.fail(connection, exc)
+                return
+
+    async def _open_connection(self, connection):
+        ws = await self._ws_session.ws_connect(
+            'wss://ws-feed.gdax.com').__aenter__()
+        self._wss[connection] = ws
+        try:
+            await ws.send_json(self._subscription())
+            if self.use_heartbeat:
+                await ws.send_json({'type': 'heartbeat', 'on': True})
+        except Exception:
+            await self._close_connection(ws)
+            raise
+        return ws
+
+    @staticmethod
+    async def _close_connection(ws):
+        try:
+            await ws.close()
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            pass
+
+    def _close_connections(self):
+        for reader in self._readers:
+            reader.cancel()
+        self._readers = []
+        if self._merger is not None:
+            self._merger.close()
+
+    @property
+    def connection_stats(self):
+        return self._merger.stats if self._merger is not None else []
+
     async def __aenter__(self):
         await asyncio.gather(self._init(), self._open_log_file())
 
         return self
 
     async def __aexit__(self, exc_type, exc, traceback):
+        self._close_connections()
         res = await asyncio.gather(
             self._ws_session.__aexit__(exc_type, exc, traceback),
             self._close_log_file(),
@@ -73,24 +531,210 @@ class WebSocketFeedListener(ABC):
         return res[0]
 
     async def _open_log_file(self):
-        if self.trade_log_file_path is not None:
-            self._trade_file = await aiofiles.open(self.trade_log_file_path,
-                                                   mode='a').__aenter__()
+        # appending to a compressed log measures it by decompressing it
+        if self.trade_log_file_path is not None and self.trade_log is None:
+            self.trade_log = await asyncio.get_event_loop().run_in_executor(
+                None, partial(TRADE_LOG_FORMATS[self.trade_log_format],
+                              self.trade_log_file_path,
+                              **self.trade_log_options))
 
     async def _close_log_file(self):
-        if self._trade_file is not None:
-            await self._trade_file.__aexit__(None, None, None)
+        # every line logged so far is in the file once __aexit__ returns
+        if self.trade_log is not None and not self._reconnecting:
+            await asyncio.get_event_loop().run_in_executor(
+                None, self.trade_log.close)
+            self.trade_log = None
 
     async def _send(self, **kwargs):
-        await self._ws.send_json(kwargs)
+        await asyncio.gather(*[ws.send_json(kwargs) for ws in self._wss])
 
     async def _recv(self):
-        json_data = await self._ws.receive_str()
-        if self._trade_file:
-            await self._trade_file.write(f'W {json_data}\n')
-        return json.loads(json_data)
+        return self._decode(await self._recv_frame())
+
+    async def _recv_frame(self):
+        if self._merger is not None:
+            json_data = await self._receive(self._merger.get())
+        else:
+            json_data = await self._receive(self._ws.receive_str())
+        if self.trade_log is not None:
+            self.trade_log.log_frame(json_data)
+        return json_data
+
+    async def _receive(self, receive):
+        try:
+            with async_timeout.timeout(self.stall_timeout):
+                return await receive
+        except asyncio.TimeoutError:
+            raise FeedStalledError(
+                f'No message for {self.stall_timeout} seconds')
+
+    def _backoff(self, attempts):
+        if not attempts:
+            return 0
+        # the exponent is bounded so that the delay cannot overflow
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base *
+                                     2 ** min(attempts - 1, 64)))
+
+    async def _reconnect(self, exc):
+        stats = self.reconnect_stats
+        stats.last_error = exc
+        if isinstance(exc, FeedStalledError):
+            stats.stalls += 1
+        started = time.time()
+        if (stats.last_reconnect is not None and
+                started - stats.last_reconnect > self.backoff_cap):
+            self._attempts = 0
+        while True:
+            delay = self._backoff(self._attempts)
+            self._attempts += 1
+            logging.error(f'Error: Exception: {exc!r}. Re-initializing '
+                          f'websocket in {delay:.1f} seconds.')
+            await asyncio.sleep(delay)
+            self._reconnecting = True
+            try:
+                await self.__aexit__(None, None, None)
+                await self.__aenter__()
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError,
+                    OSError) as error:
+                stats.failed_attempts += 1
+                stats.last_error = exc = error
+            finally:
+                self._reconnecting = False
+        stats.reconnects += 1
+        stats.last_reconnect = time.time()
+        stats.downtime += stats.last_reconnect - started
+
+    async def run(self, queue_size=10000, overflow='block'):
+        """Receives and applies messages until cancelled.
+
+        Frames are read into a queue of at most queue_size frames by one task
+        and decoded and handled by another. When the queue is full, the
+        receiving task waits for room if overflow is 'block', and drops the
+        frame (see _on_drop) if it is 'drop'. Exceptions other than a server
+        disconnection, which reconnects, are raised.
+
+        """
+        if overflow not in ('block', 'drop'):
+            raise ValueError(f'unknown overflow policy {overflow!r}')
+        while True:
+            queue = asyncio.Queue(maxsize=queue_size)
+            self.queue_stats._queue = queue
+            receiver = asyncio.ensure_future(
+                self._receive_frames(queue, overflow == 'block'))
+            applier = asyncio.ensure_future(self._apply_frames(queue))
+            try:
+                done, _ = await asyncio.wait(
+                    [receiver, applier], return_when=asyncio.FIRST_EXCEPTION)
+            finally:
+                receiver.cancel()
+                applier.cancel()
+            if applier in done:
+                applier.result()
+            exc = receiver.exception()
+            if not isinstance(exc, aiohttp.ServerDisconnectedError):
+                raise exc
+            await self._reconnect(exc)
+
+    async def _receive_frames(self, queue, block):
+        stats = self.queue_stats
+        while True:
+            json_data = await self._recv_frame()
+            item = (time.perf_counter(), json_data)
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                if not block:
+                    stats.dropped += 1
+                    self._on_drop(json_data)
+                    continue
+                await queue.put(item)
+            depth = queue.qsize()
+            if depth > stats.high_water:
+                stats.high_water = depth
+
+    async def _apply_frames(self, queue):
+        stats = self.queue_stats
+        while True:
+            received, json_data = await queue.get()
+            self._handle(self._decode(json_data))
+            stats.add_delay(time.perf_counter() - received)
+
+    def _on_drop(self, json_data):
+        """Called for each frame dropped because the queue was full."""
+        pass
+
+    def _handle(self, message):
+        return self._dispatch(message)
+
+    def _decode(self, json_data):
+        if self.skip_types:
+            msg_type = sniff_type(json_data)
+            if msg_type in self.skip_types and self._skip(msg_type,
+                                                          json_data):
+                return summarize(msg_type, json_data)
+        message = self._json_loads(json_data)
+        if self.typed_messages:
+            return self._parse_message(message)
+        return message
+
+    def _parse_message(self, message):
+        return gdax.messages.parse_message(message)
+
+    def register_handler(self, msg_type, handler):
+        """Calls handler(message) for each message of type msg_type.
+
+        Returns the handler it replaces, if any, so that a new handler can
+        wrap it.
+
+        """
+        previous = self._handlers.get(msg_type)
+        self._handlers[msg_type] = handler
+        return previous
+
+    def unregister_handler(self, msg_type):
+        return self._handlers.pop(msg_type, None)
+
+    def _dispatch(self, message):
+        msg_type = message['type']
+        handler = self._handlers.get(msg_type)
+        if handler is None:
+            return self._unhandled(message)
+        start = time.perf_counter()
+        try:
+            return handler(message)
+        finally:
+            stats = self.handler_stats.get(msg_type)
+            if stats is None:
+                stats = self.handler_stats[msg_type] = HandlerStats()
+            stats.add(time.perf_counter() - start)
+
+    def _unhandled(self, message):
+        """Called for messages of a type without a handler."""
+        pass
+
+    def _skip(self, msg_type, json_data):
+        """Whether a frame of a type in skip_types can be left undecoded."""
+        return True
+
+    def _pending_frames(self):
+        """Number of frames already received, which _recv returns without
+        waiting.
+
+        aiohttp only exposes them as the private reader queue of the
+        websocket; without it, 0 is returned and batches stop after each
+        message.
+
+        """
+        if self._merger is not None:
+            return self._merger.qsize()
+        reader = getattr(self._ws, '_reader', None)
+        return len(reader) if reader is not None else 0
 
     async def _subscribe(self):
+        return await self._send(**self._subscription())
+
+    def _subscription(self):
         message = {
             'type': 'subscribe',
             'product_ids': self.product_ids,
@@ -111,7 +755,17 @@ class WebSocketFeedListener(ABC):
             message['key'] = self.api_key
             message['passphrase'] = self.passphrase
 
-        return await self._send(**message)
+        return message
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """Handles messages until one is returned by handle_message."""
+        while True:
+            message = await self.handle_message()
+            if message is not None:
+                return message
 
     @abstractmethod
     async def handle_message(self):
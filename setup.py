@@ -12,7 +12,6 @@ setup(
       author_email='cskornel@gmail.com',
       install_requires=[
         'aiohttp==2.2.0',
-        'aiofiles==0.3.1',
         'async_timeout==1.2.1',
         'sortedcontainers==1.5.9',
       ],
@@ -1,6 +1,8 @@
 import uuid
 from asynctest import PropertyMock, MagicMock
 
+import gdax.orderbook
+
 
 class AsyncContextManagerMock(MagicMock):
     async def __aenter__(self):
@@ -23,3 +25,13 @@ class AsyncContextManagerMockPagination(MagicMock):
 
 def generate_id():
     return str(uuid.uuid4())
+
+
+def loaded_orderbook(books):
+    """Returns an OrderBook of the products of books, with the level 3
+    snapshot each of them maps to loaded, unless it is None."""
+    orderbook = gdax.orderbook.OrderBook(list(books))
+    for product_id, book in books.items():
+        if book is not None:
+            orderbook._load_snapshot(product_id, book)
+    return orderbook
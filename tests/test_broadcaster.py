@@ -0,0 +1,126 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from asynctest import patch, CoroutineMock
+
+import gdax.broadcaster
+
+from tests.helpers import generate_id, loaded_orderbook
+
+product_id = 'BTC-USD'
+sequence = 100
+ask_id = generate_id()
+
+
+def _orderbook():
+    return loaded_orderbook({
+        product_id: {
+            'sequence': sequence,
+            'bids': [['99.00', '1.0', generate_id()],
+                     ['100.00', '2.0', generate_id()]],
+            'asks': [['101.00', '3.0', ask_id],
+                     ['102.00', '4.0', generate_id()]],
+        },
+        'ETH-USD': {'sequence': sequence, 'bids': [], 'asks': []},
+    })
+
+
+def _open(orderbook, side, price, size):
+    orderbook._handle({
+        'type': 'open', 'product_id': product_id, 'side': side,
+        'price': price, 'remaining_size': size, 'order_id': generate_id(),
+        'sequence': orderbook._sequences[product_id] + 1})
+
+
+top = (Decimal('100.00'), Decimal('2.0'), Decimal('101.00'), Decimal('3.0'))
+
+
+def test_conflate():
+    orderbook = _orderbook()
+    broadcaster = gdax.broadcaster.Broadcaster(orderbook)
+    fast = broadcaster.subscribe(product_id)
+    slow = broadcaster.subscribe(product_id)
+    assert fast.get_nowait() == (product_id, top)
+    with pytest.raises(asyncio.QueueEmpty):
+        fast.get_nowait()
+
+    # below the top of book
+    _open(orderbook, 'buy', '98.00', '1.0')
+    broadcaster.publish()
+    assert fast.pending == 0
+
+    _open(orderbook, 'buy', '100.00', '1.0')
+    broadcaster.publish()
+    assert fast.get_nowait() == (product_id, top[:1] + (Decimal('3.0'),) +
+                                 top[2:])
+    _open(orderbook, 'buy', '100.50', '1.0')
+    broadcaster.publish()
+    assert fast.get_nowait()[1][0] == Decimal('100.50')
+
+    # the slow subscriber only gets the latest top of book
+    assert slow.pending == 1
+    assert slow.dropped == 2
+    assert slow.get_nowait()[1][0] == Decimal('100.50')
+    assert fast.delivered == 3
+    assert slow.delivered == 1
+    assert 0 < slow.max_lag
+    assert repr(slow).startswith('Subscriber(depth=None, conflate=True, ')
+
+    broadcaster.unsubscribe(slow)
+    assert broadcaster.subscribers == [fast]
+
+
+def test_queue():
+    orderbook = _orderbook()
+    broadcaster = gdax.broadcaster.Broadcaster(orderbook)
+    subscriber = broadcaster.subscribe(depth=1, conflate=False, maxsize=3)
+    assert subscriber.pending == 2
+    for price in ['100.10', '100.20', '100.30']:
+        _open(orderbook, 'buy', price, '1.0')
+        broadcaster.publish()
+
+    assert subscriber.pending == 3
+    assert subscriber.dropped == 2
+    assert [subscriber.get_nowait()[1]['bids'] for _ in range(3)] == [
+        [[Decimal(price), Decimal('1.0')]]
+        for price in ['100.10', '100.20', '100.30']]
+
+    # deeper than the subscribed depth
+    _open(orderbook, 'sell', '101.00', '1.0')
+    _open(orderbook, 'sell', '102.00', '1.0')
+    broadcaster.publish()
+    assert subscriber.get_nowait() == (product_id, {
+        'bids': [[Decimal('100.30'), Decimal('1.0')]],
+        'asks': [[Decimal('101.00'), Decimal('4.0')]],
+    })
+    assert subscriber.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_run():
+    orderbook = _orderbook()
+    broadcaster = gdax.broadcaster.Broadcaster(orderbook)
+    subscriber = broadcaster.subscribe(product_id)
+    assert await subscriber.__anext__() == (product_id, top)
+
+    batches = []
+
+    def handle_batch(max_messages):
+        batches.append(max_messages)
+        if len(batches) > 1:
+            raise ValueError
+        orderbook.match(product_id, {'maker_order_id': ask_id,
+                                     'side': 'sell', 'size': '1.0',
+                                     'price': '101.00'})
+        orderbook._check_top_of_book(product_id, top)
+        return {product_id}
+
+    with patch.object(orderbook, 'handle_batch',
+                      new=CoroutineMock(side_effect=handle_batch)):
+        task = asyncio.ensure_future(broadcaster.run())
+        assert await asyncio.wait_for(subscriber.get(), 1) == (
+            product_id, top[:3] + (Decimal('2.0'),))
+        with pytest.raises(ValueError):
+            await task
+    assert batches == [1000, 1000]
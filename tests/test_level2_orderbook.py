@@ -0,0 +1,99 @@
+import json
+from decimal import Decimal
+
+import pytest
+from asynctest import patch, CoroutineMock
+
+import gdax
+import gdax.level2_orderbook
+import gdax.orderbook
+
+from tests.helpers import AsyncContextManagerMock
+
+
+snapshot = {
+    "type": "snapshot",
+    "product_id": "BTC-USD",
+    "bids": [["2595.52", "1.5"], ["2595.62", "0.41152763"]],
+    "asks": [["2596.74", "0.2"], ["2596.77", "0.07670504"]],
+}
+
+
+@pytest.mark.asyncio
+@patch('aiohttp.ClientSession.ws_connect',
+       new_callable=AsyncContextManagerMock)
+class TestLevel2Orderbook(object):
+    async def test_subscribe(self, mock_connect):
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        product_ids = ['BTC-USD', 'ETH-USD']
+        async with gdax.level2_orderbook.Level2OrderBook(product_ids):
+            msg = {'type': 'subscribe', 'product_ids': product_ids,
+                   'channels': ['level2']}
+            mock_connect.return_value.aenter.send_json.assert_called_with(
+                msg)
+
+    async def test_messages(self, mock_connect):
+        product_id = 'BTC-USD'
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        messages_expected = [
+            {
+                "type": "subscriptions",
+                "channels": [{"name": "level2",
+                              "product_ids": [product_id]}],
+            },
+            snapshot,
+            {
+                "type": "l2update",
+                "product_id": product_id,
+                "changes": [
+                    ["buy", "2595.70", "2"],
+                    ["sell", "2596.74", "0"],
+                    ["sell", "2596.77", "1.5"],
+                ],
+            },
+        ]
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps(message) for message in messages_expected
+        ]
+        async with gdax.level2_orderbook.Level2OrderBook(
+                product_id) as orderbook:
+            assert await orderbook.handle_message() is None
+
+            message = await orderbook.handle_message()
+            assert message == messages_expected[1]
+            assert orderbook.get_current_book(product_id) == {
+                'bids': [[Decimal('2595.52'), Decimal('1.5')],
+                         [Decimal('2595.62'), Decimal('0.41152763')]],
+                'asks': [[Decimal('2596.74'), Decimal('0.2')],
+                         [Decimal('2596.77'), Decimal('0.07670504')]],
+            }
+            assert orderbook.get_bid(product_id) == Decimal('2595.62')
+            assert orderbook.get_ask(product_id) == Decimal('2596.74')
+            assert orderbook.get_max_bid_depth(product_id) == \
+                Decimal('0.41152763')
+            assert orderbook.get_min_ask_depth(product_id) == Decimal('0.2')
+
+            message = await orderbook.handle_message()
+            assert message == messages_expected[2]
+            assert orderbook.get_bid(product_id) == Decimal('2595.70')
+            assert orderbook.get_max_bid_depth(product_id) == Decimal('2')
+            assert orderbook.get_ask(product_id) == Decimal('2596.77')
+            assert orderbook.get_min_ask_depth(product_id) == Decimal('1.5')
+            assert orderbook.get_asks(product_id, Decimal('2596.74')) is None
+            assert orderbook.get_bids(product_id, Decimal('2595.52')) == \
+                Decimal('1.5')
+
+    async def test_error_message(self, mock_connect):
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps({"type": "error", "message": "test error"}),
+            json.dumps({"type": "unknownmsgtype"}),
+        ]
+        async with gdax.level2_orderbook.Level2OrderBook() as orderbook:
+            with pytest.raises(gdax.orderbook.OrderBookError):
+                await orderbook.handle_message()
+
+            with pytest.raises(gdax.orderbook.OrderBookError):
+                await orderbook.handle_message()
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+import pytest
+
+import gdax.messages
+import gdax.utils
+
+
+def test_parse_message():
+    data = {
+        "type": "done",
+        "time": "2014-11-07T08:19:27.028459Z",
+        "product_id": "BTC-USD",
+        "sequence": 10,
+        "price": "200.2",
+        "order_id": "d50ec984-77a8-460a-b958-66f114b0de9b",
+        "reason": "filled",
+        "side": "sell",
+        "remaining_size": "0.5"
+    }
+    message = gdax.messages.parse_message(data)
+    assert isinstance(message, gdax.messages.Done)
+    assert message.price == Decimal('200.2')
+    assert message.remaining_size == Decimal('0.5')
+    assert message['type'] == 'done'
+    assert message['sequence'] == 10
+    assert message.get('funds') is None
+    assert 'price' in message
+    with pytest.raises(KeyError):
+        message['funds']
+    assert message == gdax.messages.Done.from_dict(data)
+    assert message != data
+    assert repr(message).startswith("Done(product_id='BTC-USD', ")
+
+    del data['price']
+    message = gdax.messages.parse_message(data)
+    assert message.price is None
+    assert 'price' not in message
+
+    heartbeat = {"type": "heartbeat", "sequence": 11}
+    assert gdax.messages.parse_message(heartbeat) is heartbeat
+
+
+def test_open():
+    units = gdax.utils.FixedPoint(Decimal('0.01'))
+    message = gdax.messages.Open.from_dict(
+        {"type": "open", "order_id": "id", "side": "buy", "price": "200.2",
+         "remaining_size": "1.00"},
+        parse_price=units.parse)
+    assert message.price == 20020
+    assert message.remaining_size == Decimal('1.00')
+
+    message = gdax.messages.Open.from_dict(
+        {"id": "id", "side": "buy", "price": "200.2", "size": "1"})
+    assert message.order_id == 'id'
+    assert message.remaining_size == Decimal('1')
+    assert message.sequence is None
+
+
+def test_match_change():
+    message = gdax.messages.parse_message({
+        "type": "match", "trade_id": 10, "sequence": 50,
+        "maker_order_id": "maker", "taker_order_id": "taker",
+        "time": "2014-11-07T08:19:27.028459Z", "product_id": "BTC-USD",
+        "size": "5.23512", "price": "400.23", "side": "sell"})
+    assert isinstance(message, gdax.messages.Match)
+    assert message.size == Decimal('5.23512')
+    assert message.price == Decimal('400.23')
+
+    message = gdax.messages.parse_message({
+        "type": "change", "order_id": "id", "product_id": "BTC-USD",
+        "sequence": 80, "new_funds": "5.23512", "old_funds": "12.00",
+        "side": "sell"})
+    assert isinstance(message, gdax.messages.Change)
+    assert message.new_funds == Decimal('5.23512')
+    assert 'new_size' not in message
+    assert message.price is None
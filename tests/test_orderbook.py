@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import copy
 import json
 import base64
@@ -16,23 +18,27 @@ from tests.helpers import AsyncContextManagerMock, generate_id
 
 id1 = generate_id()
 id2 = generate_id()
+id3 = generate_id()
+id4 = generate_id()
+id5 = generate_id()
+id6 = generate_id()
 
 
 bids1 = [
     [Decimal("2525.00"), Decimal("1.5"), generate_id()],
     [Decimal("2595.52"), Decimal("100"), id2],
     [Decimal("2595.52"), Decimal("2"), id1],
-    [Decimal("2595.62"), Decimal("1.41152763"), id2],
+    [Decimal("2595.62"), Decimal("1.41152763"), id3],
     [Decimal("2595.70"), Decimal("1.5"), generate_id()],
 ]
 asks1 = [
     [Decimal("2596.74"), Decimal("0.2"), generate_id()],
     [Decimal("2596.77"), Decimal("0.07670504"), generate_id()],
     [Decimal("2615.1"), Decimal("0.011"), generate_id()],
-    [Decimal("2620.05"), Decimal("0.02"), id1],
+    [Decimal("2620.05"), Decimal("0.02"), id4],
     [Decimal("2620.1"), Decimal("100"), generate_id()],
-    [Decimal("2620.18"), Decimal("0.01"), id1],
-    [Decimal("2620.18"), Decimal("0.02"), id2],
+    [Decimal("2620.18"), Decimal("0.01"), id5],
+    [Decimal("2620.18"), Decimal("0.02"), id6],
 ]
 sequence = 3419033239
 
@@ -64,7 +70,7 @@ bids1_internal = {
         'price': Decimal('2595.62'),
         'side': 'buy',
         'size': Decimal('1.41152763'),
-        'id': id2}],
+        'id': id3}],
     Decimal('2595.70'): [{
         'price': Decimal('2595.70'),
         'side': 'buy',
@@ -87,7 +93,7 @@ asks1_internal = {
          'price': Decimal("2620.05"),
          'side': 'sell',
          'size': Decimal("0.02"),
-         'id': id1}],
+         'id': id4}],
     Decimal("2620.1"): [{
           'price': Decimal("2620.1"),
           'side': 'sell',
@@ -98,11 +104,11 @@ asks1_internal = {
         'price': Decimal("2620.18"),
         'side': 'sell',
         'size': Decimal("0.01"),
-        'id': id1}, {
+        'id': id5}, {
         'price': Decimal("2620.18"),
         'side': 'sell',
         'size': Decimal("0.02"),
-        'id': id2}],
+        'id': id6}],
     Decimal("2615.1"): [{
           'price': Decimal("2615.1"),
           'side': 'sell',
@@ -111,6 +117,23 @@ asks1_internal = {
 }
 
 
+def _orders(level):
+    return [{'id': order.id, 'side': order.side, 'price': order.price,
+             'size': order.size}
+            for order in level]
+
+
+def _levels(tree):
+    return {price: _orders(level) for price, level in tree.items()}
+
+
+async def _until(condition):
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0)
+
+
 @pytest.mark.asyncio
 @patch('aiohttp.ClientSession.ws_connect',
        new_callable=AsyncContextManagerMock)
@@ -128,8 +151,8 @@ class TestOrderbook(object):
 
             mock_book.assert_called_with(level=3)
 
-            assert dict(orderbook._asks[product_id].items()) == asks1_internal
-            assert dict(orderbook._bids[product_id].items()) == bids1_internal
+            assert _levels(orderbook._asks[product_id]) == asks1_internal
+            assert _levels(orderbook._bids[product_id]) == bids1_internal
             assert orderbook._sequences[product_id] == sequence
 
             assert orderbook.get_current_book(product_id) == {
@@ -141,16 +164,18 @@ class TestOrderbook(object):
             assert orderbook.get_ask(product_id) == Decimal('2596.74')
             assert orderbook.get_bid(product_id) == Decimal('2595.70')
 
-            assert orderbook.get_asks(product_id, Decimal("2620.18")) == [{
+            asks = orderbook.get_asks(product_id, Decimal("2620.18"))
+            assert _orders(asks) == [{
                 'price': Decimal("2620.18"),
                 'side': 'sell',
                 'size': Decimal("0.01"),
-                'id': id1}, {
+                'id': id5}, {
                 'price': Decimal("2620.18"),
                 'side': 'sell',
                 'size': Decimal("0.02"),
-                'id': id2}]
-            assert orderbook.get_bids(product_id, Decimal("2595.52")) == [{
+                'id': id6}]
+            bids = orderbook.get_bids(product_id, Decimal("2595.52"))
+            assert _orders(bids) == [{
                 'price': Decimal('2595.52'),
                 'side': 'buy',
                 'size': Decimal('100'),
@@ -241,7 +266,7 @@ class TestOrderbook(object):
             assert message == message_expected
 
     @patch('gdax.trader.Trader.get_product_order_book')
-    async def test_logfile(self, mock_book, mock_connect):
+    async def test_logfile(self, mock_book, mock_connect, tmpdir):
         mock_connect.return_value.aenter.receive_str = CoroutineMock()
         mock_connect.return_value.aenter.send_json = CoroutineMock()
         message_expected = {
@@ -266,22 +291,26 @@ class TestOrderbook(object):
         }
 
         mock_book.return_value = book
-        calls = [call(f'B {product_id} '
-                      f'{json.dumps(book, cls=gdax.utils.DecimalEncoder)}\n')]
-
-        with patch('aiofiles.open',
-                   new_callable=AsyncContextManagerMock) as mock_open:
-            mock_open.return_value.aenter.write = CoroutineMock()
-            mock_write = mock_open.return_value.aenter.write
-            async with gdax.orderbook.OrderBook(
-                    [product_id],
-                    trade_log_file_path='trades.txt') as orderbook:
+        lines = [
+            f'B {product_id} '
+            f'{json.dumps(book, cls=gdax.utils.DecimalEncoder)}\n',
+            f'W {json.dumps(message_expected)}\n',
+        ]
 
-                mock_write.assert_has_calls(calls)
+        path = str(tmpdir.join('trades.txt'))
+        async with gdax.orderbook.OrderBook(
+                [product_id], trade_log_file_path=path) as orderbook:
+            trade_log = orderbook.trade_log
+            assert trade_log.depth == 1
+            await orderbook.handle_message()
+            assert trade_log.depth == 2
 
-                await orderbook.handle_message()
-                calls.append(call(f'W {json.dumps(message_expected)}\n'))
-                mock_write.assert_has_calls(calls)
+        # flushed and closed by __aexit__
+        assert trade_log.depth == 0
+        assert trade_log.lines_written == 2
+        assert orderbook.trade_log is None
+        with open(path) as f:
+            assert f.read() == ''.join(lines)
 
     @patch('gdax.trader.Trader.get_product_order_book')
     async def test_orderbook_advanced(self, mock_book, mock_connect):
@@ -321,7 +350,7 @@ class TestOrderbook(object):
             {
               "type": "match",
               "trade_id": 17545514,
-              "maker_order_id": id2,
+              "maker_order_id": bids1[3][2],
               "taker_order_id": "bf07445d-03e3-4293-b5e6-26e34ce643b0",
               "side": "buy",
               "size": "0.41152763",
@@ -365,7 +394,7 @@ class TestOrderbook(object):
             assert orderbook.get_min_ask_depth(product_id) == \
                 Decimal('0.2')
             assert orderbook.get_ask(product_id) == price
-            assert orderbook.get_asks(product_id, price2) == \
+            assert _orders(orderbook.get_asks(product_id, price2)) == \
                 asks1_internal[price2]
 
             message = await orderbook.handle_message()
@@ -375,7 +404,7 @@ class TestOrderbook(object):
             assert orderbook.get_ask(product_id) == price
             asks = copy.deepcopy(asks1_internal[price2])
             asks[0]['size'] = Decimal('0.06670504')
-            assert orderbook.get_asks(product_id, price2) == \
+            assert _orders(orderbook.get_asks(product_id, price2)) == \
                 asks
             current_book['sequence'] += 1
             assert orderbook.get_current_book(product_id) != current_book
@@ -384,17 +413,17 @@ class TestOrderbook(object):
             price4 = Decimal('2595.70')
             # match 2
             current_book = orderbook.get_current_book(product_id)
-            assert orderbook.get_bids(product_id, price3) == \
+            assert _orders(orderbook.get_bids(product_id, price3)) == \
                 bids1_internal[price3]
-            assert orderbook.get_bids(product_id, price4) == \
+            assert _orders(orderbook.get_bids(product_id, price4)) == \
                 bids1_internal[price4]
             assert orderbook.get_bid(product_id) == price4
             message = await orderbook.handle_message()
             assert message == messages_expected[3]
             bids1_internal[price3][0]['size'] = Decimal('1.0')
-            assert orderbook.get_bids(product_id, price3) == \
+            assert _orders(orderbook.get_bids(product_id, price3)) == \
                 bids1_internal[price3]
-            assert orderbook.get_bids(product_id, price4) == \
+            assert _orders(orderbook.get_bids(product_id, price4)) == \
                 bids1_internal[price4]
             assert orderbook.get_bid(product_id) == price4
             current_book['sequence'] += 1
@@ -478,6 +507,37 @@ class TestOrderbook(object):
             message = await orderbook.handle_message()
             assert message == json.loads(messages_expected[2])
 
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_stall(self, mock_book, mock_connect):
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        mock_book.return_value = {'bids': [], 'asks': [], 'sequence': 1}
+        message = {"type": "heartbeat", "product_id": "ETH-USD",
+                   "sequence": 1, "last_trade_id": 1,
+                   "time": "2017-06-25T11:23:14.775000Z"}
+        stalled = True
+
+        async def receive_str():
+            nonlocal stalled
+            if stalled:
+                stalled = False
+                await asyncio.sleep(3600)
+            return json.dumps(message)
+
+        mock_connect.return_value.aenter.receive_str = receive_str
+        async with gdax.orderbook.OrderBook(
+                use_heartbeat=True, stall_timeout=0.01) as orderbook:
+            assert await orderbook.handle_message() is None
+            assert await orderbook.handle_message() == message
+
+            stats = orderbook.reconnect_stats
+            assert stats.reconnects == 1
+            assert stats.stalls == 1
+            assert stats.failed_attempts == 0
+            assert isinstance(
+                stats.last_error,
+                gdax.websocket_feed_listener.FeedStalledError)
+            assert mock_book.call_count == 2
+
     @patch('gdax.trader.Trader.get_product_order_book')
     async def test_out_of_order(self, mock_book, mock_connect):
         mock_connect.return_value.aenter.receive_str = CoroutineMock()
@@ -527,11 +587,623 @@ class TestOrderbook(object):
             message = await orderbook.handle_message()
             assert message == messages_expected[0]
 
+            # gap, the product is re-synchronized
+            mock_book.return_value = {'bids': [], 'asks': [], 'sequence': 3}
             message = await orderbook.handle_message()
             assert message is None
+            resync = orderbook._resync_tasks['ETH-USD']
 
+            # buffered until the new snapshot arrives
+            message = await orderbook.handle_message()
+            assert message is None
+
+            await resync
+            assert mock_book.call_count == 2
+            assert orderbook._sequences['ETH-USD'] == 4
+            assert orderbook._resync_buffers == {}
+            assert orderbook._resync_tasks == {}
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_resync(self, mock_book, mock_connect):
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        product_ids = ['ETH-USD', 'BTC-USD']
+        order_ids = [generate_id() for _ in range(3)]
+        mock_book.return_value = {'bids': [], 'asks': [], 'sequence': 1}
+
+        def _open(product_id, sequence, order_id, price):
+            return {"type": "open", "side": "sell", "price": price,
+                    "order_id": order_id, "remaining_size": "1.0",
+                    "product_id": product_id, "sequence": sequence}
+
+        messages_expected = [
+            _open('ETH-USD', 2, order_ids[0], "200.00"),
+            # ETH-USD gap
+            _open('ETH-USD', 5, order_ids[1], "201.00"),
+            _open('BTC-USD', 2, generate_id(), "2600.00"),
+            # already in the new snapshot
+            {"type": "received", "product_id": "ETH-USD", "sequence": 4},
+            _open('ETH-USD', 6, order_ids[2], "202.00"),
+            _open('BTC-USD', 3, generate_id(), "2601.00"),
+            {"type": "received", "product_id": "ETH-USD", "sequence": 7},
+        ]
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps(message_expected)
+            for message_expected in messages_expected
+        ]
+        async with gdax.orderbook.OrderBook(product_ids) as orderbook:
+            message = await orderbook.handle_message()
+            assert message == messages_expected[0]
+
+            mock_book.reset_mock()
+            mock_book.return_value = {
+                'bids': [],
+                'asks': [[Decimal('199.00'), Decimal('1.0'), order_ids[0]]],
+                'sequence': 4,
+            }
+            message = await orderbook.handle_message()
+            assert message is None
+            resync = orderbook._resync_tasks['ETH-USD']
+
+            # other products are not affected
             message = await orderbook.handle_message()
             assert message == messages_expected[2]
+            assert orderbook._sequences['BTC-USD'] == 2
+
+            for _ in range(2):
+                message = await orderbook.handle_message()
+                assert message is None
+            assert orderbook._sequences['ETH-USD'] == 2
+
+            await resync
+            mock_book.assert_called_once_with(level=3)
+            assert orderbook._sequences['ETH-USD'] == 6
+            assert [order[2] for order in
+                    orderbook.get_current_book('ETH-USD')['asks']] == \
+                order_ids
+            assert orderbook.get_ask('ETH-USD') == Decimal('199.00')
+
+            for message_expected in messages_expected[5:]:
+                message = await orderbook.handle_message()
+                assert message == message_expected
+            assert orderbook._sequences['ETH-USD'] == 7
+            assert orderbook._sequences['BTC-USD'] == 3
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_buffered_start(self, mock_book, mock_connect):
+        product_id = 'ETH-USD'
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        order_id = generate_id()
+        messages_expected = [
+            {"type": "received", "product_id": product_id, "sequence": 2},
+            {"type": "open", "side": "buy", "price": "200.00",
+             "order_id": order_id, "remaining_size": "1.0",
+             "product_id": product_id, "sequence": 3},
+            {"type": "received", "product_id": product_id, "sequence": 4},
+        ]
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps(message_expected)
+            for message_expected in messages_expected
+        ]
+        snapshot_ready = asyncio.Event()
+
+        async def get_product_order_book(level):
+            await snapshot_ready.wait()
+            return {'bids': [], 'asks': [], 'sequence': 2}
+
+        mock_book.side_effect = get_product_order_book
+        async with gdax.orderbook.OrderBook(
+                product_id, buffered_start=True) as orderbook:
+            assert orderbook._sequences[product_id] is None
+            assert orderbook.sync_durations[product_id] is None
+            for _ in range(2):
+                message = await orderbook.handle_message()
+                assert message is None
+
+            with pytest.raises(asyncio.TimeoutError):
+                await orderbook.wait_for_sync(timeout=0.01)
+
+            snapshot_ready.set()
+            await orderbook.wait_for_sync(timeout=1)
+            mock_book.assert_called_once_with(level=3)
+            assert orderbook._sequences[product_id] == 3
+            assert orderbook.get_bid(product_id) == Decimal('200.00')
+            assert orderbook.sync_durations[product_id] >= 0.01
+
+            message = await orderbook.handle_message()
+            assert message == messages_expected[2]
+            assert orderbook._sequences[product_id] == 4
+
+            # nothing to wait for
+            await orderbook.wait_for_sync()
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_resync_gap_at_end(self, mock_book, mock_connect):
+        product_id = 'ETH-USD'
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        message = {"type": "received", "product_id": product_id,
+                   "sequence": 3}
+        mock_connect.return_value.aenter.receive_str = CoroutineMock(
+            return_value=json.dumps(message))
+        snapshots = asyncio.Queue()
+
+        async def get_product_order_book(level):
+            return await snapshots.get()
+
+        mock_book.side_effect = get_product_order_book
+        async with gdax.orderbook.OrderBook(
+                product_id, buffered_start=True) as orderbook:
+            assert await orderbook.handle_message() is None
+
+            # the only buffered message is past this snapshot
+            await snapshots.put({'bids': [], 'asks': [], 'sequence': 1})
+            await _until(lambda: mock_book.call_count == 2)
+            assert orderbook._sequences[product_id] == 1
+            assert product_id in orderbook._resync_buffers
+            assert orderbook.sync_durations[product_id] is None
+
+            await snapshots.put({'bids': [], 'asks': [], 'sequence': 2})
+            await orderbook.wait_for_sync(timeout=1)
+            assert orderbook._sequences[product_id] == 3
+            assert orderbook.sync_durations[product_id] is not None
+            assert orderbook._resync_started == {}
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_wait_for_sync_gap(self, mock_book, mock_connect):
+        product_id = 'ETH-USD'
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        mock_connect.return_value.aenter.receive_str = CoroutineMock(
+            side_effect=[json.dumps({"type": "received",
+                                     "product_id": product_id,
+                                     "sequence": sequence})
+                         for sequence in (3, 5)])
+        snapshots = asyncio.Queue()
+
+        async def get_product_order_book(level):
+            return await snapshots.get()
+
+        mock_book.side_effect = get_product_order_book
+        async with gdax.orderbook.OrderBook(
+                product_id, buffered_start=True) as orderbook:
+            for _ in range(2):
+                assert await orderbook.handle_message() is None
+            waiting = asyncio.ensure_future(
+                orderbook.wait_for_sync(timeout=1))
+            await asyncio.sleep(0)
+
+            # 4 is missing after this snapshot
+            await snapshots.put({'bids': [], 'asks': [], 'sequence': 2})
+            await _until(lambda: mock_book.call_count == 2)
+            await asyncio.sleep(0.01)
+            assert orderbook._sequences[product_id] == 3
+            assert not waiting.done()
+
+            await snapshots.put({'bids': [], 'asks': [], 'sequence': 4})
+            await waiting
+            assert orderbook._sequences[product_id] == 5
+            assert orderbook._resync_buffers == {}
+            assert orderbook.sync_durations[product_id] is not None
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_resync_error(self, mock_book, mock_connect):
+        product_id = 'ETH-USD'
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        mock_connect.return_value.aenter.receive_str = CoroutineMock(
+            return_value=json.dumps({"type": "received",
+                                     "product_id": product_id,
+                                     "sequence": 3}))
+        mock_book.side_effect = ValueError('bad snapshot')
+        async with gdax.orderbook.OrderBook(
+                product_id, buffered_start=True) as orderbook:
+            with pytest.raises(ValueError):
+                await orderbook.wait_for_sync(timeout=1)
+            assert orderbook._resync_tasks == {}
+            with pytest.raises(ValueError):
+                await orderbook.handle_message()
+
+        mock_book.side_effect = None
+        mock_book.return_value = {'bids': [], 'asks': [], 'sequence': 2}
+        async with orderbook:
+            await orderbook.wait_for_sync(timeout=1)
+            assert await orderbook.handle_message() is not None
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_handle_batch(self, mock_book, mock_connect):
+        product_id = 'BTC-USD'
+        mock_book.return_value = _book()
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        messages = [
+            {"type": "received", "side": "buy"},
+            {"type": "open", "side": "buy", "price": "2500.00",
+             "order_id": generate_id(), "remaining_size": "1.0"},
+            {"type": "change", "order_id": id2, "new_size": "101",
+             "price": "2595.52", "side": "buy"},
+            {"type": "match", "maker_order_id": asks1[0][2],
+             "side": "sell", "size": "0.05", "price": "2596.74"},
+            {"type": "received", "side": "buy"},
+            {"type": "received", "side": "buy"},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps(message) for message in messages
+        ]
+        async with gdax.orderbook.OrderBook(product_id) as orderbook:
+            assert orderbook.get_top_of_book(product_id) == (
+                Decimal('2595.70'), Decimal('1.5'),
+                Decimal('2596.74'), Decimal('0.2'))
+
+            with patch.object(gdax.orderbook.OrderBook, '_pending_frames',
+                              side_effect=[2, 1, 0, 0, 5]):
+                # the touch did not change
+                assert await orderbook.handle_batch() == set()
+                assert orderbook._sequences[product_id] == sequence + 3
+
+                assert await orderbook.handle_batch() == {product_id}
+                assert orderbook.get_top_of_book(product_id) == (
+                    Decimal('2595.70'), Decimal('1.5'),
+                    Decimal('2596.74'), Decimal('0.15'))
+
+                assert await orderbook.handle_batch(max_messages=1) == set()
+                assert orderbook._sequences[product_id] == sequence + 5
+
+            orderbook._load_snapshot(product_id, {
+                'bids': [], 'asks': [], 'sequence': sequence})
+            assert orderbook.get_top_of_book(product_id) == \
+                (None, None, None, None)
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_skip_ignored(self, mock_book, mock_connect):
+        product_id = 'BTC-USD'
+        mock_book.return_value = _book()
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        messages = [
+            {"type": "received", "order_id": generate_id(),
+             "order_type": "limit", "size": "0.1", "price": "2602.22",
+             "side": "sell"},
+            {"type": "done", "order_id": generate_id(), "side": "sell",
+             "reason": "filled", "remaining_size": "0"},
+            {"type": "done", "order_id": asks1[0][2], "side": "sell",
+             "reason": "canceled", "price": "2596.74",
+             "remaining_size": "0.2"},
+            {"type": "heartbeat", "last_trade_id": 17393422},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps(message) for message in messages
+        ]
+        async with gdax.orderbook.OrderBook(
+                product_id, skip_ignored=True) as orderbook:
+            for i, message in enumerate(messages):
+                result = await orderbook.handle_message()
+                if i == 2:
+                    assert result == message
+                else:
+                    assert result == {'type': message['type'],
+                                      'product_id': product_id,
+                                      'sequence': message['sequence']}
+            assert orderbook._sequences[product_id] == sequence + 4
+            assert orderbook.get_ask(product_id) == Decimal('2596.77')
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_typed_messages(self, mock_book, mock_connect):
+        product_id = 'BTC-USD'
+        mock_book.return_value = _book()
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        order_id = generate_id()
+        messages = [
+            {"type": "open", "side": "sell", "price": "2596.70",
+             "order_id": order_id, "remaining_size": "1.0"},
+            {"type": "match", "maker_order_id": order_id,
+             "taker_order_id": generate_id(), "trade_id": 1,
+             "side": "sell", "size": "0.25", "price": "2596.70"},
+            {"type": "change", "order_id": id2, "new_size": "101",
+             "old_size": "100", "price": "2595.52", "side": "buy"},
+            {"type": "done", "order_id": order_id, "side": "sell",
+             "reason": "canceled", "price": "2596.70",
+             "remaining_size": "0.75"},
+            {"type": "heartbeat", "last_trade_id": 1},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps(message) for message in messages
+        ]
+        async with gdax.orderbook.OrderBook(
+                product_id, typed_messages=True) as orderbook:
+            result = await orderbook.handle_message()
+            assert isinstance(result, gdax.messages.Open)
+            assert result.price == Decimal('2596.70')
+            assert result.remaining_size == Decimal('1.0')
+            assert orderbook.get_ask(product_id) == Decimal('2596.70')
+
+            result = await orderbook.handle_message()
+            assert isinstance(result, gdax.messages.Match)
+            assert orderbook.get_min_ask_depth(product_id) == \
+                Decimal('0.75')
+
+            result = await orderbook.handle_message()
+            assert isinstance(result, gdax.messages.Change)
+            assert _orders(orderbook.get_bids(product_id, '2595.52'))[0][
+                'size'] == Decimal('101')
+
+            result = await orderbook.handle_message()
+            assert isinstance(result, gdax.messages.Done)
+            assert orderbook.get_ask(product_id) == Decimal('2596.74')
+            assert order_id not in orderbook._orders[product_id]
+
+            assert await orderbook.handle_message() == messages[4]
+            assert orderbook._sequences[product_id] == sequence + 5
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_register_handler(self, mock_book, mock_connect):
+        product_id = 'BTC-USD'
+        mock_book.return_value = _book()
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        messages = [
+            {"type": "ticker", "product_id": product_id, "price": "2596.74",
+             "sequence": sequence + 1},
+            {"type": "match", "maker_order_id": asks1[0][2],
+             "product_id": product_id, "sequence": sequence + 1,
+             "side": "sell", "size": "0.05", "price": "2596.74"},
+        ]
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps(message) for message in messages
+        ]
+        async with gdax.orderbook.OrderBook(product_id) as orderbook:
+            tickers = []
+            trades = []
+            assert orderbook.register_handler('ticker', tickers.append) \
+                is None
+            on_match = orderbook.register_handler(
+                'match', lambda message: trades.append(on_match(message)))
+
+            # not subject to the sequence checks
+            assert await orderbook.handle_message() == messages[0]
+            assert tickers == messages[:1]
+            assert orderbook._sequences[product_id] == sequence
+
+            assert await orderbook.handle_message() == messages[1]
+            assert trades == [None]
+            assert orderbook.get_min_ask_depth(product_id) == \
+                Decimal('0.15')
+            assert orderbook._sequences[product_id] == sequence + 1
+
+            assert {msg_type: stats.count for msg_type, stats
+                    in orderbook.handler_stats.items()} == \
+                {'ticker': 1, 'match': 1}
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_run(self, mock_book, mock_connect, tmpdir):
+        product_id = 'BTC-USD'
+        mock_book.return_value = _book()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        order_id = generate_id()
+        messages = [
+            {"type": "open", "side": "sell", "price": "2596.70",
+             "order_id": order_id, "remaining_size": "1.0"},
+            {"type": "received", "order_id": generate_id(), "side": "buy"},
+            {"type": "match", "maker_order_id": order_id, "side": "sell",
+             "size": "0.25", "price": "2596.70"},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+        frames = [aiohttp.ServerDisconnectedError('error')] + [
+            json.dumps(message) for message in messages]
+
+        async def receive_str():
+            if not frames:
+                await asyncio.sleep(3600)
+            frame = frames.pop(0)
+            if isinstance(frame, Exception):
+                raise frame
+            return frame
+
+        mock_connect.return_value.aenter.receive_str = receive_str
+        async with gdax.orderbook.OrderBook(
+                product_id, trade_log_file_path=str(tmpdir.join('trades.log')),
+                trade_log_options={'rotate_interval': 3600}) as orderbook:
+            trade_log = orderbook.trade_log
+            task = asyncio.ensure_future(orderbook.run(queue_size=1))
+            await _until(lambda: orderbook.queue_stats.applied == 3)
+            # reconnected after the disconnection, with the same trade log
+            assert mock_book.call_count == 2
+            assert orderbook.trade_log is trade_log
+            assert len(trade_log.paths) == 1
+            assert orderbook._sequences[product_id] == sequence + 3
+            assert orderbook.get_top_of_book(product_id) == (
+                Decimal('2595.70'), Decimal('1.5'),
+                Decimal('2596.70'), Decimal('0.75'))
+
+            stats = orderbook.queue_stats
+            assert stats.depth == 0
+            assert stats.high_water == 1
+            assert stats.dropped == 0
+            assert 0 < stats.max_delay <= stats.total_delay
+            assert stats.mean_delay == stats.total_delay / 3
+
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            frames.append(json.dumps({"type": "error", "message": "test"}))
+            with pytest.raises(gdax.orderbook.OrderBookError):
+                await orderbook.run()
+            with pytest.raises(ValueError):
+                await orderbook.run(overflow='unknown')
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_run_drop(self, mock_book, mock_connect):
+        product_id = 'BTC-USD'
+        order_id = generate_id()
+        book = _book()
+        book['sequence'] = sequence + 2
+        book['asks'].insert(0, [Decimal('2596.70'), Decimal('1.0'), order_id])
+        mock_book.side_effect = [_book(), book]
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        messages = [
+            {"type": "received", "order_id": order_id, "side": "sell"},
+            {"type": "open", "side": "sell", "price": "2596.70",
+             "order_id": order_id, "remaining_size": "1.0"},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+        frames = [json.dumps(message) for message in messages]
+
+        async def receive_str():
+            if not frames:
+                await asyncio.sleep(3600)
+            return frames.pop(0)
+
+        mock_connect.return_value.aenter.receive_str = receive_str
+        async with gdax.orderbook.OrderBook(product_id) as orderbook:
+            task = asyncio.ensure_future(
+                orderbook.run(queue_size=1, overflow='drop'))
+            await _until(lambda: orderbook.queue_stats.dropped)
+            assert orderbook.queue_stats.dropped == 1
+            assert product_id in orderbook._resync_buffers
+
+            await orderbook.wait_for_sync(timeout=1)
+            assert orderbook._sequences[product_id] == sequence + 2
+            assert orderbook.get_ask(product_id) == Decimal('2596.70')
+            assert orderbook.sync_durations[product_id] is not None
+
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_callbacks(self, mock_book, mock_connect):
+        product_id = 'BTC-USD'
+        mock_book.return_value = _book()
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        best_id = generate_id()
+        deep_id = generate_id()
+        messages = [
+            {"type": "open", "side": "sell", "price": "2596.70",
+             "order_id": best_id, "remaining_size": "1.0"},
+            {"type": "open", "side": "sell", "price": "2700.00",
+             "order_id": deep_id, "remaining_size": "2.0"},
+            {"type": "received", "order_id": generate_id(), "side": "buy"},
+            {"type": "match", "maker_order_id": best_id, "side": "sell",
+             "size": "0.25", "price": "2596.70"},
+            {"type": "change", "order_id": deep_id, "new_size": "2.0",
+             "old_size": "2.0", "price": "2700.00", "side": "sell"},
+            {"type": "done", "order_id": deep_id, "side": "sell",
+             "reason": "canceled", "price": "2700.00",
+             "remaining_size": "2.0"},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+        mock_connect.return_value.aenter.receive_str.side_effect = [
+            json.dumps({"type": "subscriptions", "channels": []})] + [
+            json.dumps(message) for message in messages]
+
+        tops = []
+        trades = []
+        levels = []
+        async with gdax.orderbook.OrderBook(product_id) as orderbook:
+            assert orderbook.on_top_of_book(
+                lambda *args: tops.append(args)) is not None
+            orderbook.on_trade(lambda *args: trades.append(args))
+            orderbook.on_level_change(lambda *args: levels.append(args))
+
+            i = 0
+            async for message in orderbook:
+                assert message == messages[i]
+                i += 1
+                if i == len(messages):
+                    break
+
+        assert tops == [
+            (product_id, (Decimal('2595.70'), Decimal('1.5'),
+                          Decimal('2596.70'), Decimal('1.0'))),
+            (product_id, (Decimal('2595.70'), Decimal('1.5'),
+                          Decimal('2596.70'), Decimal('0.75'))),
+        ]
+        assert trades == [(product_id, messages[3])]
+        assert levels == [
+            (product_id, 'sell', Decimal('2596.70'), Decimal('1.0')),
+            (product_id, 'sell', Decimal('2700.00'), Decimal('2.0')),
+            (product_id, 'sell', Decimal('2596.70'), Decimal('0.75')),
+            (product_id, 'sell', Decimal('2700.00'), Decimal('0')),
+        ]
+
+        callback = tops.append
+        orderbook.on_top_of_book(callback)
+        orderbook.remove_callback(callback)
+        assert callback not in orderbook._top_of_book_callbacks
+
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_redundant_connections(self, mock_book, mock_connect):
+        product_id = 'BTC-USD'
+        mock_book.return_value = _book()
+        messages = [
+            {"type": "open", "side": "sell", "price": "2596.70",
+             "order_id": generate_id(), "remaining_size": "1.0"},
+            {"type": "received", "order_id": generate_id(), "side": "buy"},
+            {"type": "received", "order_id": generate_id(), "side": "buy"},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+        frames = [json.dumps(message) for message in messages]
+
+        def connection(frames):
+            frames = list(frames)
+
+            async def receive_str():
+                if not frames:
+                    await asyncio.sleep(3600)
+                frame = frames.pop(0)
+                if isinstance(frame, Exception):
+                    raise frame
+                return frame
+
+            connect = AsyncContextManagerMock()
+            connect.aenter.receive_str = receive_str
+            connect.aenter.send_json = CoroutineMock()
+            connect.aenter.close = CoroutineMock()
+            return connect
+
+        # the first connection misses a message, then fails and is
+        # reconnected
+        connections = [
+            connection([frames[0], frames[2],
+                        aiohttp.ServerDisconnectedError()]),
+            connection(frames),
+            connection([]),
+        ]
+        mock_connect.side_effect = connections
+        async with gdax.orderbook.OrderBook(
+                product_id, connections=2) as orderbook:
+            for connect in connections[:2]:
+                connect.aenter.send_json.assert_called_once_with({
+                    'type': 'subscribe', 'product_ids': [product_id]})
+            for message in messages:
+                assert await orderbook.handle_message() == message
+            assert orderbook._sequences[product_id] == sequence + 3
+            assert orderbook.get_ask(product_id) == Decimal('2596.70')
+
+            stats = orderbook.connection_stats
+            assert sum(stats.wins for stats in stats) == 3
+            assert sum(stats.duplicates for stats in stats) == 2
+            assert orderbook._merger.gap_fills == 1
+
+            await _until(lambda: stats[0].reconnects)
+            assert orderbook._merger._failed == set()
+            assert stats[0].failures == 1
+            connections[0].aenter.close.assert_called_once_with()
+            assert orderbook._wss[0] is connections[2].aenter
+            connections[2].aenter.send_json.assert_called_once_with({
+                'type': 'subscribe', 'product_ids': [product_id]})
+        assert orderbook._readers == []
 
     @patch('gdax.trader.Trader.get_product_order_book')
     async def test_orderbook_change(self, mock_book, mock_connect):
@@ -571,14 +1243,14 @@ class TestOrderbook(object):
             # change1
             current_book = orderbook.get_current_book(product_id)
             price = Decimal("2595.52")
-            assert orderbook.get_bids(product_id, price) == \
+            assert _orders(orderbook.get_bids(product_id, price)) == \
                 bids1_internal[price]
 
             message = await orderbook.handle_message()
             assert message == messages_expected[0]
             bids = copy.deepcopy(bids1_internal[price])
             bids[0]['size'] = Decimal('101')
-            assert orderbook.get_bids(product_id, price) == \
+            assert _orders(orderbook.get_bids(product_id, price)) == \
                 bids
             current_book['sequence'] += 1
             assert orderbook.get_current_book(product_id) != current_book
@@ -586,14 +1258,14 @@ class TestOrderbook(object):
             # change2
             current_book = orderbook.get_current_book(product_id)
             price2 = Decimal("2596.77")
-            assert orderbook.get_asks(product_id, price2) == \
+            assert _orders(orderbook.get_asks(product_id, price2)) == \
                 asks1_internal[price2]
 
             message = await orderbook.handle_message()
             assert message == messages_expected[1]
             asks = copy.deepcopy(asks1_internal[price2])
             asks[0]['size'] = Decimal('0.1')
-            assert orderbook.get_asks(product_id, price2) == \
+            assert _orders(orderbook.get_asks(product_id, price2)) == \
                 asks
             current_book['sequence'] += 1
             assert orderbook.get_current_book(product_id) != current_book
@@ -648,7 +1320,7 @@ class TestOrderbook(object):
             current_book = orderbook.get_current_book(product_id)
             price = Decimal('2596.74')
             price2 = Decimal('2596.77')
-            assert orderbook.get_asks(product_id, price) == \
+            assert _orders(orderbook.get_asks(product_id, price)) == \
                 asks1_internal[price]
             assert orderbook.get_ask(product_id) == price
 
@@ -663,7 +1335,7 @@ class TestOrderbook(object):
             current_book = orderbook.get_current_book(product_id)
             price2 = Decimal('2595.70')
             price3 = Decimal('2595.62')
-            assert orderbook.get_bids(product_id, price2) == \
+            assert _orders(orderbook.get_bids(product_id, price2)) == \
                 bids1_internal[price2]
             assert orderbook.get_bid(product_id) == price2
 
@@ -680,3 +1352,251 @@ class TestOrderbook(object):
             assert message == messages_expected[2]
             current_book['sequence'] += 1
             assert orderbook.get_current_book(product_id) == current_book
+
+
+    @patch('gdax.trader.Trader.get_products')
+    @patch('gdax.trader.Trader.get_product_order_book')
+    async def test_fixed_point(self, mock_book, mock_products, mock_connect):
+        product_id = 'BTC-USD'
+        mock_connect.return_value.aenter.receive_str = CoroutineMock()
+        mock_connect.return_value.aenter.send_json = CoroutineMock()
+        mock_products.return_value = [
+            {'id': 'ETH-USD', 'quote_increment': Decimal('0.01')},
+            {'id': product_id, 'quote_increment': Decimal('0.01')},
+        ]
+        messages = [
+            {"type": "match", "maker_order_id": asks1[0][2],
+             "side": "sell", "size": "0.05", "price": "2596.74"},
+            {"type": "done", "order_id": bids1[4][2], "side": "buy",
+             "price": "2595.70", "remaining_size": "0.00000000"},
+            {"type": "change", "order_id": id2, "new_size": "101",
+             "price": "2595.52", "side": "buy"},
+            {"type": "open", "order_id": generate_id(), "side": "buy",
+             "price": "2596.00000000", "remaining_size": "0.12345678"},
+        ]
+        for i, message in enumerate(messages, 1):
+            message.update(product_id=product_id, sequence=sequence + i)
+
+        books = []
+        for fixed_point in [False, True]:
+            mock_book.return_value = _book()
+            mock_connect.return_value.aenter.receive_str.side_effect = [
+                json.dumps(message) for message in messages]
+            async with gdax.orderbook.OrderBook(
+                    product_id, fixed_point=fixed_point) as orderbook:
+                for message in messages:
+                    await orderbook.handle_message()
+                books.append(orderbook)
+
+        decimal_book, fixed_book = books
+        mock_products.assert_called_once_with()
+        assert fixed_book._price_units[product_id].places == 2
+        assert fixed_book._asks[product_id].peekitem(0)[0] == 259674
+        assert fixed_book._orders[product_id][asks1[0][2]].size == 15000000
+
+        assert fixed_book.get_current_book(product_id) == \
+            decimal_book.get_current_book(product_id)
+        for getter in ['get_ask', 'get_bid', 'get_min_ask_depth',
+                       'get_max_bid_depth']:
+            value = getattr(fixed_book, getter)(product_id)
+            assert isinstance(value, Decimal)
+            assert value == getattr(decimal_book, getter)(product_id)
+        assert fixed_book.get_bid(product_id) == Decimal('2596.00')
+        level = fixed_book.get_bids(product_id, Decimal('2595.52'))
+        assert [order.id for order in level] == [id2, id1]
+
+def test_price_level():
+    orders = [gdax.orderbook.Order(generate_id(), Decimal(i))
+              for i in range(3)]
+    level = gdax.orderbook.PriceLevel(Decimal('2595.52'), 'buy', orders)
+    assert len(level) == 3
+    assert level.first() is orders[0]
+    assert orders[1].id in level
+
+    assert level.remove(orders[1].id) is orders[1]
+    assert level.remove(orders[1].id) is None
+    assert level == [orders[0], orders[2]]
+
+    assert level.size == Decimal(2)
+    assert level.count == 2
+    assert orders[0].price == Decimal('2595.52')
+    assert orders[0].side == 'buy'
+
+    level.append(orders[1])
+    assert level == [orders[0], orders[2], orders[1]]
+    assert level.remove(orders[0].id) is orders[0]
+    assert level.first() is orders[2]
+    assert level.size == Decimal(3)
+
+    level.resize(orders[2], Decimal('0.5'))
+    assert orders[2].size == Decimal('0.5')
+    assert level.size == Decimal('1.5')
+
+
+def test_order_index():
+    product_id = 'BTC-USD'
+    orderbook = gdax.orderbook.OrderBook(product_id)
+    ids = [generate_id() for _ in range(3)]
+    for order_id in ids:
+        orderbook.add(product_id, {
+            'order_id': order_id,
+            'side': 'sell',
+            'price': '2596.74',
+            'remaining_size': '0.5',
+        })
+    price = Decimal('2596.74')
+    assert set(orderbook._orders[product_id]) == set(ids)
+    assert [o.id for o in orderbook.get_asks(product_id, price)] == ids
+
+    # done for an unknown order is ignored
+    orderbook.remove(product_id, {'order_id': generate_id(),
+                                  'side': 'sell', 'price': '2596.74'})
+    assert len(orderbook.get_asks(product_id, price)) == 3
+
+    # done from the middle of the level keeps FIFO order
+    orderbook.remove(product_id, {'order_id': ids[1],
+                                  'side': 'sell', 'price': '2596.74'})
+    assert [o.id for o in orderbook.get_asks(product_id, price)] == \
+        [ids[0], ids[2]]
+    assert ids[1] not in orderbook._orders[product_id]
+
+    # partial fill of the head
+    orderbook.match(product_id, {'maker_order_id': ids[0], 'side': 'sell',
+                                 'size': '0.2', 'price': '2596.74'})
+    assert orderbook._orders[product_id][ids[0]].size == Decimal('0.3')
+
+    # full fills remove the orders and finally the empty level
+    for order_id, size in [(ids[0], '0.3'), (ids[2], '0.5')]:
+        orderbook.match(product_id, {'maker_order_id': order_id,
+                                     'side': 'sell', 'size': size,
+                                     'price': '2596.74'})
+    assert orderbook.get_asks(product_id, price) is None
+    assert orderbook._orders[product_id] == {}
+
+    # change of an order which is not on the book
+    orderbook.change(product_id, {'order_id': ids[0], 'side': 'sell',
+                                  'new_size': '1', 'price': '2596.74'})
+    assert orderbook._orders[product_id] == {}
+
+
+def test_set_level():
+    product_id = 'BTC-USD'
+    orderbook = gdax.orderbook.OrderBook(product_id)
+    price = Decimal('2595.52')
+    orders = [gdax.orderbook.Order(generate_id(), Decimal('1'))
+              for _ in range(2)]
+    orderbook.set_bids(product_id, price, orders)
+    assert orderbook.get_bids(product_id, price) == orders
+    assert set(orderbook._orders[product_id]) == {o.id for o in orders}
+
+    orderbook.set_bids(product_id, price, orders[1:])
+    assert set(orderbook._orders[product_id]) == {orders[1].id}
+
+    orderbook.remove_bids(product_id, price)
+    assert orderbook.get_bids(product_id, price) is None
+    assert orderbook._orders[product_id] == {}
+
+
+def test_touch():
+    product_id = 'BTC-USD'
+    orderbook = gdax.orderbook.OrderBook(product_id)
+
+    def add(order_id, side, price, size):
+        orderbook.add(product_id, {'order_id': order_id, 'side': side,
+                                   'price': price, 'remaining_size': size})
+
+    with pytest.raises(IndexError):
+        orderbook.get_ask(product_id)
+
+    add('a1', 'sell', '101', '1')
+    add('a2', 'sell', '101', '2')
+    add('b1', 'buy', '99', '3')
+    assert orderbook.get_ask(product_id) == Decimal('101')
+    assert orderbook.get_bid(product_id) == Decimal('99')
+    assert orderbook.get_min_ask_depth(product_id) == Decimal('3')
+    assert orderbook.get_max_bid_depth(product_id) == Decimal('3')
+
+    # a better price moves the touch, a worse one does not
+    add('a3', 'sell', '100.5', '0.5')
+    add('a4', 'sell', '102', '1')
+    add('b2', 'buy', '99.5', '4')
+    add('b3', 'buy', '98', '1')
+    assert orderbook.get_ask(product_id) == Decimal('100.5')
+    assert orderbook.get_bid(product_id) == Decimal('99.5')
+    assert orderbook.get_depth(product_id, 2) == {
+        'bids': [[Decimal('99.5'), Decimal('4')], [Decimal('99'),
+                                                    Decimal('3')]],
+        'asks': [[Decimal('100.5'), Decimal('0.5')], [Decimal('101'),
+                                                       Decimal('3')]],
+    }
+    assert len(orderbook.get_depth(product_id, 10)['bids']) == 3
+    assert orderbook.get_max_bid_depth(product_id) == Decimal('4')
+
+    # size updates are reflected in the depth
+    orderbook.match(product_id, {'maker_order_id': 'a3', 'side': 'sell',
+                                 'size': '0.2', 'price': '100.5'})
+    assert orderbook.get_min_ask_depth(product_id) == Decimal('0.3')
+    orderbook.change(product_id, {'order_id': 'b2', 'side': 'buy',
+                                  'new_size': '1', 'price': '99.5'})
+    assert orderbook.get_max_bid_depth(product_id) == Decimal('1')
+
+    # emptying the touch level falls back to the next level
+    orderbook.match(product_id, {'maker_order_id': 'a3', 'side': 'sell',
+                                 'size': '0.3', 'price': '100.5'})
+    orderbook.remove(product_id, {'order_id': 'b2', 'side': 'buy',
+                                  'price': '99.5'})
+    assert orderbook.get_ask(product_id) == Decimal('101')
+    assert orderbook.get_bid(product_id) == Decimal('99')
+    orderbook.remove(product_id, {'order_id': 'a1', 'side': 'sell',
+                                  'price': '101'})
+    assert orderbook.get_ask(product_id) == Decimal('101')
+    assert orderbook.get_min_ask_depth(product_id) == Decimal('2')
+
+
+def test_load_snapshot():
+    product_id = 'BTC-USD'
+    orderbook = gdax.orderbook.OrderBook(product_id)
+    orderbook.add(product_id, {'order_id': generate_id(), 'side': 'buy',
+                               'price': '1000.00', 'remaining_size': '1'})
+    assert orderbook.get_bid(product_id) == Decimal('1000.00')
+
+    orderbook._load_snapshot(product_id, _book())
+    assert orderbook.get_current_book(product_id) == _book()
+    assert orderbook._sequences[product_id] == sequence
+    assert set(orderbook._orders[product_id]) == \
+        {order[2] for order in bids1 + asks1}
+    assert orderbook.get_bid(product_id) == Decimal('2595.70')
+    assert orderbook.get_ask(product_id) == Decimal('2596.74')
+
+    level = orderbook.get_bids(product_id, Decimal('2595.52'))
+    assert [order.id for order in level] == [id2, id1]
+    assert level.size == Decimal('102')
+    assert orderbook._orders[product_id][id1] is level._orders[id1]
+
+    # unsorted rows are still grouped correctly
+    order_ids = [generate_id() for _ in range(3)]
+    orderbook._load_snapshot(product_id, {
+        'sequence': sequence + 1,
+        'bids': [],
+        'asks': [[Decimal('10.5'), Decimal('1'), order_ids[0]],
+                 [Decimal('10.1'), Decimal('2'), order_ids[1]],
+                 [Decimal('10.5'), Decimal('3'), order_ids[2]]],
+    })
+    assert set(orderbook._orders[product_id]) == set(order_ids)
+    assert orderbook.get_current_book(product_id)['asks'] == [
+        [Decimal('10.1'), Decimal('2'), order_ids[1]],
+        [Decimal('10.5'), Decimal('1'), order_ids[0]],
+        [Decimal('10.5'), Decimal('3'), order_ids[2]],
+    ]
+    assert orderbook.get_ask(product_id) == Decimal('10.1')
+    with pytest.raises(IndexError):
+        orderbook.get_bid(product_id)
+
+
+def test_snapshot_executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    orderbook = gdax.orderbook.OrderBook(['BTC-USD', 'ETH-USD'],
+                                         snapshot_executor=executor)
+    for trader in orderbook.traders.values():
+        assert trader.executor is executor
+    executor.shutdown()
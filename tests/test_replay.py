@@ -0,0 +1,259 @@
+import asyncio
+from decimal import Decimal
+import json
+import os
+
+from asynctest import patch, CoroutineMock
+import pytest
+
+import gdax.orderbook
+import gdax.replay
+import gdax.trade_log
+from gdax.trade_log import BinaryTradeLogWriter
+
+from tests.helpers import AsyncContextManagerMock, generate_id
+from tests.test_orderbook import _book, sequence
+
+product_id = 'BTC-USD'
+
+
+def _message(msg_type, offset, **kwargs):
+    kwargs.update(type=msg_type, product_id=product_id,
+                  sequence=sequence + offset,
+                  time='2017-06-25T11:23:14.775000Z')
+    return kwargs
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('trade_log_format', ['text', 'binary'])
+@patch('aiohttp.ClientSession.ws_connect',
+       new_callable=AsyncContextManagerMock)
+@patch('gdax.trader.Trader.get_product_order_book')
+async def test_replay(mock_book, mock_connect, trade_log_format, tmpdir):
+    order_id = generate_id()
+    resync = _book()
+    resync['sequence'] = sequence + 4
+    resync['asks'].insert(0, [Decimal('2596.70'), Decimal('0.5'), order_id])
+    mock_book.side_effect = [_book(), resync]
+    messages = [
+        _message('open', 1, side='sell', price='2596.70',
+                 order_id=order_id, remaining_size='1.0'),
+        _message('match', 2, side='sell', price='2596.70', size='0.25',
+                 maker_order_id=order_id, taker_order_id=generate_id(),
+                 trade_id=1),
+        # a gap, re-synchronized at sequence + 4
+        _message('change', 4, side='sell', price='2596.70',
+                 order_id=order_id, new_size='0.5', old_size='0.75'),
+        _message('done', 5, side='sell', price='2596.70',
+                 order_id=order_id, reason='canceled',
+                 remaining_size='0.5'),
+        _message('heartbeat', 5, last_trade_id=1),
+    ]
+    mock_connect.return_value.aenter.send_json = CoroutineMock()
+    mock_connect.return_value.aenter.receive_str = CoroutineMock(
+        side_effect=[json.dumps(message) for message in messages])
+
+    path = str(tmpdir.join('trades.log'))
+    async with gdax.orderbook.OrderBook(
+            product_id, trade_log_file_path=path,
+            trade_log_format=trade_log_format) as live:
+        tops = []
+        live.on_top_of_book(lambda product_id, top: tops.append(top))
+        for _ in messages:
+            await live.handle_message()
+            await live.wait_for_sync()
+        assert live.get_ask(product_id) == Decimal('2596.74')
+
+    replayed_tops = []
+    async with gdax.replay.ReplayOrderBook(path) as orderbook:
+        assert orderbook.product_ids == [product_id]
+        orderbook.on_top_of_book(
+            lambda product_id, top: replayed_tops.append(top))
+        received = [message async for message in orderbook]
+        assert orderbook.finished
+        assert await orderbook.replay() == len(messages)
+
+    assert orderbook.snapshots == 2
+    assert orderbook._sequences == live._sequences
+    assert orderbook.get_depth(product_id, 10) == \
+        live.get_depth(product_id, 10)
+    # the first one is from loading the first snapshot
+    assert replayed_tops[1:] == tops
+    assert received == messages[:2] + messages[3:]
+
+    # the gap skips sequence + 3
+    book = await gdax.replay.book_as_of(path, product_id, sequence + 4)
+    assert book['sequence'] == sequence + 4
+    with pytest.raises(gdax.orderbook.OrderBookError):
+        await gdax.replay.book_as_of(path, product_id, sequence + 3)
+
+
+@pytest.mark.asyncio
+@patch('gdax.replay.time.time', return_value=1000.0)
+@patch('asyncio.sleep', new_callable=CoroutineMock)
+async def test_speed(mock_sleep, mock_time, tmpdir):
+    path = str(tmpdir.join('trades.log'))
+    book = json.dumps({'sequence': sequence, 'bids': [], 'asks': []})
+    with BinaryTradeLogWriter(path) as writer:
+        writer.log_snapshot(product_id, book, 99.0)
+        for offset, timestamp in [(1, 100.0), (2, 101.0), (3, 103.0)]:
+            writer.log_frame(json.dumps(_message('heartbeat', offset)),
+                             timestamp)
+
+    async with gdax.replay.ReplayOrderBook(path, speed=2) as orderbook:
+        assert await orderbook.replay() == 3
+    assert mock_sleep.call_args_list == [((0.5,),), ((1.5,),)]
+
+    with pytest.raises(ValueError):
+        gdax.replay.ReplayOrderBook(path, fixed_point=True)
+
+
+def test_logged_products(tmpdir):
+    path = str(tmpdir.join('trades.log'))
+    book = json.dumps({'sequence': sequence, 'bids': [], 'asks': []})
+    # snapshots after frames, as with buffered_start
+    with BinaryTradeLogWriter(path) as writer:
+        writer.log_frame(json.dumps(_message('heartbeat', 1)))
+        writer.log_snapshot(product_id, book)
+        writer.log_frame(json.dumps(_message('heartbeat', 2)))
+        writer.log_snapshot('ETH-USD', book)
+    assert gdax.replay.ReplayOrderBook(path).product_ids == \
+        [product_id, 'ETH-USD']
+    gdax.trade_log.build_trade_log_index(path)
+    assert gdax.replay.ReplayOrderBook(path).product_ids == \
+        [product_id, 'ETH-USD']
+
+    path = str(tmpdir.join('frames.log'))
+    with BinaryTradeLogWriter(path) as writer:
+        writer.log_frame(json.dumps(_message('heartbeat', 1)))
+    with pytest.raises(gdax.orderbook.OrderBookError):
+        gdax.replay.ReplayOrderBook(path)
+
+
+@pytest.mark.asyncio
+async def test_seek(tmpdir):
+    path = str(tmpdir.join('trades.log'))
+    with BinaryTradeLogWriter(path, index_interval=10) as writer:
+        for offset in range(100):
+            if offset in (0, 50):
+                # the second snapshot differs from the book, to tell them
+                # apart
+                writer.log_snapshot(product_id, json.dumps(
+                    {'sequence': sequence + offset, 'bids': [],
+                     'asks': []}))
+            writer.log_frame(json.dumps(_message(
+                'open', offset + 1, side='buy', price=f'{100 + offset}.00',
+                order_id=generate_id(), remaining_size='1.0')))
+
+    async with gdax.replay.ReplayOrderBook(path) as orderbook:
+        assert await orderbook.replay_to(product_id, sequence + 40) == \
+            sequence + 40
+        assert orderbook.get_bid(product_id) == Decimal('139')
+        assert len(orderbook._orders[product_id]) == 40
+        with pytest.raises(gdax.orderbook.OrderBookError):
+            await orderbook.replay_to(product_id, sequence + 30)
+
+        assert orderbook.seek(product_id, sequence + 60) == sequence + 50
+        assert await orderbook.replay_to(product_id, sequence + 60) == \
+            sequence + 60
+        assert len(orderbook._orders[product_id]) == 10
+        assert orderbook.messages == 50
+
+        assert orderbook.seek(product_id, sequence + 30) == sequence
+        await orderbook.replay_to(product_id, sequence + 30)
+        assert len(orderbook._orders[product_id]) == 30
+
+        with pytest.raises(gdax.orderbook.OrderBookError):
+            await orderbook.replay_to(product_id, sequence + 200)
+        with pytest.raises(gdax.orderbook.OrderBookError):
+            orderbook.seek(product_id, sequence - 1)
+
+
+@pytest.mark.asyncio
+@patch('aiohttp.ClientSession.ws_connect',
+       new_callable=AsyncContextManagerMock)
+@patch('gdax.trader.Trader.get_product_order_book')
+async def test_book_as_of(mock_book, mock_connect, tmpdir):
+    mock_book.return_value = _book()
+    messages = [
+        _message('open', offset, side='sell', price=f'{2600 + offset}.00',
+                 order_id=generate_id(), remaining_size='1.0')
+        for offset in range(1, 50)]
+    mock_connect.return_value.aenter.send_json = CoroutineMock()
+    mock_connect.return_value.aenter.receive_str = CoroutineMock(
+        side_effect=[json.dumps(message) for message in messages])
+
+    path = str(tmpdir.join('trades.log'))
+    books = {}
+    async with gdax.orderbook.OrderBook(
+            product_id, trade_log_file_path=path, trade_log_format='binary',
+            trade_log_options={'index_interval': 10},
+            checkpoint_messages=10) as live:
+        for _ in messages:
+            await live.handle_message()
+            books[live._sequences[product_id]] = live.get_current_book(
+                product_id)
+
+    assert [kind for kind, _, _ in gdax.trade_log.read_trade_log(path)
+            ].count('C') == 4
+    index = gdax.trade_log.TradeLogIndex(path)
+    assert [entry[0] for entry in index.snapshots[product_id]] == \
+        [sequence, sequence + 10, sequence + 20, sequence + 30,
+         sequence + 40]
+    for offset in [5, 30, 35, 49]:
+        assert await gdax.replay.book_as_of(
+            path, product_id, sequence + offset) == books[sequence + offset]
+
+    # missing indexes are rebuilt
+    os.remove(path + '.idx')
+    assert await gdax.replay.book_as_of(path, product_id, sequence + 45) == \
+        books[sequence + 45]
+
+    # a full replay skips the checkpoints
+    async with gdax.replay.ReplayOrderBook(path) as orderbook:
+        assert await orderbook.replay() == len(messages)
+        assert orderbook.snapshots == 1
+        assert orderbook.get_current_book(product_id) == \
+            books[sequence + 49]
+
+
+@pytest.mark.asyncio
+@patch('aiohttp.ClientSession.ws_connect',
+       new_callable=AsyncContextManagerMock)
+@patch('gdax.trader.Trader.get_product_order_book')
+async def test_book_as_of_run(mock_book, mock_connect, tmpdir):
+    mock_book.return_value = _book()
+    frames = [json.dumps(_message(
+        'open', offset, side='sell', price=f'{2600 + offset}.00',
+        order_id=generate_id(), remaining_size='1.0'))
+        for offset in range(1, 50)]
+
+    async def receive_str():
+        if not frames:
+            await asyncio.sleep(3600)
+        return frames.pop(0)
+
+    mock_connect.return_value.aenter.send_json = CoroutineMock()
+    mock_connect.return_value.aenter.receive_str = receive_str
+
+    path = str(tmpdir.join('trades.log'))
+    async with gdax.orderbook.OrderBook(
+            product_id, trade_log_file_path=path, trade_log_format='binary',
+            trade_log_options={'index_interval': 10},
+            checkpoint_messages=10) as live:
+        task = asyncio.ensure_future(live.run())
+        while live.queue_stats.applied < 49:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    # every frame was logged before the first checkpoint
+    kinds = [kind for kind, _, _ in gdax.trade_log.read_trade_log(path)]
+    assert kinds == ['B'] + ['W'] * 49 + ['C'] * 4
+    for offset in [5, 18, 30, 49]:
+        async with gdax.replay.ReplayOrderBook(path) as orderbook:
+            await orderbook.replay_to(product_id, sequence + offset)
+            book = orderbook.get_current_book(product_id)
+        assert await gdax.replay.book_as_of(
+            path, product_id, sequence + offset) == book
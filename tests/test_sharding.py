@@ -0,0 +1,82 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+import gdax.orderbook
+import gdax.sharding
+
+
+class ReplayOrderBook(gdax.orderbook.OrderBook):
+    """Applies an open message per product instead of connecting."""
+
+    async def __aenter__(self):
+        self._messages = []
+        for product_id in self.product_ids:
+            self._load_snapshot(product_id, {
+                'sequence': 1,
+                'bids': [['100', '1', f'bid-{product_id}']],
+                'asks': [['101', '2', f'ask-{product_id}']],
+            })
+            self._messages.append({
+                'type': 'open', 'product_id': product_id, 'sequence': 2,
+                'order_id': f'open-{product_id}', 'side': 'buy',
+                'price': '100.5', 'remaining_size': '3'})
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        pass
+
+    async def handle_message(self):
+        if not self._messages:
+            await asyncio.sleep(3600)
+        return self._handle(self._messages.pop(0))
+
+
+class FailingOrderBook(ReplayOrderBook):
+    async def __aenter__(self):
+        raise gdax.orderbook.OrderBookError('test')
+
+
+def test_shard():
+    assert gdax.sharding._shard(['A', 'B', 'C'], 2) == [['A', 'C'], ['B']]
+    assert gdax.sharding._shard(['A'], 2) == [['A']]
+
+
+@pytest.mark.asyncio
+async def test_sharded_orderbook():
+    product_ids = ['BTC-USD', 'ETH-USD', 'LTC-USD']
+    async with gdax.sharding.ShardedOrderBook(
+            product_ids, processes=2,
+            orderbook_class=ReplayOrderBook) as orderbook:
+        assert orderbook.shards == [['BTC-USD', 'LTC-USD'], ['ETH-USD']]
+        for _ in range(500):
+            if orderbook.message_counts == [2, 1]:
+                break
+            await asyncio.sleep(0.01)
+        assert orderbook.message_counts == [2, 1]
+        orderbook.check_workers()
+
+        for product_id in product_ids:
+            assert orderbook.get_top_of_book(product_id) == (
+                Decimal('100.5'), Decimal('3'), Decimal('101'), Decimal('2'))
+            assert orderbook.get_bid(product_id) == Decimal('100.5')
+            assert orderbook.get_ask(product_id) == Decimal('101')
+            assert orderbook.get_max_bid_depth(product_id) == Decimal('3')
+            assert orderbook.get_min_ask_depth(product_id) == Decimal('2')
+            assert orderbook.get_sequence(product_id)[0] == 2
+
+        orderbook._processes[1].terminate()
+        orderbook._processes[1].join()
+        with pytest.raises(gdax.orderbook.OrderBookError):
+            orderbook.check_workers()
+    assert orderbook.message_counts == []
+
+
+@pytest.mark.asyncio
+async def test_worker_failure():
+    with pytest.raises(gdax.orderbook.OrderBookError):
+        async with gdax.sharding.ShardedOrderBook(
+                'BTC-USD', shards=[['BTC-USD']], ready_timeout=5,
+                orderbook_class=FailingOrderBook):
+            pass  # pragma: no cover
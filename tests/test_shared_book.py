@@ -0,0 +1,80 @@
+from decimal import Decimal
+import multiprocessing
+
+import pytest
+
+import gdax.orderbook
+import gdax.shared_book
+
+from tests.helpers import generate_id, loaded_orderbook
+
+product_id = 'BTC-USD'
+
+
+def _orderbook():
+    return loaded_orderbook({
+        product_id: {
+            'sequence': 10,
+            'bids': [['2595.52', '1.5', generate_id()]],
+            'asks': [['2596.74', '0.00000001', generate_id()]],
+        },
+        'ETH-USD': None,
+    })
+
+
+def _read(path, queue):
+    with gdax.shared_book.TopOfBookReader(path) as reader:
+        queue.put(reader.read(product_id))
+
+
+def test_shared_book(tmpdir):
+    path = str(tmpdir.join('book'))
+    orderbook = _orderbook()
+    with gdax.shared_book.TopOfBookPublisher(orderbook, path) as publisher:
+        reader = gdax.shared_book.TopOfBookReader(path)
+        assert reader.product_ids == [product_id, 'ETH-USD']
+        assert reader.read('ETH-USD') == (None,) * 6
+
+        bid, bid_size, ask, ask_size, sequence, timestamp = \
+            reader.read(product_id)
+        assert (bid, bid_size, ask, ask_size, sequence) == (
+            Decimal('2595.52'), Decimal('1.5'), Decimal('2596.74'),
+            Decimal('0.00000001'), 10)
+        assert timestamp > 0
+
+        orderbook._handle({
+            'type': 'open', 'product_id': product_id, 'side': 'buy',
+            'price': '2596.00', 'remaining_size': '2', 'sequence': 11,
+            'order_id': generate_id()})
+        assert reader.read(product_id)[:5] == (
+            Decimal('2596.00'), Decimal('2'), Decimal('2596.74'),
+            Decimal('0.00000001'), 11)
+
+        orderbook._load_snapshot('ETH-USD', {
+            'sequence': 5, 'bids': [], 'asks': [['300', '1', generate_id()]]})
+        assert reader.read('ETH-USD')[:5] == (
+            None, None, Decimal('300'), Decimal('1'), 5)
+
+        # from another process
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_read, args=(path, queue))
+        process.start()
+        assert queue.get(timeout=10)[:5] == reader.read(product_id)[:5]
+        process.join()
+
+        # a write in progress
+        reader.retries = 3
+        offset = reader._slots[product_id]
+        version = gdax.shared_book._VERSION.unpack_from(
+            publisher._mmap, offset)[0]
+        gdax.shared_book._VERSION.pack_into(publisher._mmap, offset,
+                                            version + 1)
+        with pytest.raises(gdax.orderbook.OrderBookError):
+            reader.read(product_id)
+        reader.close()
+    assert publisher.publish not in orderbook._top_of_book_callbacks
+
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 64)
+    with pytest.raises(gdax.orderbook.OrderBookError):
+        gdax.shared_book.TopOfBookReader(path)
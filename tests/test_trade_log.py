@@ -0,0 +1,200 @@
+import json
+import time
+
+import pytest
+
+from gdax.trade_log import (BinaryTradeLogWriter, TradeLogIndex,
+                             TradeLogWriter, build_trade_log_index,
+                             convert_trade_log, read_trade_log)
+
+
+def _wait(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_flush_size(tmpdir):
+    path = str(tmpdir.join('trades.txt'))
+    with TradeLogWriter(path, flush_size=10, flush_interval=60) as writer:
+        writer.write('W 1\n')
+        assert writer.depth == 1
+        writer.write('W 22222\n')
+        _wait(lambda: writer.lines_written == 2)
+        assert writer.depth == 0
+        assert writer.max_depth == 2
+        assert _read(path) == 'W 1\nW 22222\n'
+
+        writer.write('W 3\n')
+        assert writer.depth == 1
+    # flushed by close()
+    assert writer.lines_written == 3
+    assert _read(path) == 'W 1\nW 22222\nW 3\n'
+
+    with pytest.raises(ValueError):
+        writer.write('W 4\n')
+
+
+def test_flush_interval(tmpdir):
+    path = str(tmpdir.join('trades.txt'))
+    with open(path, 'w') as f:
+        f.write('B\n')
+    with TradeLogWriter(path, flush_interval=0.01) as writer:
+        writer.write('W 1\n')
+        _wait(lambda: writer.flushes == 1)
+        assert _read(path) == 'B\nW 1\n'
+
+
+def test_max_buffer_size(tmpdir):
+    path = str(tmpdir.join('trades.txt'))
+    with TradeLogWriter(path, flush_size=100, flush_interval=60,
+                        max_buffer_size=10, overflow='raise') as writer:
+        writer.write('W 1\n')
+        with pytest.raises(BufferError):
+            writer.write('W 22222\n')
+        assert writer.dropped == 1
+        assert writer.depth == 1
+    assert _read(path) == 'W 1\n'
+
+    # waits for the thread to write out the buffer
+    with TradeLogWriter(path, flush_size=100, flush_interval=60,
+                        max_buffer_size=10) as writer:
+        writer.write('W 2\n')
+        writer.write('W 33333\n')
+        _wait(lambda: writer.flushes == 1)
+        assert writer.depth == 1
+    assert _read(path) == 'W 1\nW 2\nW 33333\n'
+
+    with pytest.raises(ValueError):
+        TradeLogWriter(path, overflow='drop')
+
+
+def test_write_error(tmpdir):
+    path = str(tmpdir.join('trades.log'))
+    writer = BinaryTradeLogWriter(path, flush_size=1, index_interval=10)
+    # the index needs the sequence of the snapshot
+    writer.log_snapshot('ETH-USD', '{"sequence": null}')
+    _wait(lambda: not writer._thread.is_alive())
+    with pytest.raises(AttributeError):
+        writer.log_frame('{"type": "done", "sequence": 2}')
+    assert writer.depth == 0
+    with pytest.raises(AttributeError):
+        writer.close()
+    assert writer._file.closed
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'lzma'])
+def test_binary(tmpdir, compression):
+    path = str(tmpdir.join('trades.log'))
+    with BinaryTradeLogWriter(path, compression=compression) as writer:
+        writer.log_snapshot('ETH-USD', '{"sequence": 1}', 1.5)
+        writer.log_frame('{"type": "done", "sequence": 2}', 2.25)
+        writer.log_frame('{"type": "open", "sequence": 3}')
+        now = time.time()
+    with BinaryTradeLogWriter(path, compression=compression) as writer:
+        writer.log_frame('{"type": "open", "sequence": 4}', 3.0)
+        # serialized by the thread
+        writer.log_checkpoint('ETH-USD', lambda: '{"sequence": 4}', 3.5)
+
+    entries = list(read_trade_log(path))
+    assert entries[:2] == [
+        ('B', 1.5, 'ETH-USD {"sequence": 1}'),
+        ('W', 2.25, '{"type": "done", "sequence": 2}'),
+    ]
+    kind, timestamp, data = entries[2]
+    assert (kind, data) == ('W', '{"type": "open", "sequence": 3}')
+    assert now - 5 < timestamp <= now
+    # appending does not repeat the header
+    assert entries[3:] == [('W', 3.0, '{"type": "open", "sequence": 4}'),
+                           ('C', 3.5, 'ETH-USD {"sequence": 4}')]
+
+
+def test_rotation(tmpdir):
+    path = str(tmpdir.join('trades.log.gz'))
+    with TradeLogWriter(path, compression='gzip', rotate_size=1) as writer:
+        for i in range(3):
+            writer.log_frame(f'{{"sequence": {i}}}')
+            writer.flush()
+    assert writer.paths == [str(tmpdir.join(f'trades.log.{i:04d}.gz'))
+                            for i in range(3)]
+    for i, path in enumerate(writer.paths):
+        assert list(read_trade_log(path)) == [
+            ('W', None, f'{{"sequence": {i}}}')]
+
+    # continues after the existing files
+    with TradeLogWriter(str(tmpdir.join('trades.log.gz')),
+                        rotate_interval=3600) as writer:
+        pass
+    assert writer.paths == [str(tmpdir.join('trades.log.0003.gz'))]
+
+
+def test_convert(tmpdir):
+    source = str(tmpdir.join('trades.txt'))
+    with open(source, 'w') as f:
+        f.write('B ETH-USD {"sequence": 1}\n'
+                'W {"type": "heartbeat", "sequence": 2}\n'
+                'W {"type": "done", "sequence": 3, '
+                '"time": "2017-06-25T11:23:14.775000Z"}\n'
+                'W {"type": "done", "sequence": 4, '
+                '"time": "2017-06-25T11:23:15Z"}\n')
+    destination = str(tmpdir.join('trades.log.xz'))
+    assert convert_trade_log(source, destination, compression='lzma') == 4
+    assert [(kind, timestamp) for kind, timestamp, _
+            in read_trade_log(destination)] == [
+        ('B', 0.0), ('W', 0.0), ('W', 1498389794.775), ('W', 1498389795.0)]
+    assert [data for _, _, data in read_trade_log(destination)] == \
+        [data for _, _, data in read_trade_log(source)]
+
+
+def _frame(product_id, sequence):
+    return json.dumps({'type': 'heartbeat', 'product_id': product_id,
+                       'sequence': sequence})
+
+
+@pytest.mark.parametrize('writer_class,compression', [
+    (TradeLogWriter, None), (BinaryTradeLogWriter, None),
+    (BinaryTradeLogWriter, 'gzip')])
+def test_index(tmpdir, writer_class, compression):
+    path = str(tmpdir.join('trades.log'))
+    with writer_class(path, compression=compression, index_interval=3,
+                      flush_size=100) as writer:
+        for product_id, sequence in [('ETH-USD', 10), ('BTC-USD', 20)]:
+            writer.log_snapshot(product_id, f'{{"sequence": {sequence}}}',
+                                float(sequence))
+        for i in range(1, 6):
+            writer.log_frame(_frame('ETH-USD', 10 + i), 100.0 + i)
+            writer.log_frame(_frame('BTC-USD', 20 + i), 100.5 + i)
+        writer.log_snapshot('ETH-USD', '{"sequence": 13}', 106.0)
+    with open(path + '.idx', 'rb') as f:
+        written = f.read()
+    assert build_trade_log_index(path, interval=3) == 7
+    with open(path + '.idx', 'rb') as f:
+        assert f.read() == written
+
+    index = TradeLogIndex(path)
+    timestamps = writer_class is BinaryTradeLogWriter
+    snapshot = index.snapshot('ETH-USD')
+    assert snapshot[0] == 13
+    assert index.snapshot('ETH-USD', sequence=12)[0] == 10
+    assert index.snapshot('BTC-USD', sequence=19) is None
+    if timestamps:
+        assert index.snapshot('ETH-USD', timestamp=105.0)[0] == 10
+    assert list(read_trade_log(path, snapshot[2])) == [
+        ('B', 106.0 if timestamps else None, 'ETH-USD {"sequence": 13}')]
+
+    # every third frame
+    assert [entry[0] for entry in index.frames['ETH-USD']] == [11, 14]
+    assert [entry[0] for entry in index.frames['BTC-USD']] == [22, 25]
+    sequence, timestamp, offset = index.frame('BTC-USD', sequence=23)
+    assert sequence == 22
+    assert next(read_trade_log(path, offset))[2] == _frame('BTC-USD', 22)
+    if timestamps:
+        assert timestamp == 102.5
+        assert index.offset(103.9) == offset
+        assert index.offset(0) == 0
@@ -1,6 +1,9 @@
 import base64
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+import json
+import time
 
 from asynctest import patch, CoroutineMock
 import pytest
@@ -422,11 +425,34 @@ class TestPublicClient:
             ]
           ]
         }
-        mock_get.return_value.aenter.json = CoroutineMock(
-            return_value=orderbook)
+        mock_get.return_value.aenter.read = CoroutineMock(
+            return_value=json.dumps(orderbook).encode())
         r = await self.client.get_product_order_book('BTC-USD', level=3)
         assert r == expected_orderbook
 
+        # decoded in the given executor
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.client.executor = executor
+            with patch('gdax.trader.decode_order_book',
+                       wraps=gdax.trader.decode_order_book) as mock_decode:
+                r = await self.client.get_product_order_book('BTC-USD',
+                                                             level=3)
+        assert r == expected_orderbook
+        assert mock_decode.call_count == 1
+
+        # the decoding does not count against the timeout
+        decode = gdax.trader.decode_order_book
+
+        def slow_decode(data):
+            time.sleep(0.1)
+            return decode(data)
+
+        self.client.executor = None
+        self.client.timeout_sec = 0.05
+        with patch('gdax.trader.decode_order_book', slow_decode):
+            r = await self.client.get_product_order_book('BTC-USD', level=3)
+        assert r == expected_orderbook
+
     async def test_get_product_historic_rates(self, mock_get):
         rates = [
               [
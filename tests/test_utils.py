@@ -1,4 +1,6 @@
 import base64
+from decimal import Decimal
+
 import pytest
 
 import gdax.utils
@@ -17,3 +19,31 @@ def test_get_signature():
     with pytest.raises(AssertionError):
         gdax.utils.get_signature(path, method, body, timestamp,
                                  base64.b64encode(b'a'))
+
+
+def test_fixed_point():
+    units = gdax.utils.FixedPoint(Decimal('0.01'))
+    assert units.places == 2
+    assert units.parse('2601.76000000') == 260176
+    assert units.parse('2596.7') == 259670
+    assert units.parse('12') == 1200
+    assert units.parse(Decimal('2596.77')) == 259677
+    assert units.to_decimal(259677) == Decimal('2596.77')
+
+    units = gdax.utils.FixedPoint('0.00000001')
+    assert units.parse('0.07670504') == 7670504
+    assert units.parse('12345678.12345678') == 1234567812345678
+    assert units.to_decimal(7670504) == Decimal('0.07670504')
+
+    with pytest.raises(ValueError):
+        gdax.utils.FixedPoint('0.05')
+    with pytest.raises(ValueError):
+        units.parse('0.076705041')
+    with pytest.raises(ValueError):
+        units.parse(Decimal('0.076705049'))
+
+
+def test_decimal_units():
+    units = gdax.utils.DecimalUnits()
+    assert units.parse('2601.76000000') == Decimal('2601.76')
+    assert units.to_decimal(Decimal('1.5')) == Decimal('1.5')
@@ -0,0 +1,249 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import aiohttp
+from asynctest import patch, CoroutineMock, MagicMock
+import pytest
+
+import gdax.messages
+import gdax.websocket_feed_listener
+
+
+class Listener(gdax.websocket_feed_listener.WebSocketFeedListener):
+    async def handle_message(self):
+        pass
+
+
+received = {
+    "type": "received",
+    "order_id": "26c22ff5-01b1-4ca3-859c-6349d6eb06b4",
+    "order_type": "limit",
+    "size": "0.10000000",
+    "price": "2602.22000000",
+    "side": "sell",
+    "product_id": "BTC-USD",
+    "sequence": 3419033240,
+    "time": "2017-06-25T11:23:14.792000Z"
+}
+
+
+def test_sniff():
+    for separators in [(',', ':'), (', ', ': ')]:
+        json_data = json.dumps(received, separators=separators)
+        assert gdax.websocket_feed_listener.sniff_type(json_data) == \
+            'received'
+        assert gdax.websocket_feed_listener.summarize(
+            'received', json_data) == {
+                'type': 'received',
+                'product_id': 'BTC-USD',
+                'sequence': 3419033240,
+            }
+    assert gdax.websocket_feed_listener.sniff_type('{}') is None
+    assert gdax.websocket_feed_listener.summarize(
+        'subscriptions', '{"type": "subscriptions"}') == \
+        {'type': 'subscriptions'}
+
+
+def test_decode():
+    json_data = json.dumps(received)
+    listener = Listener()
+    assert listener._decode(json_data) == received
+
+    calls = []
+
+    def json_loads(data):
+        calls.append(data)
+        return json.loads(data)
+
+    listener = Listener(json_loads=json_loads, skip_types=['received'])
+    assert listener._decode(json_data) == {
+        'type': 'received',
+        'product_id': 'BTC-USD',
+        'sequence': 3419033240,
+    }
+    assert calls == []
+
+    heartbeat = {"type": "heartbeat", "sequence": 1}
+    assert listener._decode(json.dumps(heartbeat)) == heartbeat
+    assert calls == [json.dumps(heartbeat)]
+
+
+def test_typed_messages():
+    listener = Listener(typed_messages=True)
+    message = listener._decode(json.dumps(received))
+    assert isinstance(message, gdax.messages.Received)
+    assert message.price == Decimal('2602.22')
+    assert message.size == Decimal('0.1')
+    assert message['product_id'] == 'BTC-USD'
+
+    subscriptions = {"type": "subscriptions", "channels": []}
+    assert listener._decode(json.dumps(subscriptions)) == subscriptions
+
+
+def test_dispatch():
+    listener = Listener()
+    handled = []
+    assert listener.register_handler('received', handled.append) is None
+    assert listener._dispatch(received) is None
+    assert handled == [received]
+    assert listener._dispatch({'type': 'unknown'}) is None
+
+    def handler(message):
+        return previous(message) or 'handled'
+
+    previous = listener.register_handler('received', handler)
+    assert previous == handled.append
+    assert listener._dispatch(received) == 'handled'
+    assert handled == [received, received]
+
+    stats = listener.handler_stats['received']
+    assert stats.count == 2
+    assert 0 < stats.max_time <= stats.total_time
+    assert stats.mean_time == stats.total_time / 2
+    assert 'unknown' not in listener.handler_stats
+    assert repr(stats).startswith('HandlerStats(count=2, ')
+
+    assert listener.unregister_handler('received') == handler
+    assert listener._dispatch(received) is None
+    assert gdax.websocket_feed_listener.HandlerStats().mean_time == 0.0
+
+
+def _frame(sequence, product_id='BTC-USD'):
+    return json.dumps({'type': 'received', 'product_id': product_id,
+                       'sequence': sequence})
+
+
+def _drain(merger):
+    frames = []
+    while merger.qsize():
+        frames.append(json.loads(merger._queue.get_nowait())['sequence'])
+    return frames
+
+
+def test_pending_frames(event_loop):
+    # relies on the reader queue of aiohttp websockets
+    reader = aiohttp.streams.DataQueue(loop=event_loop)
+    listener = Listener()
+    listener._ws = aiohttp.ClientWebSocketResponse(
+        reader, None, None, MagicMock(), 10.0, True, True, event_loop)
+    assert listener._pending_frames() == 0
+    for i in range(2):
+        reader.feed_data(aiohttp.WSMessage(aiohttp.WSMsgType.TEXT, '{}', ''),
+                         2)
+    assert listener._pending_frames() == 2
+
+    listener._ws = object()
+    assert listener._pending_frames() == 0
+
+
+@pytest.mark.asyncio
+async def test_feed_merger():
+    merger = gdax.websocket_feed_listener.FeedMerger(2, gap_timeout=0.01)
+    merger.put(0, '{"type": "subscriptions"}')
+    merger.put(1, '{"type": "subscriptions"}')
+    assert await merger.get() == '{"type": "subscriptions"}'
+
+    merger.put(0, _frame(1))
+    merger.put(1, _frame(1))
+    merger.put(1, _frame(2))
+    merger.put(0, _frame(2))
+    merger.put(0, _frame(1, 'ETH-USD'))
+    assert _drain(merger) == [1, 2, 1]
+    assert [stats.wins for stats in merger.stats] == [2, 1]
+    assert [stats.duplicates for stats in merger.stats] == [1, 1]
+    assert merger.stats[1].mean_delay == merger.stats[1].total_delay
+
+    # connection 0 missed 3, connection 1 fills the gap
+    merger.put(0, _frame(4))
+    merger.put(0, _frame(5))
+    assert _drain(merger) == []
+    merger.put(1, _frame(3))
+    assert _drain(merger) == [3, 4, 5]
+    assert merger.gap_fills == 1
+    merger.put(1, _frame(4))
+    merger.put(1, _frame(5))
+
+    # nobody has 6
+    merger.put(0, _frame(8))
+    merger.put(1, _frame(7))
+    assert _drain(merger) == []
+    await asyncio.sleep(0.05)
+    assert _drain(merger) == [7, 8]
+    assert merger.gap_timeouts == 1
+    merger.put(1, _frame(8))
+    merger.put(0, _frame(9))
+    assert _drain(merger) == [9]
+
+    merger.put(0, _frame(11))
+    merger.close()
+    assert merger._timers == {}
+
+    # frame 11 is held back
+    merger.fail(0, ValueError())
+    assert merger.qsize() == 0
+    merger.fail(1, ValueError('last'))
+    with pytest.raises(ValueError):
+        await merger.get()
+    assert repr(merger.stats[0]).startswith('ConnectionStats(wins=')
+    assert gdax.websocket_feed_listener.ConnectionStats().mean_delay == 0.0
+
+
+@pytest.mark.asyncio
+async def test_feed_merger_heartbeats():
+    merger = gdax.websocket_feed_listener.FeedMerger(2, gap_timeout=60)
+    heartbeat = json.dumps({'type': 'heartbeat', 'product_id': 'BTC-USD',
+                            'sequence': 1})
+    opened = json.dumps({'type': 'open', 'product_id': 'BTC-USD',
+                         'sequence': 1})
+    # connection 1 is ahead, its heartbeat does not replace the open
+    merger.put(1, heartbeat)
+    merger.put(0, opened)
+    merger.put(0, heartbeat)
+    merger.put(1, opened)
+    assert [merger._queue.get_nowait() for _ in range(merger.qsize())] == \
+        [opened, heartbeat]
+    assert merger._last == {'BTC-USD': 1}
+
+    # a heartbeat past a gap is dropped along with the gap
+    merger.put(0, _frame(3))
+    merger.put(0, heartbeat.replace('1}', '3}'))
+    assert merger.qsize() == 0
+
+    # heartbeats are taken from connection 1 once connection 0 failed
+    merger.fail(0, ValueError())
+    merger.put(1, heartbeat)
+    assert merger._queue.get_nowait() == heartbeat
+
+    # and from connection 0 again once it is back
+    merger.restore(0)
+    merger.put(1, heartbeat)
+    merger.put(0, heartbeat)
+    assert [merger._queue.get_nowait() for _ in range(merger.qsize())] == \
+        [heartbeat]
+    assert (merger.stats[0].failures, merger.stats[0].reconnects) == (1, 1)
+    assert repr(merger.stats[0]).endswith('failures=1, reconnects=1)')
+    merger.close()
+
+
+@pytest.mark.asyncio
+@patch('random.uniform', side_effect=lambda low, high: high)
+@patch('asyncio.sleep', new_callable=CoroutineMock)
+async def test_reconnect_backoff(mock_sleep, mock_uniform):
+    listener = Listener(backoff_base=0.5, backoff_cap=3.0)
+    assert [listener._backoff(attempts) for attempts in range(6)] == \
+        [0, 0.5, 1.0, 2.0, 3.0, 3.0]
+    assert listener._backoff(10000) == 3.0
+
+    error = aiohttp.ClientConnectionError('refused')
+    with patch.object(Listener, '__aexit__', CoroutineMock()), \
+            patch.object(Listener, '__aenter__',
+                         CoroutineMock(side_effect=[error, error, None])):
+        await listener._reconnect(aiohttp.ServerDisconnectedError())
+    assert [args[0] for args, _ in mock_sleep.call_args_list] == \
+        [0, 0.5, 1.0]
+    stats = listener.reconnect_stats
+    assert stats.reconnects == 1
+    assert stats.failed_attempts == 2
+    assert stats.stalls == 0
+    assert stats.last_error is error